@@ -0,0 +1,118 @@
+import { appendFile, mkdir, open } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Cold voter history. With HISTORY_ARCHIVE=true, votes past the last
+// reward band among their type's voters are counted but kept out of the
+// subject's voterHistory (ledger.js), and the writer appends them here
+// instead: one JSON line per entry in archive/subject-<id>.log. Lines are
+// appended before the commit that records their votes, so a failed commit
+// can leave lines behind. Reading keeps the last line per position and
+// the caller drops positions the subject's counters do not reach.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+const archivePath = path.join(__dirname, 'archive')
+export const HISTORY_ARCHIVE = process.env.HISTORY_ARCHIVE === 'true'
+
+const READ_CHUNK_BYTES = 1024 * 1024
+
+const subjectPath = (subjectId) => path.join(archivePath, `subject-${subjectId}.log`)
+
+// [{ subjectId, entry }], one append per subject file
+export const appendArchive = async (archived) => {
+  if (!archived.length) return
+  const lines = new Map()
+  for (const { subjectId, entry } of archived) {
+    lines.set(subjectId, (lines.get(subjectId) || '') + JSON.stringify(entry) + '\n')
+  }
+  await mkdir(archivePath, { recursive: true })
+  for (const [subjectId, text] of lines) {
+    await appendFile(subjectPath(subjectId), text)
+  }
+}
+
+// Per subject file: position, byte offset and length of the line kept for
+// each archived position, in position order, and how much of the file
+// has been indexed. Rebuilt when the file is replaced or truncated.
+const indexes = new Map()
+
+const binarySearch = (positions, position) => {
+  let low = 0
+  let high = positions.length
+  while (low < high) {
+    const middle = (low + high) >> 1
+    if (positions[middle] < position) low = middle + 1
+    else high = middle
+  }
+  return low
+}
+
+const indexLine = (index, position, offset, length) => {
+  const { positions, offsets, lengths } = index
+  // Positions only grow, except after a failed commit
+  const at = positions.length && positions[positions.length - 1] >= position
+    ? binarySearch(positions, position)
+    : positions.length
+  if (positions[at] === position) {
+    offsets[at] = offset
+    lengths[at] = length
+    return
+  }
+  positions.splice(at, 0, position)
+  offsets.splice(at, 0, offset)
+  lengths.splice(at, 0, length)
+}
+
+// Index the lines appended since the last call
+const refresh = async (handle, subjectId) => {
+  const { ino, size } = await handle.stat()
+  let index = indexes.get(subjectId)
+  if (!index || index.ino !== ino || size < index.size) {
+    index = { ino, size: 0, positions: [], offsets: [], lengths: [] }
+    indexes.set(subjectId, index)
+  }
+  while (index.size < size) {
+    const buffer = Buffer.alloc(Math.min(READ_CHUNK_BYTES, size - index.size))
+    const { bytesRead } = await handle.read(buffer, 0, buffer.length, index.size)
+    let start = 0
+    for (let end = buffer.indexOf(0x0a); end !== -1 && end < bytesRead; end = buffer.indexOf(0x0a, start)) {
+      const { position } = JSON.parse(buffer.toString('utf-8', start, end))
+      indexLine(index, position, index.size + start, end - start)
+      start = end + 1
+    }
+    // A line longer than the chunk, or one still being written
+    if (!start) break
+    index.size += start
+  }
+  return index
+}
+
+// Archived entries with from <= position <= to, in position order
+export const archivedEntries = async (subjectId, from, to) => {
+  let handle
+  try {
+    handle = await open(subjectPath(subjectId), 'r')
+  } catch (error) {
+    if (error.code === 'ENOENT') return []
+    throw error
+  }
+
+  try {
+    const { positions, offsets, lengths } = await refresh(handle, subjectId)
+    const first = binarySearch(positions, from)
+    const last = binarySearch(positions, to + 1)
+    if (first >= last) return []
+
+    const base = offsets[first]
+    const end = Math.max(...offsets.slice(first, last).map((offset, i) => offset + lengths[first + i]))
+    const buffer = Buffer.alloc(end - base)
+    await handle.read(buffer, 0, buffer.length, base)
+    const entries = []
+    for (let i = first; i < last; i++) {
+      const start = offsets[i] - base
+      entries.push(JSON.parse(buffer.toString('utf-8', start, start + lengths[i])))
+    }
+    return entries
+  } finally {
+    await handle.close()
+  }
+}
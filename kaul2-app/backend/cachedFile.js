@@ -0,0 +1,51 @@
+import { stat } from 'fs/promises'
+import { JSONFile } from 'lowdb/node'
+
+// Keeps the parsed document in memory between invocations and only
+// re-parses the file when its inode, size or mtime differ from what this
+// process last read or wrote. lowdb writes via tmp file + rename, so a
+// write from another process always shows up as a new inode.
+export class CachedJSONFile {
+  constructor(filename) {
+    this.filename = filename
+    this.file = new JSONFile(filename)
+    this.data = null
+    this.signature = null
+    this.stats = { hits: 0, misses: 0 }
+  }
+
+  async currentSignature() {
+    try {
+      const { ino, size, mtimeMs } = await stat(this.filename)
+      return `${ino}:${size}:${mtimeMs}`
+    } catch (error) {
+      if (error.code === 'ENOENT') return null
+      throw error
+    }
+  }
+
+  async read() {
+    const signature = await this.currentSignature()
+    if (signature && signature === this.signature) {
+      this.stats.hits++
+      return this.data
+    }
+    this.stats.misses++
+    this.data = await this.file.read()
+    this.signature = signature
+    return this.data
+  }
+
+  // Re-parse the file on the next read, dropping in-memory changes
+  invalidate() {
+    this.signature = null
+  }
+
+  async write(data) {
+    // Memory may be ahead of disk if the write fails, so reload next time
+    this.signature = null
+    await this.file.write(data)
+    this.data = data
+    this.signature = await this.currentSignature()
+  }
+}
@@ -0,0 +1,127 @@
+import http from 'http'
+import { watch } from 'fs'
+import { open } from 'fs/promises'
+import path from 'path'
+import { EVENT_LOG_KEEP, eventsPath } from './events.js'
+
+// Server-sent events for vote deltas, tailing events.log (see events.js).
+// GET /events streams every event after ?since=<seq>, or after the
+// Last-Event-ID a browser sends when it reconnects; a negative one gets a
+// 400. A client that is further behind than the buffer gets a reset event
+// and should refetch.
+const PORT = Number(process.env.EVENTS_PORT) || 3002
+const HEARTBEAT_MS = 15000
+const POLL_MS = 1000
+
+let buffer = []  // last EVENT_LOG_KEEP events, oldest first
+const clients = new Set()
+const tail = { ino: null, offset: 0 }
+
+const lastSeq = () => buffer.length ? buffer[buffer.length - 1].seq : 0
+
+const format = (event) => `id: ${event.seq}\nevent: ${event.type}\ndata: ${JSON.stringify(event)}\n\n`
+
+const broadcast = (message) => {
+  for (const client of clients) client.write(message)
+}
+
+// Read complete lines appended since the last read; a trim replaces the
+// file, so start over from the top and skip events already buffered
+const readNew = async () => {
+  let handle
+  try {
+    handle = await open(eventsPath, 'r')
+  } catch (error) {
+    if (error.code === 'ENOENT') return
+    throw error
+  }
+
+  try {
+    const { ino, size } = await handle.stat()
+    if (ino !== tail.ino || size < tail.offset) {
+      tail.ino = ino
+      tail.offset = 0
+    }
+    if (size <= tail.offset) return
+
+    const chunk = Buffer.alloc(size - tail.offset)
+    await handle.read(chunk, 0, chunk.length, tail.offset)
+    const end = chunk.lastIndexOf(0x0a)
+    if (end === -1) return
+    tail.offset += end + 1
+
+    for (const line of chunk.toString('utf-8', 0, end).split('\n')) {
+      if (!line) continue
+      const event = JSON.parse(line)
+      if (event.seq <= lastSeq()) continue
+      buffer.push(event)
+      broadcast(format(event))
+    }
+    if (buffer.length > EVENT_LOG_KEEP) buffer = buffer.slice(-EVENT_LOG_KEEP)
+  } finally {
+    await handle.close()
+  }
+}
+
+let reading = Promise.resolve()
+const scheduleRead = () => {
+  reading = reading.then(readNew).catch(error => console.error('Error reading events:', error))
+}
+
+const subscribe = (req, res, url) => {
+  const since = Number(url.searchParams.get('since') ?? req.headers['last-event-id'] ?? NaN)
+  if (since < 0) {
+    res.writeHead(400, { 'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*' })
+    return res.end(JSON.stringify({ error: 'since must not be negative' }))
+  }
+
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    Connection: 'keep-alive',
+    'Access-Control-Allow-Origin': '*'
+  })
+  res.write('retry: 1000\n\n')
+
+  if (Number.isInteger(since) && since < lastSeq()) {
+    // Nothing buffered to replay from counts as too old
+    if (!buffer.length || since < buffer[0].seq - 1) {
+      res.write(`id: ${lastSeq()}\nevent: reset\ndata: {}\n\n`)
+    } else {
+      for (const event of buffer) {
+        if (event.seq > since) res.write(format(event))
+      }
+    }
+  }
+
+  clients.add(res)
+  req.on('close', () => clients.delete(res))
+}
+
+const server = http.createServer((req, res) => {
+  const url = new URL(req.url, `http://${req.headers.host || 'localhost'}`)
+  if (req.method === 'OPTIONS') {
+    res.writeHead(204, {
+      'Access-Control-Allow-Origin': '*',
+      'Access-Control-Allow-Methods': 'GET,OPTIONS',
+      'Access-Control-Allow-Headers': 'Last-Event-ID'
+    })
+    return res.end()
+  }
+  if (req.method === 'GET' && url.pathname === '/events') {
+    return subscribe(req, res, url)
+  }
+  res.writeHead(404, { 'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*' })
+  res.end(JSON.stringify({ error: 'Not found' }))
+})
+
+// fs.watch for low latency, plus a slow poll where watching is unreliable
+watch(path.dirname(eventsPath), (_, filename) => {
+  if (!filename || filename === path.basename(eventsPath)) scheduleRead()
+})
+setInterval(scheduleRead, POLL_MS)
+setInterval(() => broadcast(': heartbeat\n\n'), HEARTBEAT_MS)
+
+scheduleRead()
+await reading
+server.listen(PORT, () => console.log(`Event stream on http://localhost:${PORT}/events`))
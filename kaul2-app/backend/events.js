@@ -0,0 +1,78 @@
+import { appendFile, readFile, rename, stat, writeFile } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Journal of committed vote deltas for the event stream. The writer appends
+// one JSON line per vote with a sequence number; eventServer.js tails the
+// file and pushes new lines to subscribers. Once the file grows past
+// EVENT_LOG_MAX_BYTES only the last EVENT_LOG_KEEP events are kept. Every
+// append happens under the write lock (lock.js), whichever process or
+// worker makes it, so sequence numbers have no gaps or repeats; reset_db
+// takes the lock to append a reset event of its own.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+export const eventsPath = path.join(__dirname, 'events.log')
+export const EVENT_LOG_KEEP = Number(process.env.EVENT_LOG_KEEP) || 1000
+const EVENT_LOG_MAX_BYTES = Number(process.env.EVENT_LOG_MAX_BYTES) || 1024 * 1024
+
+// File as last written by this process; size -1 forces a re-read
+const journal = { seq: 0, ino: null, size: -1 }
+
+const fileOf = async () => {
+  try {
+    const { ino, size } = await stat(eventsPath)
+    return { ino, size }
+  } catch (error) {
+    if (error.code === 'ENOENT') return { ino: null, size: 0 }
+    throw error
+  }
+}
+
+const encode = (events) => events.map(event => JSON.stringify(event) + '\n').join('')
+
+// Complete lines only: another process may be halfway through appending
+export const readEvents = async () => {
+  let text
+  try {
+    text = await readFile(eventsPath, 'utf-8')
+  } catch (error) {
+    if (error.code === 'ENOENT') return []
+    throw error
+  }
+  return text.slice(0, text.lastIndexOf('\n') + 1)
+    .split('\n')
+    .filter(Boolean)
+    .map(line => JSON.parse(line))
+}
+
+// Append deltas as events numbered after the last journalled one; call
+// with the write lock held. Resolves with the events.
+export const publish = async (deltas) => {
+  try {
+    // Appended to or trimmed elsewhere since: pick up the last seq again
+    const { ino, size } = await fileOf()
+    if (ino !== journal.ino || size !== journal.size) {
+      const events = await readEvents()
+      journal.seq = events.length ? events[events.length - 1].seq : journal.seq
+      journal.ino = ino
+      journal.size = size
+    }
+
+    const events = deltas.map(delta => ({ seq: ++journal.seq, ...delta }))
+    const text = encode(events)
+    await appendFile(eventsPath, text)
+    journal.size += Buffer.byteLength(text)
+
+    if (journal.size > EVENT_LOG_MAX_BYTES) {
+      const kept = encode((await readEvents()).slice(-EVENT_LOG_KEEP))
+      const tmpPath = `${eventsPath}.tmp`
+      await writeFile(tmpPath, kept)
+      await rename(tmpPath, eventsPath)
+      journal.size = Buffer.byteLength(kept)
+    }
+    journal.ino = (await fileOf()).ino
+    return events
+  } catch (error) {
+    journal.size = -1
+    throw error
+  }
+}
@@ -1,189 +1,111 @@
 import subjectsDb from './subjects.js'
 import usersDb from './users.js'
-
-const VOTE_COST = 10
-const INITIAL_POINTS = 100
-const MIN_REWARD = 0.000001
-const REWARD_TIERS = {
-  TIER1: { max: 10, share: 5, reward: 0.5 },
-  TIER2: { max: 100, share: 3, reward: 0.033 },
-  TIER3: { max: 1000, share: 1.5, reward: 0.00167 },
-  TIER4: { max: 10000, share: 0.5, reward: 0.000056 }
+import { archivedEntries } from './archive.js'
+import { emptyStats, historyLength, INITIAL_POINTS, initializeUser, userStats } from './ledger.js'
+import { logger } from './logger.js'
+import { rewardsFor } from './rewards.js'
+import { cacheStats, dataVersion, loadState } from './storage.js'
+import { submitVote, submitVotes } from './writer.js'
+
+// ETags are the data version, prefixed per process so a restarted backend
+// never matches a tag handed out before the restart
+const etagPrefix = `${process.pid.toString(36)}-${Date.now().toString(36)}`
+const etagFor = (version, variant = '') => `"${etagPrefix}-${version}${variant}"`
+
+// If-None-Match uses weak comparison and may list several tags
+const notModified = (event, etag) => {
+  const header = event.headers?.['if-none-match'] ?? event.headers?.['If-None-Match']
+  if (!header) return false
+  return header.split(',').some(tag => {
+    const value = tag.trim()
+    return value === '*' || value === etag || value === `W/${etag}`
+  })
 }
 
-const logger = {
-  info: (message, data = {}) => {
-    console.log(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'INFO',
-      message,
-      ...data
-    }))
-  },
-  error: (message, error = {}, data = {}) => {
-    console.error(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'ERROR',
-      message,
-      error: {
-        name: error.name,
-        message: error.message,
-        stack: error.stack
-      },
-      ...data
-    }))
+const jsonResponse = (statusCode, data) => ({
+  statusCode,
+  headers: {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
   },
-  debug: (message, data = {}) => {
-    console.debug(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'DEBUG',
-      message,
-      ...data
-    }))
-  },
-  metric: (message, metrics = {}) => {
-    console.log(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'METRIC',
-      message,
-      ...metrics
-    }))
+  body: JSON.stringify(data)
+})
+
+const cachedResponse = (event, etag, cacheControl, body) => {
+  const headers = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'ETag',
+    'Cache-Control': cacheControl,
+    ETag: etag
   }
-}
-
-const initializeUser = (userId) => {
-  if (!usersDb.data.points[userId]) {
-    logger.info('Initializing new user', { userId, initialPoints: INITIAL_POINTS })
-    usersDb.data.points[userId] = {
-      points: INITIAL_POINTS,
-      upVoteRewards: {},
-      downVoteRewards: {},
-      rewardHistory: []
-    }
+  if (notModified(event, etag)) {
+    return { statusCode: 304, headers, body: '' }
   }
-  return usersDb.data.points[userId]
+  return { statusCode: 200, headers, body: body() }
 }
 
-const calculateRewardForPosition = (position) => {
-  let tier = 'NONE'
-  let reward = 0
-
-  if (position <= REWARD_TIERS.TIER1.max) {
-    tier = 'TIER1'
-    reward = REWARD_TIERS.TIER1.reward
-  } else if (position <= REWARD_TIERS.TIER2.max) {
-    tier = 'TIER2'
-    reward = REWARD_TIERS.TIER2.reward
-  } else if (position <= REWARD_TIERS.TIER3.max) {
-    tier = 'TIER3'
-    reward = REWARD_TIERS.TIER3.reward
-  } else if (position <= REWARD_TIERS.TIER4.max) {
-    tier = 'TIER4'
-    reward = REWARD_TIERS.TIER4.reward
-  }
-
-  logger.debug('Calculated reward', { position, tier, reward })
-  return reward
+// ?view=summary leaves out voterHistory, see GET /subjects/{id}/history
+const SUBJECT_VIEWS = {
+  full: (subject) => subject,
+  summary: ({ id, title, emoji, votes, lastUpdated }) => ({ id, title, emoji, votes, lastUpdated })
 }
 
-const distributeRewards = async (subjectId, voteType, currentVoterId) => {
-  try {
-    logger.info('Starting reward distribution', {
-      subjectId,
-      voteType,
-      currentVoterId
-    })
+// Serialized GET /subjects bodies per variant, reused until the data
+// version changes
+const subjectsResponses = {}
 
-    const subject = subjectsDb.data.subjects.find(s => s.id === subjectId)
-    if (!subject || !subject.voterHistory) {
-      logger.error('Invalid subject or voter history', {}, { subjectId })
-      return
+// ?users=false leaves out every user's points record, see GET /users/{id}
+export const getSubjects = async (event) => {
+  try {
+    const query = event.queryStringParameters || {}
+    const view = query.view || 'full'
+    if (!SUBJECT_VIEWS[view]) {
+      return jsonResponse(400, { error: `Unknown view: ${view}` })
     }
-
-    const previousVoters = subject.voterHistory
-      .filter(vote => vote.voteType === voteType && vote.userId !== currentVoterId)
-
-    logger.info('Found previous voters', {
-      subjectId,
-      voterCount: previousVoters.length
-    })
-
-    let totalDistributed = 0
-    const distributions = []
-    
-    for (let i = 0; i < previousVoters.length; i++) {
-      const voter = previousVoters[i]
-      const position = i + 1
-      const rewardShare = calculateRewardForPosition(position)
-      
-      if (rewardShare < MIN_REWARD) {
-        logger.debug('Reward too small, stopping distribution', {
-          position,
-          rewardShare
+    if (query.users !== undefined && query.users !== 'true' && query.users !== 'false') {
+      return jsonResponse(400, { error: 'users must be true or false' })
+    }
+    const withUsers = query.users !== 'false'
+
+    await loadState()
+    const version = dataVersion()
+    const variant = `${view === 'full' ? '' : `-${view}`}${withUsers ? '' : '-nousers'}`
+    const cached = subjectsResponses[variant] ??= { version: -1, body: null }
+    // Votes change it at any time, so clients must revalidate every poll
+    return cachedResponse(event, etagFor(version, variant), 'no-cache', () => {
+      if (cached.version !== version) {
+        cached.body = JSON.stringify({
+          subjects: subjectsDb.data.subjects.map(SUBJECT_VIEWS[view]),
+          ...(withUsers && { users: usersDb.data.points }),
+          userProfiles: usersDb.data.profiles
         })
-        break
-      }
-
-      const user = initializeUser(voter.userId)
-      const rewardCategory = voteType === 'up' ? 'upVoteRewards' : 'downVoteRewards'
-      
-      if (!user[rewardCategory][String(subjectId)]) {
-        user[rewardCategory][String(subjectId)] = 0
+        cached.version = version
       }
-      
-      user[rewardCategory][String(subjectId)] += rewardShare
-      user.points += rewardShare
-      totalDistributed += rewardShare
-
-      distributions.push({
-        userId: voter.userId,
-        position,
-        reward: rewardShare,
-        newTotal: user.points
-      })
-
-      logger.debug('Distributed reward', {
-        userId: voter.userId,
-        position,
-        reward: rewardShare,
-        newTotal: user.points
-      })
-    }
-    
-    logger.info('Completed reward distribution', {
-      subjectId,
-      totalDistributed,
-      distributionCount: distributions.length,
-      distributions
+      return cached.body
     })
-
-    await usersDb.write()
   } catch (error) {
-    logger.error('Error in distributeRewards', error, {
-      subjectId,
-      voteType,
-      currentVoterId
-    })
-  }
-}
-
-export const getSubjects = async (event) => {
-  try {
-    await Promise.all([subjectsDb.read(), usersDb.read()])
+    logger.error('Failed to read data', error)
     return {
-      statusCode: 200,
+      statusCode: 500,
       headers: {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*'
       },
-      body: JSON.stringify({
-        subjects: subjectsDb.data.subjects,
-        users: usersDb.data.points,
-        userProfiles: usersDb.data.profiles
-      })
+      body: JSON.stringify({ error: 'Failed to read data' })
     }
+  }
+}
+
+// Profiles only change when the data is reset, so browsers may reuse them
+export const getProfiles = async (event) => {
+  try {
+    await loadState()
+    return cachedResponse(event, etagFor(dataVersion()), 'public, max-age=300', () =>
+      JSON.stringify({ userProfiles: usersDb.data.profiles })
+    )
   } catch (error) {
-    console.error('Error:', error)
+    logger.error('Failed to read data', error)
     return {
       statusCode: 500,
       headers: {
@@ -195,77 +117,191 @@ export const getSubjects = async (event) => {
   }
 }
 
-const _recordVote = async (event) => {
-  const startTime = Date.now()
-  const requestId = event.requestContext?.requestId || 'unknown'
+const HISTORY_PAGE_SIZE = 50
+const HISTORY_MAX_PAGE_SIZE = 500
+
+// Entries at positions start + 1 to end, newest first. voterHistory is in
+// position order and holds every position unless some were archived
+// (archive.js); those are read from the archive, in one range read.
+const historyPage = async (subject, start, end) => {
+  const history = subject.voterHistory || []
+  let low = 0
+  let high = history.length
+  while (low < high) {
+    const middle = (low + high) >> 1
+    if (history.at(middle).position <= start) low = middle + 1
+    else high = middle
+  }
 
-  try {
-    const { id, voteType, userId } = JSON.parse(event.body)
-    logger.info('Vote request received', { 
-      requestId,
-      subjectId: id,
-      voteType,
-      userId 
-    })
+  const entries = new Map()
+  for (let i = low; i < history.length && history.at(i).position <= end; i++) {
+    const entry = history.at(i)
+    entries.set(entry.position, entry)
+  }
+  if (entries.size < end - start) {
+    for (const entry of await archivedEntries(subject.id, start + 1, end)) {
+      if (!entries.has(entry.position)) entries.set(entry.position, entry)
+    }
+  }
+  return [...entries.values()].sort((a, b) => b.position - a.position)
+}
 
-    await Promise.all([subjectsDb.read(), usersDb.read()])
-    
-    const user = initializeUser(userId)
-    if (user.points < VOTE_COST) {
-      logger.error('Insufficient points', {}, { userId, points: user.points })
-      throw new Error('Not enough points to vote')
+// Newest first. ?cursor=<position> continues with the entries below that
+// position; positions run from 1 to the subject's vote count.
+export const getSubjectHistory = async (event) => {
+  try {
+    const id = Number(event.pathParameters?.id)
+    const query = event.queryStringParameters || {}
+    const limit = query.limit === undefined ? HISTORY_PAGE_SIZE : Number(query.limit)
+    const cursor = query.cursor === undefined ? null : Number(query.cursor)
+    if (!Number.isInteger(limit) || limit < 1 || limit > HISTORY_MAX_PAGE_SIZE) {
+      return jsonResponse(400, { error: `limit must be between 1 and ${HISTORY_MAX_PAGE_SIZE}` })
+    }
+    if (cursor !== null && (!Number.isInteger(cursor) || cursor < 1)) {
+      return jsonResponse(400, { error: 'Invalid cursor' })
     }
 
+    await loadState()
     const subject = subjectsDb.data.subjects.find(s => s.id === id)
     if (!subject) {
-      logger.error('Subject not found', {}, { id })
-      throw new Error('Subject not found')
+      return jsonResponse(404, { error: 'Subject not found' })
     }
 
-    if (!subject.votes) subject.votes = { up: 0, down: 0 }
-    if (!subject.voterHistory) subject.voterHistory = []
+    const total = historyLength(subject)
+    const end = cursor === null ? total : Math.min(cursor - 1, total)
+    const start = Math.max(end - limit, 0)
+    const etag = etagFor(dataVersion(), `-history-${id}-${cursor ?? ''}-${limit}`)
+    // Checked first so a revalidation never reads the archive
+    if (notModified(event, etag)) {
+      return cachedResponse(event, etag, 'no-cache', () => '')
+    }
+    const entries = await historyPage(subject, start, end)
+    return cachedResponse(event, etag, 'no-cache', () => JSON.stringify({
+      subjectId: id,
+      total,
+      entries,
+      nextCursor: start > 0 ? start + 1 : null
+    }))
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
 
-    const hasVoted = subject.voterHistory.some(vote => 
-      vote.userId === userId && vote.voteType === voteType
-    )
-    
-    if (hasVoted) {
-      logger.error('Duplicate vote attempt', {}, { userId, subjectId: id, voteType })
-      throw new Error('You have already voted this way on this subject')
+// One user's points record, for clients that show a single user. Users
+// who have not voted yet get the record they would start with.
+export const getUser = async (event) => {
+  try {
+    const userId = event.pathParameters?.id
+    if (!userId) {
+      return jsonResponse(400, { error: 'Missing user id' })
     }
 
-    user.points -= VOTE_COST
-    logger.info('Points deducted for vote', {
-      userId,
-      cost: VOTE_COST,
-      newTotal: user.points
+    await loadState()
+    const points = usersDb.data.points
+    return cachedResponse(event, etagFor(dataVersion(), `-user-${userId}`), 'no-cache', () => {
+      const user = points[userId] || initializeUser({}, userId)
+      const stats = userStats({ subjects: subjectsDb.data.subjects, points }, userId, user)
+      return JSON.stringify({
+        userId,
+        points: user.points,
+        upVoteRewards: user.upVoteRewards,
+        downVoteRewards: user.downVoteRewards,
+        stats
+      })
     })
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
 
-    subject.votes[voteType]++
-    subject.lastUpdated = new Date().toISOString()
-    
-    subject.voterHistory.push({
-      userId,
-      timestamp: new Date().toISOString(),
-      points: VOTE_COST,
-      voteType,
-      position: subject.voterHistory.length + 1
-    })
+const REWARDS_PAGE_SIZE = 50
+const REWARDS_MAX_PAGE_SIZE = 500
+
+// Most recent credits to a user from the reward ledger, newest first. Only
+// rewards paid by votes this backend recorded are listed; balances in
+// GET /users/{id} are the complete totals.
+export const getUserRewards = async (event) => {
+  try {
+    const userId = event.pathParameters?.id
+    const query = event.queryStringParameters || {}
+    const limit = query.limit === undefined ? REWARDS_PAGE_SIZE : Number(query.limit)
+    if (!userId) {
+      return jsonResponse(400, { error: 'Missing user id' })
+    }
+    if (!Number.isInteger(limit) || limit < 1 || limit > REWARDS_MAX_PAGE_SIZE) {
+      return jsonResponse(400, { error: `limit must be between 1 and ${REWARDS_MAX_PAGE_SIZE}` })
+    }
+
+    await loadState()
+    const points = usersDb.data.points
+    const user = points[userId]
+    const entries = user
+      ? await rewardsFor(userStats({ subjects: subjectsDb.data.subjects, points }, userId, user).votedOn, limit)
+      : []
+    return jsonResponse(200, { userId, entries })
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
+
+// Per-user aggregates maintained by the ledger on every vote, so this is
+// a lookup rather than a scan of every subject's history
+export const getUserStats = async (event) => {
+  try {
+    const userId = event.pathParameters?.id
+    if (!userId) {
+      return jsonResponse(400, { error: 'Missing user id' })
+    }
+
+    await loadState()
+    const points = usersDb.data.points
+    const user = points[userId]
+    return cachedResponse(event, etagFor(dataVersion(), `-stats-${userId}`), 'no-cache', () =>
+      JSON.stringify({
+        userId,
+        points: user ? user.points : INITIAL_POINTS,
+        stats: user ? userStats({ subjects: subjectsDb.data.subjects, points }, userId, user) : emptyStats()
+      })
+    )
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
+
+const isVote = (vote) =>
+  vote !== null && typeof vote === 'object' &&
+  Number.isInteger(vote.id) &&
+  (vote.voteType === 'up' || vote.voteType === 'down') &&
+  typeof vote.userId === 'string' && vote.userId !== ''
+
+export const recordVote = async (event) => {
+  const startTime = Date.now()
+  const requestId = event.requestContext?.requestId || 'unknown'
+
+  let vote
+  try {
+    vote = JSON.parse(event.body)
+  } catch (error) {
+    return jsonResponse(400, { success: false, error: 'Invalid JSON body' })
+  }
+  if (!isVote(vote)) {
+    return jsonResponse(400, { success: false, error: 'Invalid vote' })
+  }
 
-    logger.info('Vote recorded', {
+  try {
+    const { id, voteType, userId } = vote
+    logger.info('Vote request received', { 
+      requestId,
       subjectId: id,
       voteType,
-      userId,
-      position: subject.voterHistory.length
+      userId 
     })
 
-    await Promise.all([
-      subjectsDb.write(),
-      distributeRewards(id, voteType, userId)
-    ])
-
-    await usersDb.read()
-    const updatedUser = usersDb.data.points[userId]
+    const { subject, entry, user: updatedUser, version, seq } = await submitVote({ id, voteType, userId }, logger)
 
     // Log final points as DEBUG
     logger.debug('Points updated', {
@@ -282,8 +318,11 @@ const _recordVote = async (event) => {
       },
       body: JSON.stringify({ 
         success: true, 
-        subjects: subjectsDb.data.subjects,
+        subject,
+        entry,
         user: updatedUser,
+        version,
+        seq,
         message: `Vote recorded! Rewards distributed to previous voters.`
       })
     }
@@ -296,14 +335,15 @@ const _recordVote = async (event) => {
       userId
     })
 
-    logger.metric('Lambda execution metrics', {
+    logger.metric('Lambda execution metrics', () => ({
       requestId,
       functionName: 'recordVote',
       duration: `${duration} ms`,
       billedDuration: `${billedDuration} ms`,
       memoryUsed: process.memoryUsage().heapUsed,
+      cache: cacheStats(),
       timestamp: new Date().toISOString()
-    })
+    }))
 
     return response
   } catch (error) {
@@ -313,7 +353,7 @@ const _recordVote = async (event) => {
     })
 
     const duration = Date.now() - startTime
-    logger.metric('Lambda execution metrics', {
+    logger.metric('Lambda execution metrics', () => ({
       requestId,
       functionName: 'recordVote',
       duration: `${duration} ms`,
@@ -321,7 +361,7 @@ const _recordVote = async (event) => {
       memoryUsed: process.memoryUsage().heapUsed,
       status: 'error',
       timestamp: new Date().toISOString()
-    })
+    }))
 
     return {
       statusCode: 400,
@@ -337,42 +377,63 @@ const _recordVote = async (event) => {
   }
 }
 
-// Wrapper to prevent AWS default logging
-export const recordVote = async (event, context) => {
-  // Disable AWS Lambda's default logging
-  context.callbackWaitsForEmptyEventLoop = false
-  
-  // Store original console
-  const originalConsole = {
-    log: console.log,
-    error: console.error,
-    debug: console.debug
-  }
+const MAX_BATCH_VOTES = 10000
 
-  // Replace console temporarily
-  console.log = (...args) => {
-    if (typeof args[0] === 'string' && !args[0].includes('(λ: recordVote)')) {
-      originalConsole.log.apply(console, args)
-    }
-  }
-  console.error = (...args) => {
-    if (typeof args[0] === 'string' && !args[0].includes('(λ: recordVote)')) {
-      originalConsole.error.apply(console, args)
-    }
+// POST /votes: [{ id, voteType, userId }, ...] applied in order in one
+// commit. Each vote succeeds or fails on its own; results are in order.
+export const recordVotes = async (event) => {
+  const startTime = Date.now()
+  const requestId = event.requestContext?.requestId || 'unknown'
+
+  let votes
+  try {
+    votes = JSON.parse(event.body)
+  } catch (error) {
+    return jsonResponse(400, { success: false, error: 'Invalid JSON body' })
   }
-  console.debug = (...args) => {
-    if (typeof args[0] === 'string' && !args[0].includes('(λ: recordVote)')) {
-      originalConsole.debug.apply(console, args)
-    }
+  if (!Array.isArray(votes) || votes.length === 0 || votes.length > MAX_BATCH_VOTES) {
+    return jsonResponse(400, {
+      success: false,
+      error: `Body must be an array of 1 to ${MAX_BATCH_VOTES} votes`
+    })
   }
 
   try {
-    return await _recordVote(event)
-  } finally {
-    // Restore original console
-    console.log = originalConsole.log
-    console.error = originalConsole.error
-    console.debug = originalConsole.debug
+    logger.info('Batch vote request received', { requestId, votes: votes.length })
+
+    const valid = votes.filter(isVote).map(({ id, voteType, userId }) => ({ id, voteType, userId }))
+    const outcomes = valid.length ? await submitVotes(valid, logger) : []
+
+    let next = 0
+    const results = votes.map(vote => {
+      if (!isVote(vote)) return { success: false, error: 'Invalid vote' }
+      const { result, error } = outcomes[next++]
+      if (error) return { success: false, error: error.message }
+      return {
+        success: true,
+        subject: result.subject,
+        entry: result.entry,
+        points: result.user.points,
+        seq: result.seq
+      }
+    })
+    const committed = results.filter(result => result.success).length
+
+    const duration = Date.now() - startTime
+    logger.metric('Lambda execution metrics', () => ({
+      requestId,
+      functionName: 'recordVotes',
+      duration: `${duration} ms`,
+      votes: votes.length,
+      committed,
+      memoryUsed: process.memoryUsage().heapUsed,
+      timestamp: new Date().toISOString()
+    }))
+
+    return jsonResponse(200, { success: true, committed, rejected: votes.length - committed, results })
+  } catch (error) {
+    logger.error('Batch vote processing failed', error, { requestId })
+    return jsonResponse(500, { success: false, error: error.message })
   }
 }
 
@@ -383,7 +444,7 @@ export const options = async (event) => {
     headers: {
       'Access-Control-Allow-Origin': '*',
       'Access-Control-Allow-Methods': 'GET,POST,OPTIONS',
-      'Access-Control-Allow-Headers': 'Content-Type'
+      'Access-Control-Allow-Headers': 'Content-Type,If-None-Match'
     },
     body: JSON.stringify({})
   }
@@ -0,0 +1,450 @@
+// Balances, costs and rewards are integers in micro-points, MICRO_POINTS
+// to the point, so every sum is exact. Clients convert for display.
+export const MICRO_POINTS = 1000000
+export const VOTE_COST = 10 * MICRO_POINTS
+export const INITIAL_POINTS = 100 * MICRO_POINTS
+export const MIN_REWARD = 1
+export const REWARD_TIERS = {
+  TIER1: { max: 10, share: 5, reward: 500000 },
+  TIER2: { max: 100, share: 3, reward: 33000 },
+  TIER3: { max: 1000, share: 1.5, reward: 1670 },
+  TIER4: { max: 10000, share: 0.5, reward: 56 }
+}
+
+// Used when replaying stored votes, which must not be logged again
+const silentLogger = {
+  info: () => {},
+  error: () => {},
+  debug: () => {},
+  metric: () => {}
+}
+
+// Voter index per subject: ordered voters for each vote type plus a map of
+// userId:voteType to the voter's position among that type's voters, and
+// how many voterHistory entries it covers. Keyed by the subject object and
+// maintained incrementally while that object lives. A reload brings new
+// subject objects: the index last used for the subject's id carries over
+// when the new history still starts with the entries it covers, and only
+// the entries past them are indexed. Otherwise (reset, memory that was
+// ahead of disk) it is rebuilt with one pass over the history.
+const voterIndex = new WeakMap()
+const latestIndex = new Map()  // subject id -> index
+
+const memberKey = (userId, voteType) => `${userId}:${voteType}`
+
+const addToIndex = (index, userId, voteType) => {
+  const key = memberKey(userId, voteType)
+  if (index.members.has(key)) return
+  if (!index.voters[voteType]) index.voters[voteType] = []
+  index.voters[voteType].push(userId)
+  index.members.set(key, index.voters[voteType].length)
+}
+
+// Record the history as covered up to its current end
+const cover = (index, history) => {
+  index.covered = history.length
+  const last = history.at(-1)
+  index.last = last && { userId: last.userId, voteType: last.voteType, timestamp: last.timestamp }
+}
+
+const covers = (index, history) => {
+  if (history.length < index.covered) return false
+  if (!index.covered) return true
+  const entry = history.at(index.covered - 1)
+  return entry.userId === index.last.userId &&
+    entry.voteType === index.last.voteType &&
+    entry.timestamp === index.last.timestamp
+}
+
+const indexFor = (subject) => {
+  let index = voterIndex.get(subject)
+  if (index) return index
+
+  const history = subject.voterHistory || []
+  index = latestIndex.get(subject.id)
+  if (index && covers(index, history)) {
+    for (let i = index.covered; i < history.length; i++) {
+      const { userId, voteType } = history.at(i)
+      addToIndex(index, userId, voteType)
+    }
+  } else {
+    index = { voters: {}, members: new Map(), covered: 0, last: null }
+    if (history.forEachVote) {
+      // Columnar history (history.js): no entry objects needed
+      history.forEachVote((userId, timestamp, voteType) => addToIndex(index, userId, voteType))
+    } else {
+      for (const vote of history) {
+        addToIndex(index, vote.userId, vote.voteType)
+      }
+    }
+  }
+  cover(index, history)
+  voterIndex.set(subject, index)
+  latestIndex.set(subject.id, index)
+  return index
+}
+
+export const getVoters = (subject, voteType) => indexFor(subject).voters[voteType] || []
+
+export const hasVoted = (subject, userId, voteType) =>
+  indexFor(subject).members.has(memberKey(userId, voteType))
+
+// Called once the vote's entry is in voterHistory, or left out of it
+// because it was archived
+export const addVoter = (subject, userId, voteType) => {
+  const index = indexFor(subject)
+  addToIndex(index, userId, voteType)
+  cover(index, subject.voterHistory)
+}
+
+// Position among the subject's voters of that type, or undefined
+export const voterPosition = (subject, userId, voteType) =>
+  indexFor(subject).members.get(memberKey(userId, voteType))
+
+export const emptyStats = () => ({
+  upVoteDonations: 0,
+  downVoteDonations: 0,
+  upVoteRewards: 0,
+  downVoteRewards: 0,
+  votedOn: {}  // subjectId -> { up/down: voter position }
+})
+
+export const initializeUser = (points, userId, logger = silentLogger) => {
+  if (!points[userId]) {
+    logger.info('Initializing new user', { userId, initialPoints: INITIAL_POINTS })
+    points[userId] = {
+      points: INITIAL_POINTS,
+      upVoteRewards: {},
+      downVoteRewards: {},
+      stats: emptyStats()
+    }
+  }
+  return points[userId]
+}
+
+const sum = (values) => values.reduce((total, value) => total + value, 0)
+
+// Per-user aggregates kept on the user record and updated on every vote
+// and reward, so reading them never scans history. Records written before
+// stats existed get them derived once, on first use.
+export const userStats = (state, userId, user) => {
+  if (user.stats) return user.stats
+  const stats = emptyStats()
+  for (const subject of state.subjects) {
+    for (const voteType of ['up', 'down']) {
+      const position = voterPosition(subject, userId, voteType)
+      if (!position) continue
+      stats.votedOn[subject.id] = { ...stats.votedOn[subject.id], [voteType]: position }
+      stats[`${voteType}VoteDonations`] += VOTE_COST
+    }
+  }
+  stats.upVoteRewards = sum(Object.values(user.upVoteRewards || {}))
+  stats.downVoteRewards = sum(Object.values(user.downVoteRewards || {}))
+  user.stats = stats
+  return stats
+}
+
+// Stored documents carry pointsUnit: POINTS_UNIT. Data written while
+// balances were whole points has no marker; storage converts it in place
+// on load (migratePoints) and the next write stores it with the marker.
+export const POINTS_UNIT = 'micro'
+
+const toMicroPoints = (value) => Math.round(value * MICRO_POINTS)
+
+const toMicroPointsMap = (map = {}) =>
+  Object.fromEntries(Object.entries(map).map(([key, value]) => [key, toMicroPoints(value)]))
+
+export const migrateUser = (user) => {
+  user.points = toMicroPoints(user.points)
+  user.upVoteRewards = toMicroPointsMap(user.upVoteRewards)
+  user.downVoteRewards = toMicroPointsMap(user.downVoteRewards)
+  if (user.stats) {
+    for (const key of ['upVoteDonations', 'downVoteDonations', 'upVoteRewards', 'downVoteRewards']) {
+      user.stats[key] = toMicroPoints(user.stats[key])
+    }
+  }
+  return user
+}
+
+// Inline entries only: columnar history (history.js) has no points column
+export const migrateSubject = (subject) => {
+  if (Array.isArray(subject.voterHistory)) {
+    for (const entry of subject.voterHistory) entry.points = toMicroPoints(entry.points)
+  }
+  return subject
+}
+
+// Convert a subjects and a users document that lack the marker
+export const migratePoints = (subjectsData, usersData) => {
+  if (subjectsData.pointsUnit !== POINTS_UNIT) {
+    subjectsData.subjects.forEach(migrateSubject)
+    subjectsData.pointsUnit = POINTS_UNIT
+  }
+  if (usersData.pointsUnit !== POINTS_UNIT) {
+    Object.values(usersData.points).forEach(migrateUser)
+    usersData.pointsUnit = POINTS_UNIT
+  }
+}
+
+const creditReward = (state, voterId, voteType, subjectKey, amount, logger) => {
+  const user = initializeUser(state.points, voterId, logger)
+  const rewardCategory = `${voteType}VoteRewards`
+  userStats(state, voterId, user)[rewardCategory] += amount
+  user[rewardCategory][subjectKey] = (user[rewardCategory][subjectKey] || 0) + amount
+  user.points += amount
+}
+
+// Reward bands in position order, built once from REWARD_TIERS. Every voter
+// in a band gets the same reward, so distributions are computed per band
+// from counts instead of per position. Distribution stops at the first
+// band whose reward is below MIN_REWARD.
+export const REWARD_BANDS = []
+for (const [tier, { max, reward }] of Object.entries(REWARD_TIERS)) {
+  if (reward < MIN_REWARD) break
+  const from = REWARD_BANDS.length ? REWARD_BANDS[REWARD_BANDS.length - 1].to + 1 : 1
+  REWARD_BANDS.push({ tier, from, to: max, reward })
+}
+
+// Same-type voters past this position can never be paid a reward
+export const MAX_REWARDED_POSITION = REWARD_BANDS.length ? REWARD_BANDS[REWARD_BANDS.length - 1].to : 0
+
+export const calculateRewardForPosition = (position) => {
+  const band = REWARD_BANDS.find(b => position >= b.from && position <= b.to)
+  return band ? band.reward : 0
+}
+
+export const distributeRewards = (state, subjectId, voteType, currentVoterId, logger = silentLogger) => {
+  try {
+    const subject = state.subjects.find(s => s.id === subjectId)
+    if (!subject || !subject.voterHistory) {
+      logger.error('Invalid subject or voter history', {}, { subjectId })
+      return []
+    }
+
+    const voters = getVoters(subject, voteType)
+    const subjectKey = String(subjectId)
+    let totalDistributed = 0
+    const distributions = []
+
+    // Earlier voters in order; the current voter does not count towards
+    // positions. Voters past the last band are never visited.
+    let i = 0
+    let position = 0
+    for (const band of REWARD_BANDS) {
+      let count = 0
+      for (; position < band.to && i < voters.length; i++) {
+        const voterId = voters[i]
+        if (voterId === currentVoterId) continue
+        position++
+        count++
+        creditReward(state, voterId, voteType, subjectKey, band.reward, logger)
+      }
+      if (!count) break
+
+      const distribution = {
+        tier: band.tier,
+        fromPosition: band.from,
+        toPosition: band.from + count - 1,
+        count,
+        reward: band.reward,
+        total: count * band.reward
+      }
+      totalDistributed += distribution.total
+      distributions.push(distribution)
+    }
+
+    // Counts only: who got what is in the reward ledger (rewards.js)
+    logger.info('Distributed rewards', {
+      subjectId,
+      voteType,
+      rewardedVoters: position,
+      bands: distributions.length,
+      totalDistributed
+    })
+
+    return distributions
+  } catch (error) {
+    logger.error('Error in distributeRewards', error, {
+      subjectId,
+      voteType,
+      currentVoterId
+    })
+    return []
+  }
+}
+
+// Bands a vote pays when it has `earlier` same-type voters before it, in
+// the shape distributeRewards returns, without crediting anyone
+const bandsPaidBy = (earlier) => {
+  const distributions = []
+  for (const band of REWARD_BANDS) {
+    const count = Math.min(band.to, earlier) - band.from + 1
+    if (count <= 0) break
+    distributions.push({
+      tier: band.tier,
+      fromPosition: band.from,
+      toPosition: band.from + count - 1,
+      count,
+      reward: band.reward,
+      total: count * band.reward
+    })
+  }
+  return distributions
+}
+
+// Credit the rewards owed by the votes a (subject, vote type) group gained
+// since it had `start` voters. Each of those votes pays every voter before
+// it, so the voter at position p is owed (end - max(p, start)) rewards.
+const creditGroup = (state, { subject, voteType, start }, logger) => {
+  const voters = getVoters(subject, voteType)
+  const end = subject.votes[voteType]
+  const subjectKey = String(subject.id)
+
+  let position = 0
+  for (const band of REWARD_BANDS) {
+    for (; position < band.to && position < end; position++) {
+      const owed = end - Math.max(position + 1, start)
+      if (owed <= 0) break
+      creditReward(state, voters[position], voteType, subjectKey, band.reward * owed, logger)
+    }
+  }
+  logger.debug('Distributed batched rewards', { subjectId: subject.id, voteType, votes: end - start })
+}
+
+// Validate and apply one vote to state ({ subjects, points }) in memory.
+// Throws on a rejected vote; persisting the result is up to the caller.
+// With deferRewards the caller credits earlier voters itself (applyVotes).
+// With archive a vote past MAX_REWARDED_POSITION among its type's voters
+// is counted but left out of voterHistory (result.archived), for the
+// caller to store elsewhere. Counters include such votes, so they, not
+// voterHistory, give positions.
+export const applyVote = (state, vote, logger = silentLogger, { deferRewards = false, archive = false } = {}) => {
+  const { id, voteType, userId, timestamp } = vote
+
+  // Only these have counters, columns and reward ledgers
+  if (voteType !== 'up' && voteType !== 'down') {
+    logger.error('Invalid vote type', {}, { userId, voteType })
+    throw new Error('Invalid vote type')
+  }
+
+  const user = initializeUser(state.points, userId, logger)
+  if (user.points < VOTE_COST) {
+    logger.error('Insufficient points', {}, { userId, points: user.points })
+    throw new Error('Not enough points to vote')
+  }
+
+  const subject = state.subjects.find(s => s.id === id)
+  if (!subject) {
+    logger.error('Subject not found', {}, { id })
+    throw new Error('Subject not found')
+  }
+
+  if (!subject.votes) subject.votes = { up: 0, down: 0 }
+  if (!subject.voterHistory) subject.voterHistory = []
+
+  // Archived voters are only in their own stats
+  const stats = userStats(state, userId, user)
+  if (hasVoted(subject, userId, voteType) || stats.votedOn[id]?.[voteType]) {
+    logger.error('Duplicate vote attempt', {}, { userId, subjectId: id, voteType })
+    throw new Error('You have already voted this way on this subject')
+  }
+
+  user.points -= VOTE_COST
+  logger.info('Points deducted for vote', {
+    userId,
+    cost: VOTE_COST,
+    newTotal: user.points
+  })
+
+  subject.votes[voteType]++
+  subject.lastUpdated = timestamp
+
+  const rank = subject.votes[voteType]
+  const entry = {
+    userId,
+    timestamp,
+    points: VOTE_COST,
+    voteType,
+    position: historyLength(subject)
+  }
+  const archived = archive && rank > MAX_REWARDED_POSITION
+  if (!archived) subject.voterHistory.push(entry)
+  addVoter(subject, userId, voteType)
+  stats[`${voteType}VoteDonations`] += VOTE_COST
+  stats.votedOn[id] = { ...stats.votedOn[id], [voteType]: rank }
+
+  logger.info('Vote recorded', {
+    subjectId: id,
+    voteType,
+    userId,
+    position: entry.position
+  })
+
+  if (deferRewards) {
+    return { subject, user, entry, archived, distributions: bandsPaidBy(rank - 1) }
+  }
+  const distributions = distributeRewards(state, id, voteType, userId, logger)
+  return { subject, user, entry, archived, distributions }
+}
+
+// Votes recorded on the subject, archived ones included
+export const historyLength = (subject) => sum(Object.values(subject.votes || {}))
+
+// Remove the entries no reward can reach any more from voterHistory and
+// return them. applyVote with archive never adds such entries; this moves
+// the ones recorded without it. Their voters' stats are derived first,
+// while voterHistory still holds the entries: once archived, a vote is
+// only in stats.votedOn for the duplicate check in applyVote.
+export const takeColdEntries = (state, subject) => {
+  const ranks = {}
+  const hot = []
+  const cold = []
+  for (const entry of subject.voterHistory || []) {
+    ranks[entry.voteType] = (ranks[entry.voteType] || 0) + 1
+    ;(ranks[entry.voteType] > MAX_REWARDED_POSITION ? cold : hot).push(entry)
+  }
+  if (!cold.length) return cold
+
+  for (const { userId } of cold) {
+    const user = state.points[userId]
+    if (user) userStats(state, userId, user)
+  }
+  subject.voterHistory = hot
+  cover(indexFor(subject), hot)
+  return cold
+}
+
+// Apply votes in order with the same outcome as applyVote one by one, but
+// credit rewards once per (subject, vote type) for the whole run instead of
+// once per vote. Credits still owed to a voter are settled before their
+// next vote is validated, so balance checks see what they would have seen
+// one vote at a time. Returns { result } or { error } per vote, where
+// result is snapshot(applyVote's result) taken right after that vote.
+// archive is passed on to applyVote.
+export const applyVotes = (state, votes, logger = silentLogger, snapshot = (result) => result, { archive = false } = {}) => {
+  const pending = new Map()  // subjectId:voteType -> { subject, voteType, start }
+  const settle = (key, group) => {
+    creditGroup(state, group, logger)
+    pending.delete(key)
+  }
+
+  const results = votes.map(vote => {
+    for (const [key, group] of pending) {
+      if (hasVoted(group.subject, vote.userId, group.voteType)) settle(key, group)
+    }
+    try {
+      const result = applyVote(state, vote, logger, { deferRewards: true, archive })
+      const key = `${vote.id}:${vote.voteType}`
+      if (!pending.has(key)) {
+        const start = result.subject.votes[vote.voteType] - 1
+        pending.set(key, { subject: result.subject, voteType: vote.voteType, start })
+      }
+      return { result: snapshot(result) }
+    } catch (error) {
+      return { error }
+    }
+  })
+
+  for (const [key, group] of pending) settle(key, group)
+  return results
+}
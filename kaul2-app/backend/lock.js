@@ -0,0 +1,72 @@
+import { open, stat, unlink, utimes } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Cross-process write lock. Each process, and each worker thread
+// serverless-offline runs invocations in, has its own writer queue and
+// in-memory state, so every read-modify-write of the stored data runs
+// while holding writer.lock, created with O_EXCL. The holder touches the
+// file while it works; a lock left untouched for WRITE_LOCK_STALE_MS
+// belongs to a holder that died, and is broken. This covers processes
+// sharing the backend directory; Lambda instances do not share one.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+export const lockPath = path.join(__dirname, 'writer.lock')
+const WRITE_LOCK_STALE_MS = Number(process.env.WRITE_LOCK_STALE_MS) || 10000
+const RETRY_MS = 2
+const MAX_RETRY_MS = 50
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms))
+
+const statOrNull = async () => {
+  try {
+    return await stat(lockPath)
+  } catch (error) {
+    if (error.code === 'ENOENT') return null
+    throw error
+  }
+}
+
+const tryAcquire = async () => {
+  try {
+    const handle = await open(lockPath, 'wx')
+    await handle.writeFile(`${process.pid}\n`)
+    await handle.close()
+    return true
+  } catch (error) {
+    if (error.code === 'EEXIST') return false
+    throw error
+  }
+}
+
+const acquire = async () => {
+  for (let attempt = 0; !await tryAcquire(); attempt++) {
+    const held = await statOrNull()
+    if (held && Date.now() - held.mtimeMs > WRITE_LOCK_STALE_MS) {
+      // Only if it is still the same abandoned file
+      const current = await statOrNull()
+      if (current && current.ino === held.ino && current.mtimeMs === held.mtimeMs) {
+        await unlink(lockPath).catch(() => {})
+      }
+      continue
+    }
+    if (!held) continue
+    const delay = Math.min(RETRY_MS * 2 ** attempt, MAX_RETRY_MS)
+    await sleep(delay / 2 + Math.random() * delay / 2)
+  }
+}
+
+// Run fn while holding the lock; resolves or rejects with fn's outcome
+export const withWriteLock = async (fn) => {
+  await acquire()
+  const heartbeat = setInterval(() => {
+    const now = new Date()
+    utimes(lockPath, now, now).catch(() => {})
+  }, WRITE_LOCK_STALE_MS / 3)
+  heartbeat.unref()
+  try {
+    return await fn()
+  } finally {
+    clearInterval(heartbeat)
+    await unlink(lockPath).catch(() => {})
+  }
+}
@@ -0,0 +1,72 @@
+import { writeSync } from 'fs'
+
+// Structured JSON logger. Events below LOG_LEVEL (debug, info, error or
+// silent; default info) return before anything is serialized, and data may
+// be passed as a function so building it is skipped as well. Debug events
+// are sampled at LOG_DEBUG_SAMPLE_RATE. Lines are buffered and written in
+// one write after the current tick, straight to process.stdout, so console
+// wrappers such as serverless-offline's never see them.
+const LEVELS = { debug: 10, info: 20, metric: 20, error: 40, silent: 50 }
+const threshold = LEVELS[process.env.LOG_LEVEL?.toLowerCase()] ?? LEVELS.info
+const debugSampleRate = Number(process.env.LOG_DEBUG_SAMPLE_RATE ?? 1)
+const LOG_BUFFER_MAX_BYTES = 64 * 1024
+
+let buffer = []
+let bufferedBytes = 0
+let scheduled = false
+
+export const flushLogs = () => {
+  scheduled = false
+  if (!buffer.length) return
+  const text = buffer.join('')
+  buffer = []
+  bufferedBytes = 0
+  process.stdout.write(text)
+}
+
+const write = (line) => {
+  buffer.push(line)
+  bufferedBytes += line.length
+  if (bufferedBytes >= LOG_BUFFER_MAX_BYTES) {
+    flushLogs()
+  } else if (!scheduled) {
+    scheduled = true
+    setImmediate(flushLogs)
+  }
+}
+
+// No more ticks are coming: write what is left synchronously
+process.on('exit', () => {
+  if (buffer.length) writeSync(1, buffer.join(''))
+})
+
+const enabled = (level) => LEVELS[level] >= threshold
+
+const format = (level, message, data, extra) => JSON.stringify({
+  timestamp: new Date().toISOString(),
+  level: level.toUpperCase(),
+  message,
+  ...extra,
+  ...(typeof data === 'function' ? data() : data)
+}) + '\n'
+
+export const logger = {
+  info: (message, data = {}) => {
+    if (enabled('info')) write(format('info', message, data))
+  },
+  // Errors are rare and wanted promptly: buffered lines first, then stderr
+  error: (message, error = {}, data = {}) => {
+    if (!enabled('error')) return
+    flushLogs()
+    process.stderr.write(format('error', message, data, {
+      error: { name: error.name, message: error.message, stack: error.stack }
+    }))
+  },
+  debug: (message, data = {}) => {
+    if (!enabled('debug') || (debugSampleRate < 1 && Math.random() >= debugSampleRate)) return
+    write(format('debug', message, data, debugSampleRate < 1 ? { sampleRate: debugSampleRate } : {}))
+  },
+  metric: (message, metrics = {}) => {
+    if (enabled('metric')) write(format('metric', message, metrics))
+  }
+}
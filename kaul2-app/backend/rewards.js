@@ -0,0 +1,199 @@
+import { appendFile, mkdir, open, readdir, readFile, rename, stat, writeFile } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Reward ledger: one JSON line per (vote, reward band) the vote paid, in
+// commit order. Positions are ranks among the subject's voters of that
+// vote type, so a user's credits are the rows whose band covers the
+// user's own rank (stats.votedOn) and no row per credited voter is needed.
+// Rows are appended to rewards.log under the write lock (lock.js). Past
+// REWARD_LOG_MAX_BYTES it is sealed as rewards/<n>.log, numbered on from
+// the last segment and never rewritten, next to rewards/<n>.idx.json: the
+// highest position each subject:voteType reaches in it. Every vote pays
+// positions 1 and up, so a segment holds credits for a user exactly when
+// its index reaches one of the user's positions, and only those segments
+// are read. rewards.log.1, from before segments were kept, is the oldest.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+export const rewardsPath = path.join(__dirname, 'rewards.log')
+const segmentsPath = path.join(__dirname, 'rewards')
+const legacyPath = `${rewardsPath}.1`
+const REWARD_LOG_MAX_BYTES = Number(process.env.REWARD_LOG_MAX_BYTES) || 4 * 1024 * 1024
+
+const statOrNull = async (filePath) => {
+  try {
+    return await stat(filePath)
+  } catch (error) {
+    if (error.code === 'ENOENT') return null
+    throw error
+  }
+}
+
+// Complete lines only: the writer may be halfway through appending
+const parseRows = (text) => text.slice(0, text.lastIndexOf('\n') + 1)
+  .split('\n')
+  .filter(Boolean)
+  .map(line => JSON.parse(line))
+
+const readRows = async (filePath) => {
+  try {
+    return parseRows(await readFile(filePath, 'utf-8'))
+  } catch (error) {
+    if (error.code === 'ENOENT') return []
+    throw error
+  }
+}
+
+// subjectId:voteType -> highest toPosition among rows
+const indexRows = (rows) => {
+  const index = {}
+  for (const { subjectId, voteType, toPosition } of rows) {
+    const key = `${subjectId}:${voteType}`
+    index[key] = Math.max(index[key] || 0, toPosition)
+  }
+  return index
+}
+
+// Sealed segments, oldest first, as { name, logPath, indexPath }
+const listSegments = async () => {
+  let names = []
+  try {
+    names = await readdir(segmentsPath)
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+  }
+  const numbers = names
+    .map(name => /^(\d+)\.log$/.exec(name))
+    .filter(Boolean)
+    .map(([, number]) => Number(number))
+    .sort((a, b) => a - b)
+  const segments = numbers.map(number => ({
+    name: String(number),
+    logPath: path.join(segmentsPath, `${number}.log`),
+    indexPath: path.join(segmentsPath, `${number}.idx.json`)
+  }))
+  if (await statOrNull(legacyPath)) {
+    segments.unshift({ name: 'legacy', logPath: legacyPath, indexPath: null })
+  }
+  return segments
+}
+
+// Indexes once read, by segment path. A sealed segment never changes, but
+// reset_db removes them all and numbering starts over, so an index is
+// only used while the segment's inode and mtime are the ones it was read
+// for.
+const segmentIndexes = new Map()
+
+const indexOf = async (segment) => {
+  const file = await statOrNull(segment.logPath)
+  if (!file) {
+    segmentIndexes.delete(segment.logPath)
+    return {}
+  }
+  const cached = segmentIndexes.get(segment.logPath)
+  if (cached?.ino === file.ino && cached.mtimeMs === file.mtimeMs) return cached.index
+
+  let index
+  try {
+    index = segment.indexPath && JSON.parse(await readFile(segment.indexPath, 'utf-8'))
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+  }
+  // The legacy file, or a seal interrupted before its index was written
+  index = index || indexRows(await readRows(segment.logPath))
+  segmentIndexes.set(segment.logPath, { ino: file.ino, mtimeMs: file.mtimeMs, index })
+  return index
+}
+
+const seal = async () => {
+  const segments = await listSegments()
+  const last = segments.filter(({ name }) => name !== 'legacy').at(-1)
+  const number = last ? Number(last.name) + 1 : 1
+  await mkdir(segmentsPath, { recursive: true })
+  const index = indexRows(await readRows(rewardsPath))
+  await writeFile(path.join(segmentsPath, `${number}.idx.json`), JSON.stringify(index))
+  await rename(rewardsPath, path.join(segmentsPath, `${number}.log`))
+}
+
+// Rows are { timestamp, subjectId, voteType, voterId, tier, fromPosition,
+// toPosition, reward }; call with the write lock held
+export const appendRewards = async (rows) => {
+  if (!rows.length) return
+  await appendFile(rewardsPath, rows.map(row => JSON.stringify(row) + '\n').join(''))
+  if ((await stat(rewardsPath)).size > REWARD_LOG_MAX_BYTES) {
+    await seal()
+  }
+}
+
+// Rows of rewards.log, parsed once and then read on from where the last
+// read stopped; a seal or reset replaces the file, so start over then
+const active = { ino: null, offset: 0, rows: [] }
+
+const readActive = async () => {
+  let handle
+  try {
+    handle = await open(rewardsPath, 'r')
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+    Object.assign(active, { ino: null, offset: 0, rows: [] })
+    return active.rows
+  }
+
+  try {
+    const { ino, size } = await handle.stat()
+    if (ino !== active.ino || size < active.offset) {
+      Object.assign(active, { ino, offset: 0, rows: [] })
+    }
+    if (size > active.offset) {
+      const buffer = Buffer.alloc(size - active.offset)
+      await handle.read(buffer, 0, buffer.length, active.offset)
+      const end = buffer.lastIndexOf(0x0a) + 1
+      active.rows.push(...parseRows(buffer.toString('utf-8', 0, end)))
+      active.offset += end
+    }
+    return active.rows
+  } finally {
+    await handle.close()
+  }
+}
+
+const sameSegments = (a, b) =>
+  a.length === b.length && a.every((segment, i) => segment.logPath === b[i].logPath)
+
+// Credits in the ledger for a user whose stats.votedOn is votedOn, newest
+// first, reading sealed segments only until limit credits are found
+export const rewardsFor = async (votedOn, limit = Infinity) => {
+  const positions = Object.entries(votedOn).flatMap(([subjectId, types]) =>
+    Object.entries(types).map(([voteType, position]) => ({ key: `${subjectId}:${voteType}`, position }))
+  )
+  if (!positions.length) return []
+
+  // A seal between listing and reading would hide or repeat its rows
+  let segments = await listSegments()
+  let rows
+  for (;;) {
+    rows = await readActive()
+    const after = await listSegments()
+    if (sameSegments(segments, after)) break
+    segments = after
+  }
+
+  const credits = []
+  const collect = (rows) => {
+    for (let i = rows.length - 1; i >= 0 && credits.length < limit; i--) {
+      const { timestamp, subjectId, voteType, voterId, tier, fromPosition, toPosition, reward } = rows[i]
+      const position = votedOn[subjectId]?.[voteType]
+      if (position >= fromPosition && position <= toPosition) {
+        credits.push({ timestamp, subjectId, voteType, voterId, position, tier, reward })
+      }
+    }
+  }
+
+  collect(rows)
+  for (let i = segments.length - 1; i >= 0 && credits.length < limit; i--) {
+    const index = await indexOf(segments[i])
+    if (positions.some(({ key, position }) => index[key] >= position)) {
+      collect(await readRows(segments[i].logPath))
+    }
+  }
+  return credits
+}
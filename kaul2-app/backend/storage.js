@@ -0,0 +1,51 @@
+import { migratePoints } from './ledger.js'
+import subjectsDb from './subjects.js'
+import usersDb from './users.js'
+
+// Loads and commits run one at a time, so a reload can never replace the
+// in-memory documents between applying votes and writing them out
+let lock = Promise.resolve()
+const exclusive = (fn) => {
+  const run = lock.then(fn)
+  lock = run.catch(() => {})
+  return run
+}
+
+// Bumped whenever the in-memory data changes: a commit or a reload
+let version = 0
+
+const readState = async () => {
+  const { data: subjects } = subjectsDb
+  const { data: users } = usersDb
+  await Promise.all([subjectsDb.read(), usersDb.read()])
+  // Files still in whole points are written back converted by the next commit
+  migratePoints(subjectsDb.data, usersDb.data)
+  if (subjectsDb.data !== subjects || usersDb.data !== users) version++
+}
+
+export const loadState = () => exclusive(readState)
+
+export const dataVersion = () => version
+
+// Hit/miss counters of the in-memory document caches
+export const cacheStats = () => ({
+  subjects: { ...subjectsDb.adapter.stats },
+  users: { ...usersDb.adapter.stats }
+})
+
+// Load, let fn apply votes in memory and return them ({ vote, entry }
+// each), then persist once. If fn returns no votes, whatever it changed in
+// memory (users created by rejected votes, say) is dropped by reloading
+// next time. Resolves with the data version that includes the votes.
+export const transaction = (fn) => exclusive(async () => {
+  await readState()
+  const recorded = await fn()
+  if (!recorded.length) {
+    subjectsDb.adapter.invalidate()
+    usersDb.adapter.invalidate()
+    return version
+  }
+  await Promise.all([subjectsDb.write(), usersDb.write()])
+  version++
+  return version
+})
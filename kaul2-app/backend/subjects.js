@@ -1,5 +1,5 @@
 import { Low } from 'lowdb'
-import { JSONFile } from 'lowdb/node'
+import { CachedJSONFile } from './cachedFile.js'
 import path from 'path'
 import { fileURLToPath } from 'url'
 
@@ -7,33 +7,34 @@ const __dirname = path.dirname(fileURLToPath(import.meta.url))
 const dbPath = path.join(__dirname, 'subjects.json')
 
 const defaultData = {
+  pointsUnit: 'micro',
   subjects: [
-    { 
-      id: 1, 
+    {
+      id: 1,
       title: 'Kubernetes',
       emoji: '🚢',
       votes: { up: 0, down: 0 },
       voterHistory: [],
       lastUpdated: new Date().toISOString()
     },
-    { 
-      id: 2, 
+    {
+      id: 2,
       title: 'AWS Cloud',
       emoji: '☁️',
       votes: { up: 0, down: 0 },
       voterHistory: [],
       lastUpdated: new Date().toISOString()
     },
-    { 
-      id: 3, 
+    {
+      id: 3,
       title: 'Ubuntu Linux',
       emoji: '🐧',
       votes: { up: 0, down: 0 },
       voterHistory: [],
       lastUpdated: new Date().toISOString()
     },
-    { 
-      id: 4, 
+    {
+      id: 4,
       title: 'LangChain',
       emoji: '🔗',
       votes: { up: 0, down: 0 },
@@ -43,7 +44,7 @@ const defaultData = {
   ]
 }
 
-const subjectsDb = new Low(new JSONFile(dbPath), defaultData)
+const subjectsDb = new Low(new CachedJSONFile(dbPath), defaultData)
 
 // Initialize database
 await subjectsDb.read()
@@ -1,5 +1,5 @@
 import { Low } from 'lowdb'
-import { JSONFile } from 'lowdb/node'
+import { CachedJSONFile } from './cachedFile.js'
 import path from 'path'
 import { fileURLToPath } from 'url'
 
@@ -7,6 +7,7 @@ const __dirname = path.dirname(fileURLToPath(import.meta.url))
 const dbPath = path.join(__dirname, 'users.json')
 
 const defaultData = {
+  pointsUnit: 'micro',
   profiles: [
     { id: 'user1', name: 'Alice', avatar: '👩‍💻' },
     { id: 'user2', name: 'Bob', avatar: '👨‍💻' },
@@ -16,7 +17,7 @@ const defaultData = {
   points: {}  // Stores points and rewards for each user
 }
 
-const usersDb = new Low(new JSONFile(dbPath), defaultData)
+const usersDb = new Low(new CachedJSONFile(dbPath), defaultData)
 
 // Initialize database
 await usersDb.read()
@@ -0,0 +1,201 @@
+import subjectsDb from './subjects.js'
+import usersDb from './users.js'
+import { appendArchive, HISTORY_ARCHIVE } from './archive.js'
+import { publish } from './events.js'
+import { applyVotes, takeColdEntries } from './ledger.js'
+import { withWriteLock } from './lock.js'
+import { appendRewards } from './rewards.js'
+import { transaction } from './storage.js'
+
+// Group commit. Requests of one or more votes are queued and applied in
+// arrival order by one flush at a time. The first request into an idle
+// queue opens a GROUP_COMMIT_MS window; everything queued by the time it
+// closes (or while the previous commit was being written) is persisted in
+// one commit, and each caller resolves only after that commit. A request
+// is never split across commits. The queue is per process (or worker
+// thread); commits from different ones take turns on the write lock
+// (lock.js), each reloading what the others wrote first.
+const GROUP_COMMIT_MS = Number(process.env.GROUP_COMMIT_MS ?? 5)
+const GROUP_COMMIT_MAX_BATCH = Number(process.env.GROUP_COMMIT_MAX_BATCH) || 1000
+
+const queue = []
+let timer = null
+let flushing = false
+
+const schedule = (delay) => {
+  if (timer || flushing) return
+  timer = setTimeout(flush, delay)
+}
+
+// Whole requests up to GROUP_COMMIT_MAX_BATCH votes, and at least one
+const takeBatch = () => {
+  let count = 0
+  let size = 0
+  while (size < queue.length && (size === 0 || count + queue[size].votes.length <= GROUP_COMMIT_MAX_BATCH)) {
+    count += queue[size].votes.length
+    size++
+  }
+  return queue.splice(0, size)
+}
+
+// Snapshot the delta right after each vote: later votes in the batch
+// change the subject's counters and may credit this user again
+const toDelta = ({ subject, user, entry, distributions }) => ({
+  subject: { id: subject.id, votes: { ...subject.votes }, lastUpdated: subject.lastUpdated },
+  entry,
+  user: structuredClone(user),
+  distributions
+})
+
+// Reward ledger rows for a committed vote, one per band it paid
+const toRewardRows = ({ vote, result }) => result.distributions.map(({ tier, fromPosition, toPosition, reward }) => ({
+  timestamp: vote.timestamp,
+  subjectId: vote.id,
+  voteType: vote.voteType,
+  voterId: vote.userId,
+  tier,
+  fromPosition,
+  toPosition,
+  reward
+}))
+
+// Compact stream event for a committed vote: the subject's counters, the
+// new history entry, the voter's balance and the reward bands it paid
+const toEvent = ({ vote, result }) => ({
+  type: 'vote',
+  subject: result.subject,
+  entry: result.entry,
+  user: { id: vote.userId, points: result.user.points },
+  rewards: result.distributions.map(({ fromPosition, toPosition, reward }) => ({ fromPosition, toPosition, reward }))
+})
+
+// Subjects whose voterHistory has been checked for entries recorded before
+// archiving was on. Keyed by the subject object, so reloads check again.
+const swept = new WeakSet()
+
+// Append the entries the batch archived, plus any the touched subjects
+// still hold past the last reward band, to the archive. If that fails they
+// go back into voterHistory, to be archived with the subject's next vote.
+// Resolves with the entries that ended up in the archive.
+const archiveHistory = async (state, subjects, archived, logger) => {
+  const cold = new Map()  // subject -> entries
+  for (const subject of subjects) {
+    if (swept.has(subject)) continue
+    swept.add(subject)
+    const entries = takeColdEntries(state, subject)
+    if (entries.length) cold.set(subject, entries)
+  }
+  for (const { subject, entry } of archived) {
+    cold.set(subject, [...(cold.get(subject) || []), entry])
+  }
+  if (!cold.size) return new Set()
+
+  try {
+    await appendArchive([...cold].flatMap(([subject, entries]) =>
+      entries.map(entry => ({ subjectId: subject.id, entry }))
+    ))
+    return new Set([...cold.values()].flat())
+  } catch (error) {
+    for (const [subject, entries] of cold) {
+      subject.voterHistory = [...subject.voterHistory, ...entries].sort((a, b) => a.position - b.position)
+      swept.delete(subject)
+    }
+    logger?.error('Failed to archive voter history', error)
+    return new Set()
+  }
+}
+
+const flush = async () => {
+  timer = null
+  flushing = true
+  const batch = takeBatch()
+  const logger = batch[0].logger
+  let outcomes = []
+  let accepted = []
+  let events = []
+
+  try {
+    // Reward rows and events are written under the same lock as the votes,
+    // so events are numbered in commit order across processes
+    const version = await withWriteLock(async () => {
+      const committed = await transaction(async () => {
+        const state = { subjects: subjectsDb.data.subjects, points: usersDb.data.points }
+        const votes = batch.flatMap(request =>
+          request.votes.map(vote => ({ ...vote, timestamp: new Date().toISOString() }))
+        )
+        const subjects = new Set()
+        const archived = []
+        const snapshot = (result) => {
+          subjects.add(result.subject)
+          if (result.archived) archived.push(result)
+          return toDelta(result)
+        }
+        outcomes = applyVotes(state, votes, logger, snapshot, { archive: HISTORY_ARCHIVE })
+          .map((outcome, index) => ({ ...outcome, vote: votes[index] }))
+        const archivedEntries = HISTORY_ARCHIVE
+          ? await archiveHistory(state, subjects, archived, logger)
+          : new Set()
+        return outcomes.filter(({ result }) => result).map(({ vote, result }) => ({
+          vote,
+          entry: archivedEntries.has(result.entry) ? null : result.entry
+        }))
+      })
+
+      accepted = outcomes.filter(({ result }) => result)
+      const rewardRows = accepted.flatMap(toRewardRows)
+      if (accepted.length) {
+        logger?.info('Group commit', {
+          batchSize: outcomes.length,
+          committed: accepted.length,
+          rewardRows: rewardRows.length
+        })
+      }
+
+      // The votes and balances are durable either way: the reward ledger
+      // is a record of them, and subscribers resync on a gap
+      try {
+        await appendRewards(rewardRows)
+      } catch (error) {
+        logger?.error('Failed to append reward ledger rows', error)
+      }
+      try {
+        if (accepted.length) events = await publish(accepted.map(toEvent))
+      } catch (error) {
+        logger?.error('Failed to publish vote events', error)
+      }
+      return committed
+    })
+
+    accepted.forEach((outcome, index) => {
+      outcome.result = { ...outcome.result, version, seq: events[index]?.seq ?? null }
+    })
+
+    let offset = 0
+    for (const request of batch) {
+      request.resolve(outcomes.slice(offset, offset + request.votes.length))
+      offset += request.votes.length
+    }
+  } catch (error) {
+    // Nothing from this batch is durable
+    for (const request of batch) request.reject(error)
+  } finally {
+    flushing = false
+    if (queue.length) schedule(0)
+  }
+}
+
+// Queue [{ id, voteType, userId }] to be applied in order in one commit.
+// Once committed resolves with { result } or { error } per vote, where
+// result is the vote's delta { subject: { id, votes, lastUpdated }, entry,
+// user, distributions, version, seq }; rejects if the commit fails.
+export const submitVotes = (votes, logger) => new Promise((resolve, reject) => {
+  queue.push({ votes, logger, resolve, reject })
+  schedule(GROUP_COMMIT_MS)
+})
+
+// Single vote: resolves with its delta, rejects if refused or not committed
+export const submitVote = async (vote, logger) => {
+  const [{ result, error }] = await submitVotes([vote], logger)
+  if (error) throw error
+  return result
+}
@@ -1,6 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 
+const EVENTS_URL = 'http://localhost:3002/events';
+
+// The API counts points in integer micro-points
+const MICRO_POINTS = 1000000;
+const formatPoints = (microPoints, digits = 1) => (microPoints / MICRO_POINTS).toFixed(digits);
+
 const EMOJIS = {
   UP: '\u{1F44D}',
   DOWN: '\u{1F44E}',
@@ -8,6 +14,30 @@ const EMOJIS = {
 };
 
 function SubjectDetail({ subject, onClose, selectedUser }) {
+  const [history, setHistory] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingHistory, setLoadingHistory] = useState(false);
+
+  useEffect(() => {
+    setHistory([]);
+    fetchHistory(null);
+  }, [subject.id, subject.votes?.up, subject.votes?.down]);
+
+  const fetchHistory = async (cursor) => {
+    try {
+      setLoadingHistory(true);
+      const query = cursor ? `?cursor=${cursor}` : '';
+      const response = await fetch(`http://localhost:3001/subjects/${subject.id}/history${query}`);
+      const data = await response.json();
+      setHistory(prev => cursor ? [...prev, ...(data.entries || [])] : (data.entries || []));
+      setNextCursor(data.nextCursor);
+    } catch (error) {
+      console.error('Error fetching history:', error);
+    } finally {
+      setLoadingHistory(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleString();
   };
@@ -35,9 +65,9 @@ function SubjectDetail({ subject, onClose, selectedUser }) {
           <div className="vote-history">
             <h3>Vote History</h3>
             <div className="vote-list">
-              {subject.voterHistory?.slice().reverse().map((vote, index) => (
+              {history.map(vote => (
                 <div 
-                  key={index} 
+                  key={vote.position} 
                   className={`vote-item ${vote.userId === selectedUser ? 'highlight' : ''}`}
                 >
                   <span className="emoji">
@@ -48,6 +78,15 @@ function SubjectDetail({ subject, onClose, selectedUser }) {
                   <span className="vote-time">{formatDate(vote.timestamp)}</span>
                 </div>
               ))}
+              {nextCursor && (
+                <button
+                  className="load-more-button"
+                  onClick={() => fetchHistory(nextCursor)}
+                  disabled={loadingHistory}
+                >
+                  {loadingHistory ? 'Loading...' : 'Load more'}
+                </button>
+              )}
             </div>
           </div>
         </div>
@@ -59,31 +98,116 @@ function SubjectDetail({ subject, onClose, selectedUser }) {
 function App() {
   const [subjects, setSubjects] = useState([]);
   const [selectedUser, setSelectedUser] = useState('user1');
-  const [userPoints, setUserPoints] = useState({});
+  // Only the selected user's record, from GET /users/{id}
+  const [activeUser, setActiveUser] = useState({ points: 100 * MICRO_POINTS, upVoteRewards: {}, downVoteRewards: {}, stats: null });
   const [userProfiles, setUserProfiles] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedSubject, setSelectedSubject] = useState(null);
+  const subjectsEtag = useRef(null);
+  const selectedUserRef = useRef(selectedUser);
+  const activeUserRef = useRef(activeUser);
+  const lastVoteSeq = useRef(null);
+  const refreshTimer = useRef(null);
+  selectedUserRef.current = selectedUser;
+  activeUserRef.current = activeUser;
+
+  useEffect(() => {
+    fetchProfiles();
+  }, []);
 
   useEffect(() => {
     fetchSubjects();
+    fetchUser(selectedUser);
   }, [selectedUser]);
 
-  const fetchSubjects = async () => {
+  // Live updates pushed by eventServer.js instead of polling. EventSource
+  // reconnects by itself and resumes after the last event id it saw.
+  useEffect(() => {
+    const events = new EventSource(EVENTS_URL);
+    events.addEventListener('vote', (message) => handleVoteEvent(JSON.parse(message.data)));
+    events.addEventListener('reset', () => {
+      subjectsEtag.current = null;
+      fetchSubjects({ quiet: true });
+    });
+    return () => {
+      events.close();
+      clearTimeout(refreshTimer.current);
+    };
+  }, []);
+
+  const fetchProfiles = async () => {
     try {
-      setLoading(true);
-      const response = await fetch('http://localhost:3001/subjects');
+      const response = await fetch('http://localhost:3001/profiles');
+      const data = await response.json();
+      setUserProfiles(data.userProfiles || []);
+    } catch (error) {
+      console.error('Error fetching profiles:', error);
+    }
+  };
+
+  const fetchSubjects = async ({ quiet = false } = {}) => {
+    try {
+      if (!quiet) setLoading(true);
+      // The list never shows voterHistory; the detail view pages through it
+      const response = await fetch('http://localhost:3001/subjects?view=summary&users=false', {
+        headers: subjectsEtag.current ? { 'If-None-Match': subjectsEtag.current } : {}
+      });
+      if (response.status === 304) return;  // Unchanged since the last fetch
       const data = await response.json();
       console.log('Fetched data:', data);  // Debug log
+      subjectsEtag.current = response.headers.get('ETag');
       setSubjects(data.subjects || []);
-      setUserPoints(data.users || {});
-      setUserProfiles(data.userProfiles || []);
     } catch (error) {
       console.error('Error fetching subjects:', error);
     } finally {
-      setLoading(false);
+      if (!quiet) setLoading(false);
+    }
+  };
+
+  const fetchUser = async (userId) => {
+    try {
+      const response = await fetch(`http://localhost:3001/users/${encodeURIComponent(userId)}`);
+      const data = await response.json();
+      if (userId === selectedUserRef.current) setActiveUser(data);
+    } catch (error) {
+      console.error('Error fetching user:', error);
     }
   };
 
+  // Apply a vote delta from the vote response or the event stream. The same
+  // vote can arrive both ways; counters only grow, so a subject whose count
+  // already includes it is skipped.
+  const mergeVoteDelta = ({ subject: changed, entry }) => {
+    setSubjects(prev => prev.map(subject => {
+      if (subject.id !== changed.id) return subject;
+      if ((subject.votes?.[entry.voteType] || 0) >= changed.votes[entry.voteType]) return subject;
+      return { ...subject, ...changed };
+    }));
+  };
+
+  // Coalesce refetches when a burst of events concerns the selected user
+  const scheduleRefresh = () => {
+    if (refreshTimer.current) return;
+    refreshTimer.current = setTimeout(() => {
+      refreshTimer.current = null;
+      fetchSubjects({ quiet: true });
+      fetchUser(selectedUserRef.current);
+    }, 250);
+  };
+
+  const handleVoteEvent = (delta) => {
+    const user = selectedUserRef.current;
+    // This vote paid the earlier voters of its type up to the last band's
+    // toPosition; the user's own position is kept in their stats
+    const position = activeUserRef.current.stats?.votedOn?.[delta.subject.id]?.[delta.entry.voteType];
+    const paidUpTo = Math.max(0, ...delta.rewards.map(band => band.toPosition));
+    const credited = delta.entry.userId !== user && position !== undefined && position <= paidUpTo;
+    const votedElsewhere = delta.entry.userId === user && delta.seq !== lastVoteSeq.current;
+
+    mergeVoteDelta(delta);
+    if (credited || votedElsewhere) scheduleRefresh();
+  };
+
   const handleVote = async (subjectId, voteType) => {
     try {
       const response = await fetch('http://localhost:3001/vote', {
@@ -99,11 +223,9 @@ function App() {
       console.log('Vote response:', data);  // Debug log
       
       if (data.success) {
-        setSubjects(data.subjects);
-        setUserPoints(prev => ({
-          ...prev,
-          [selectedUser]: data.user
-        }));
+        lastVoteSeq.current = data.seq;
+        mergeVoteDelta(data);
+        setActiveUser({ userId: selectedUser, ...data.user });
       } else {
         alert(data.error || 'Failed to vote');
       }
@@ -114,45 +236,17 @@ function App() {
   };
 
   const calculatePointsStats = () => {
-    const user = userPoints[selectedUser] || { 
-      points: 100, 
-      upVoteRewards: {}, 
-      downVoteRewards: {} 
-    };
-    
-    // Calculate rewards
-    const totalUpVoteRewards = Object.values(user.upVoteRewards || {})
-      .reduce((sum, reward) => sum + reward, 0);
-    const totalDownVoteRewards = Object.values(user.downVoteRewards || {})
-      .reduce((sum, reward) => sum + reward, 0);
-    
-    // Calculate donations (votes made by this user)
-    const donatedPoints = subjects.reduce((total, subject) => {
-      const userVotes = subject.voterHistory?.filter(vote => vote.userId === selectedUser) || [];
-      return total + (userVotes.length * 10); // Each vote costs 10 points
-    }, 0);
-
-    // Calculate donations by type
-    const upVoteDonations = subjects.reduce((total, subject) => {
-      const userUpVotes = subject.voterHistory?.filter(
-        vote => vote.userId === selectedUser && vote.voteType === 'up'
-      ) || [];
-      return total + (userUpVotes.length * 10);
-    }, 0);
-
-    const downVoteDonations = subjects.reduce((total, subject) => {
-      const userDownVotes = subject.voterHistory?.filter(
-        vote => vote.userId === selectedUser && vote.voteType === 'down'
-      ) || [];
-      return total + (userDownVotes.length * 10);
-    }, 0);
-    
+    const stats = activeUser.stats || {};
+    const upVoteRewards = stats.upVoteRewards || 0;
+    const downVoteRewards = stats.downVoteRewards || 0;
+    const upVoteDonations = stats.upVoteDonations || 0;
+    const downVoteDonations = stats.downVoteDonations || 0;
     return {
-      current: user.points || 100,
-      upVoteRewards: totalUpVoteRewards,
-      downVoteRewards: totalDownVoteRewards,
-      totalRewards: totalUpVoteRewards + totalDownVoteRewards,
-      donatedPoints,
+      current: activeUser.points,
+      upVoteRewards,
+      downVoteRewards,
+      totalRewards: upVoteRewards + downVoteRewards,
+      donatedPoints: upVoteDonations + downVoteDonations,
       upVoteDonations,
       downVoteDonations
     };
@@ -162,6 +256,8 @@ function App() {
     return <div className="loading">Loading...</div>;
   }
 
+  const pointsStats = calculatePointsStats();
+
   return (
     <div className="app">
       <div className="user-panel">
@@ -181,55 +277,55 @@ function App() {
           <div className="points-summary">
             <div className="points-row">
               <span>Current Points:</span>
-              <span className="points">{calculatePointsStats().current}</span>
+              <span className="points">{formatPoints(pointsStats.current)}</span>
             </div>
             
             <div className="section-divider">Rewards Earned</div>
             <div className="points-row">
               <span>From Upvotes:</span>
-              <span className="points up-rewards">+{calculatePointsStats().upVoteRewards.toFixed(1)}</span>
+              <span className="points up-rewards">+{formatPoints(pointsStats.upVoteRewards)}</span>
             </div>
             <div className="points-row">
               <span>From Downvotes:</span>
-              <span className="points down-rewards">+{calculatePointsStats().downVoteRewards.toFixed(1)}</span>
+              <span className="points down-rewards">+{formatPoints(pointsStats.downVoteRewards)}</span>
             </div>
             <div className="points-row total">
               <span>Total Rewards:</span>
-              <span className="points">+{calculatePointsStats().totalRewards.toFixed(1)}</span>
+              <span className="points">+{formatPoints(pointsStats.totalRewards)}</span>
             </div>
 
             <div className="section-divider">Points Donated</div>
             <div className="points-row">
               <span>Upvotes Given:</span>
-              <span className="points donated-up">-{calculatePointsStats().upVoteDonations}</span>
+              <span className="points donated-up">-{formatPoints(pointsStats.upVoteDonations, 0)}</span>
             </div>
             <div className="points-row">
               <span>Downvotes Given:</span>
-              <span className="points donated-down">-{calculatePointsStats().downVoteDonations}</span>
+              <span className="points donated-down">-{formatPoints(pointsStats.downVoteDonations, 0)}</span>
             </div>
             <div className="points-row total-donated">
               <span>Total Donated:</span>
-              <span className="points">-{calculatePointsStats().donatedPoints}</span>
+              <span className="points">-{formatPoints(pointsStats.donatedPoints, 0)}</span>
             </div>
           </div>
           
           <div className="rewards-breakdown">
             <h3>Rewards by Subject:</h3>
-            {Object.entries(userPoints[selectedUser]?.upVoteRewards || {}).map(([subjectId, reward]) => {
+            {Object.entries(activeUser.upVoteRewards || {}).map(([subjectId, reward]) => {
               const subject = subjects.find(s => s.id === parseInt(subjectId));
               return reward > 0 && (
                 <div key={`up-${subjectId}`} className="reward-item up">
                   <span>👍 {subject?.title || `Subject ${subjectId}`}:</span>
-                  <span className="reward-points">+{reward.toFixed(1)}</span>
+                  <span className="reward-points">+{formatPoints(reward)}</span>
                 </div>
               );
             })}
-            {Object.entries(userPoints[selectedUser]?.downVoteRewards || {}).map(([subjectId, reward]) => {
+            {Object.entries(activeUser.downVoteRewards || {}).map(([subjectId, reward]) => {
               const subject = subjects.find(s => s.id === parseInt(subjectId));
               return reward > 0 && (
                 <div key={`down-${subjectId}`} className="reward-item down">
                   <span>👎 {subject?.title || `Subject ${subjectId}`}:</span>
-                  <span className="reward-points">+{reward.toFixed(1)}</span>
+                  <span className="reward-points">+{formatPoints(reward)}</span>
                 </div>
               );
             })}
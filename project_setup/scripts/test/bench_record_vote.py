@@ -0,0 +1,160 @@
+"""Latency-vs-history-length scaling benchmark for recordVote.
+
+For each history size, reseeds the backend data so that subject 1 has that
+many upvotes (user1..userN, via the reset_db machinery), then sends
+sequential POST /vote requests from fresh users to subject 1 and a few
+GET /subjects against the running backend. Reports per-vote latency,
+response sizes, data file sizes and, with --server-pid on Linux, the
+bytes the server process read and wrote per vote.
+
+    python3 project_setup/scripts/test/bench_record_vote.py --sizes 10 1000 10000 100000 \\
+        --server-pid $(lsof -ti:3001 | head -1) --csv bench.csv --json bench.json
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import csv
+import json
+import statistics
+import sys
+import time
+
+from ledger import Ledger, to_epoch_ms
+from loadgen import HttpConnection, classify_vote, percentile
+from test_reset_db import DEFAULT_SUBJECTS, EPOCH, STORAGE_BACKENDS, write_dataset, write_lock
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+
+FIELDS = [
+    "history_size", "votes", "vote_ok", "vote_p50_ms", "vote_p95_ms", "vote_mean_ms",
+    "get_p50_ms", "vote_response_bytes", "get_response_bytes", "data_file_bytes",
+    "server_read_bytes_per_vote", "server_write_bytes_per_vote",
+]
+
+
+def seed_history(backend_path: Path, storage: str, size: int) -> int:
+    """Give subject 1 `size` upvotes from user1..userN; returns data file bytes"""
+    ledger = Ledger(range(1, len(DEFAULT_SUBJECTS) + 1))
+    start_ms = to_epoch_ms(EPOCH)
+    for user_number in range(1, size + 1):
+        ledger.record(1, f"user{user_number}", "up", start_ms + user_number * 1000)
+    ledger.settle_rewards()
+    with write_lock(backend_path):
+        paths = write_dataset(backend_path, storage, ledger, len(DEFAULT_SUBJECTS), size)
+    # The sharded backend's path is its directory of shard files
+    files = [file for path in paths for file in (path.iterdir() if path.is_dir() else [path])]
+    return sum(file.stat().st_size for file in files)
+
+
+def process_io(pid: Optional[int]) -> Optional[Dict[str, int]]:
+    """rchar/wchar of a process from /proc, or None where unavailable"""
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            fields = dict(line.split(":") for line in f.read().splitlines())
+        return {name: int(fields[name]) for name in ("rchar", "wchar")}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+async def measure(base_url: str, size: int, votes: int, gets: int,
+                  server_pid: Optional[int], settle: float) -> dict:
+    connection = HttpConnection(base_url, timeout=600)
+    try:
+        # Let the backend pick up the reseeded files, and warm it up
+        await asyncio.sleep(settle)
+        await connection.request("GET", "/subjects")
+
+        io_before = process_io(server_pid)
+        latencies: List[float] = []
+        vote_bytes = 0
+        ok = 0
+        run = int(time.time())
+        for i in range(votes):
+            body = {"id": 1, "voteType": "up", "userId": f"bench-{run}-{size}-{i}"}
+            started = time.perf_counter()
+            status, _, data = await connection.request("POST", "/vote", body)
+            latencies.append(time.perf_counter() - started)
+            vote_bytes += len(data)
+            ok += classify_vote(status, data) == "ok"
+        io_after = process_io(server_pid)
+
+        get_latencies: List[float] = []
+        get_bytes = 0
+        for _ in range(gets):
+            started = time.perf_counter()
+            _, _, data = await connection.request("GET", "/subjects")
+            get_latencies.append(time.perf_counter() - started)
+            get_bytes = len(data)
+    finally:
+        await connection.close()
+
+    latencies.sort()
+    get_latencies.sort()
+    result = {
+        "history_size": size,
+        "votes": votes,
+        "vote_ok": ok,
+        "vote_p50_ms": percentile(latencies, 0.50) * 1000,
+        "vote_p95_ms": percentile(latencies, 0.95) * 1000,
+        "vote_mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "get_p50_ms": percentile(get_latencies, 0.50) * 1000,
+        "vote_response_bytes": vote_bytes // votes if votes else 0,
+        "get_response_bytes": get_bytes,
+        "server_read_bytes_per_vote": None,
+        "server_write_bytes_per_vote": None,
+    }
+    if io_before and io_after and votes:
+        result["server_read_bytes_per_vote"] = (io_after["rchar"] - io_before["rchar"]) // votes
+        result["server_write_bytes_per_vote"] = (io_after["wchar"] - io_before["wchar"]) // votes
+    return result
+
+
+def run_benchmark(base_url: str, backend_path: Path, storage: str, sizes: List[int],
+                  votes: int, gets: int, server_pid: Optional[int], settle: float) -> List[dict]:
+    results = []
+    for size in sizes:
+        file_bytes = seed_history(backend_path, storage, size)
+        result = asyncio.run(measure(base_url, size, votes, gets, server_pid, settle))
+        result["data_file_bytes"] = file_bytes
+        results.append(result)
+        print(f"history {size:>7}: vote p50 {result['vote_p50_ms']:8.1f} ms, "
+              f"p95 {result['vote_p95_ms']:8.1f} ms, GET p50 {result['get_p50_ms']:8.1f} ms, "
+              f"data {file_bytes / 1e6:7.2f} MB, ok {result['vote_ok']}/{votes}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark recordVote latency against history size")
+    parser.add_argument("--base-url", default="http://localhost:3001")
+    parser.add_argument("--backend-path", type=Path, default=Path.cwd() / "kaul2-app" / "backend")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="lowdb")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--votes", type=int, default=20, help="votes measured per size")
+    parser.add_argument("--gets", type=int, default=5, help="GET /subjects measured per size")
+    parser.add_argument("--server-pid", type=int, help="backend process id for /proc I/O counters")
+    parser.add_argument("--settle", type=float, default=0.5,
+                        help="seconds to wait after reseeding (default: 0.5)")
+    parser.add_argument("--csv", type=Path, help="write the scaling curve as CSV")
+    parser.add_argument("--json", type=Path, help="write the scaling curve as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.base_url, args.backend_path, args.storage, args.sizes,
+                            args.votes, args.gets, args.server_pid, args.settle)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"storage": args.storage, "results": results}, f, indent=2)
+    if not args.csv and not args.json:
+        writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    sys.exit(0 if all(r["vote_ok"] == r["votes"] for r in results) else 1)
@@ -0,0 +1,170 @@
+"""Lost-update and consistency checker for the kaul2-app vote path.
+
+Fires many parallel POST /vote requests, each from a distinct new user, at
+a running backend, then reads the stored data (in the layout of --storage,
+default lowdb) and checks that:
+
+- every vote answered with success is in voterHistory exactly once, and
+  nothing else from this run is (lost or phantom updates)
+- votes.up/down match voterHistory and positions are dense (1..n)
+- no (user, subject, voteType) appears twice
+- points are conserved: sum(points) == INITIAL_POINTS * users
+  + sum(rewards) - VOTE_COST * votes
+- balances match a replay of the history (ledger.py)
+
+Archived voter history (HISTORY_ARCHIVE) is merged back into voterHistory
+first.
+
+    python3 project_setup/scripts/test/consistency_check.py --votes 2000 --concurrency 100
+    python3 project_setup/scripts/test/consistency_check.py --storage sqlite
+"""
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from ledger import INITIAL_POINTS, STORAGE_BACKENDS, VOTE_COST, Ledger, check_storage, read_backend
+from loadgen import HttpConnection, classify_vote
+
+
+async def fire_votes(base_url: str, run_id: str, votes: int, concurrency: int,
+                     subjects: int, seed: Optional[int] = None) -> dict:
+    """Send `votes` votes from distinct users; returns accepted votes and stats"""
+    rng = random.Random(seed)
+    pending = [
+        {"id": rng.randint(1, subjects), "voteType": rng.choice(("up", "down")),
+         "userId": f"{run_id}-{i}"}
+        for i in range(votes)
+    ]
+    accepted = []
+    outcomes = Counter()
+
+    async def worker():
+        connection = HttpConnection(base_url)
+        try:
+            while pending:
+                vote = pending.pop()
+                try:
+                    status, _, data = await connection.request("POST", "/vote", vote)
+                    outcome = classify_vote(status, data)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    outcome = "failure"
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    accepted.append(vote)
+        finally:
+            await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"accepted": accepted, "outcomes": outcomes, "elapsed": elapsed}
+
+
+def check_consistency(backend_path: Path, run_id: str, accepted: List[dict],
+                      storage: str = "lowdb") -> List[str]:
+    """Check the stored data against the accepted votes; returns violations
+
+    Raises FileNotFoundError if backend_path holds no data of that storage.
+    """
+    subjects, users = read_backend(backend_path, storage)
+    points = users.get("points", {})
+
+    violations = []
+    prefix = f"{run_id}-"
+    stored = Counter()
+    total_votes = 0
+
+    for subject in subjects:
+        history = subject.get("voterHistory") or []
+        total_votes += len(history)
+        counts = Counter(entry["voteType"] for entry in history)
+        for vote_type in set(counts) | set(subject.get("votes") or {}):
+            recorded = (subject.get("votes") or {}).get(vote_type, 0)
+            if recorded != counts[vote_type]:
+                violations.append(f"subject {subject['id']}: votes.{vote_type}={recorded} "
+                                  f"but voterHistory has {counts[vote_type]}")
+
+        seen = set()
+        for index, entry in enumerate(history):
+            if entry.get("position") != index + 1:
+                violations.append(f"subject {subject['id']}: entry {index} has position "
+                                  f"{entry.get('position')}, expected {index + 1}")
+            key = (entry["userId"], entry["voteType"])
+            if key in seen:
+                violations.append(f"subject {subject['id']}: duplicate {entry['voteType']} vote by {entry['userId']}")
+            seen.add(key)
+            if entry["userId"].startswith(prefix):
+                stored[(subject["id"], entry["userId"], entry["voteType"])] += 1
+
+    expected = Counter((vote["id"], vote["userId"], vote["voteType"]) for vote in accepted)
+    lost = expected - stored
+    phantom = stored - expected
+    for subject_id, user_id, vote_type in sorted(lost):
+        violations.append(f"lost update: {vote_type} vote by {user_id} on subject {subject_id} "
+                          f"was accepted but is not stored")
+    for subject_id, user_id, vote_type in sorted(phantom):
+        violations.append(f"phantom update: {vote_type} vote by {user_id} on subject {subject_id} "
+                          f"is stored but was not accepted")
+
+    total_points = sum(record.get("points", 0) for record in points.values())
+    total_rewards = sum(
+        sum((record.get(category) or {}).values())
+        for record in points.values()
+        for category in ("upVoteRewards", "downVoteRewards")
+    )
+    conserved = INITIAL_POINTS * len(points) + total_rewards - VOTE_COST * total_votes
+    if total_points != conserved:
+        violations.append(f"points not conserved: sum(points)={total_points}, expected "
+                          f"{INITIAL_POINTS} * {len(points)} + {total_rewards} "
+                          f"- {VOTE_COST} * {total_votes} = {conserved}")
+
+    ledger = Ledger(subject["id"] for subject in subjects)
+    ledger.load_history(subjects)
+    violations.extend(f"balance: {problem}" for problem in ledger.verify(points))
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the vote path for lost updates under parallel load")
+    parser.add_argument("--base-url", default="http://localhost:3001")
+    parser.add_argument("--backend-path", type=Path, default=Path.cwd() / "kaul2-app" / "backend")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="lowdb",
+                        help="storage backend the running backend was generated with (default: lowdb)")
+    parser.add_argument("--votes", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--subjects", type=int, default=4, help="vote on subjects 1..N")
+    parser.add_argument("--settle", type=float, default=0.5,
+                        help="seconds to wait before reading the data files (default: 0.5)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    # Before any votes are sent, so a wrong --storage costs nothing
+    try:
+        check_storage(args.backend_path, args.storage)
+    except FileNotFoundError as error:
+        print(f"❌ {error}")
+        sys.exit(1)
+
+    run_id = f"cc{int(time.time())}"
+    result = asyncio.run(fire_votes(args.base_url, run_id, args.votes, args.concurrency,
+                                    args.subjects, args.seed))
+    time.sleep(args.settle)
+
+    outcomes = result["outcomes"]
+    print(f"Sent {args.votes} votes at concurrency {args.concurrency} in {result['elapsed']:.1f}s "
+          f"({args.votes / result['elapsed']:.1f} votes/s)")
+    print(f"Outcomes: {', '.join(f'{name}={n}' for name, n in sorted(outcomes.items()))}")
+
+    violations = check_consistency(args.backend_path, run_id, result["accepted"], args.storage)
+    for violation in violations[:50]:
+        print(f"❌ {violation}")
+    if len(violations) > 50:
+        print(f"... and {len(violations) - 50} more")
+    if not violations:
+        print(f"✅ No violations: {len(result['accepted'])} accepted votes all stored once, "
+              f"counts, positions and balances consistent")
+    sys.exit(0 if not violations else 1)
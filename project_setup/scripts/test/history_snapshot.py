@@ -0,0 +1,145 @@
+"""Columnar voter history snapshots, as read by the generated history.js.
+
+The log storage backend keeps voterHistory out of votes.snapshot.json, in
+the votes.history.<generation>.bin file the snapshot names. Little-endian,
+each column aligned to its item size:
+
+    header      b"KVH1", u32 version, subjects, votes, users, dictionary
+                bytes, flags, reserved
+    subjects    u32 id and u32 vote count per subject
+    timestamps  i64 epoch milliseconds per vote
+    users       u32 dictionary index per vote
+    positions   u32 per vote, only with the POSITIONS flag
+    offsets     u32 per user plus one, into the dictionary
+    vote types  one bit per vote, set for "down"
+    dictionary  UTF-8 user ids
+
+Votes are grouped by subject in position order. Positions are implicit
+(1..n) unless archived entries left gaps, and every vote cost VOTE_COST.
+Version 1 files have a 24-byte header and no flags.
+
+    python3 project_setup/scripts/test/history_snapshot.py kaul2-app/backend/votes.history.0.bin
+"""
+from array import array
+from itertools import accumulate
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List
+import argparse
+import struct
+import sys
+
+from ledger import VOTE_COST, Ledger, SubjectColumns, to_iso
+
+MAGIC = b"KVH1"
+VERSION = 2
+HEADERS = {1: struct.Struct("<4s5I"), 2: struct.Struct("<4s7I")}
+POSITIONS = 1
+
+
+def _write_column(f: BinaryIO, values: array):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    f.write(values.tobytes())
+
+
+def write_history(f: BinaryIO, ledger: Ledger, subject_ids: Iterable[int]):
+    """Write the voter history of subject_ids, in that order, from ledger
+
+    A ledger's history has no gaps, so positions are left implicit.
+    """
+    if ledger.vote_type_names[:2] != ["up", "down"] or len(ledger.vote_type_names) > 2:
+        raise ValueError(f"Only up and down votes can be stored: {ledger.vote_type_names}")
+    subjects = [(subject_id, ledger.subjects.get(subject_id) or SubjectColumns(subject_id))
+                for subject_id in subject_ids]
+    votes = sum(len(columns) for _, columns in subjects)
+    names = [user_id.encode("utf-8") for user_id in ledger.user_ids]
+    offsets = array("I", accumulate((len(name) for name in names), initial=0))
+
+    f.write(HEADERS[VERSION].pack(MAGIC, VERSION, len(subjects), votes, len(names), offsets[-1], 0, 0))
+    table = array("I")
+    for subject_id, columns in subjects:
+        table.extend((subject_id, len(columns)))
+    _write_column(f, table)
+    for _, columns in subjects:
+        _write_column(f, columns.timestamps)
+    for _, columns in subjects:
+        _write_column(f, array("I", columns.users))
+    _write_column(f, offsets)
+
+    vote_types = bytearray((votes + 7) // 8)
+    index = 0
+    for _, columns in subjects:
+        for vote_type in columns.vote_types:
+            if vote_type:
+                vote_types[index >> 3] |= 1 << (index & 7)
+            index += 1
+    f.write(vote_types)
+    for name in names:
+        f.write(name)
+
+
+def _read_column(data: bytes, offset: int, typecode: str, count: int) -> array:
+    values = array(typecode)
+    values.frombytes(data[offset:offset + count * values.itemsize])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def read_history(path: Path) -> Dict[int, List[dict]]:
+    """Subject id -> voterHistory entries, as the backend serves them"""
+    data = Path(path).read_bytes()
+    magic, version = struct.unpack_from("<4sI", data)
+    if magic != MAGIC or version not in HEADERS:
+        raise ValueError(f"{path} is not a voter history snapshot")
+    header = HEADERS[version].unpack_from(data)
+    subjects, votes, users = header[2:5]
+    flags = header[6] if version > 1 else 0
+
+    offset = HEADERS[version].size
+    columns = []
+    layout = [("I", subjects * 2), ("q", votes), ("I", votes),
+              ("I", votes if flags & POSITIONS else 0), ("I", users + 1)]
+    for typecode, count in layout:
+        columns.append(_read_column(data, offset, typecode, count))
+        offset += count * columns[-1].itemsize
+    table, timestamps, user_column, positions, offsets = columns
+    vote_types = data[offset:offset + (votes + 7) // 8]
+    offset += len(vote_types)
+    user_ids = [data[offset + offsets[user]:offset + offsets[user + 1]].decode("utf-8")
+                for user in range(users)]
+
+    history: Dict[int, List[dict]] = {}
+    index = 0
+    for subject in range(subjects):
+        entries = history[table[2 * subject]] = []
+        for position in range(1, table[2 * subject + 1] + 1):
+            entries.append({
+                "userId": user_ids[user_column[index]],
+                "timestamp": to_iso(timestamps[index]),
+                "points": VOTE_COST,
+                "voteType": "down" if vote_types[index >> 3] >> (index & 7) & 1 else "up",
+                "position": positions[index] if positions else position,
+            })
+            index += 1
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise a voter history snapshot")
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args()
+
+    history = read_history(args.path)
+    votes = sum(len(entries) for entries in history.values())
+    users = len({entry["userId"] for entries in history.values() for entry in entries})
+    size = args.path.stat().st_size
+    print(f"{len(history)} subjects, {votes} votes, {users} users in {size} bytes"
+          + (f" ({size / votes:.1f} bytes per vote)" if votes else ""))
+    for subject_id, entries in history.items():
+        print(f"- subject {subject_id}: {len(entries)} votes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,619 @@
+"""Python reference implementation of the kaul2-app vote/reward ledger.
+
+Mirrors the rules in the ledger.js generated by test_phase03_01.py so that
+the stored voter history and balances can be replayed and checked offline,
+or votes simulated without starting serverless-offline.
+
+    python3 project_setup/scripts/test/ledger.py verify
+    python3 project_setup/scripts/test/ledger.py verify --storage sqlite
+    python3 project_setup/scripts/test/ledger.py simulate --votes 100000
+"""
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import heapq
+import json
+import random
+import sqlite3
+import sys
+import time
+
+# Balances, costs and rewards are integers in micro-points, MICRO_POINTS
+# to the point, so every sum is exact
+MICRO_POINTS = 1_000_000
+# Marker on stored documents in micro-points, as POINTS_UNIT in ledger.js
+POINTS_UNIT = "micro"
+VOTE_COST = 10 * MICRO_POINTS
+INITIAL_POINTS = 100 * MICRO_POINTS
+MIN_REWARD = 1
+REWARD_TIERS = {
+    "TIER1": {"max": 10, "share": 5, "reward": 500_000},
+    "TIER2": {"max": 100, "share": 3, "reward": 33_000},
+    "TIER3": {"max": 1000, "share": 1.5, "reward": 1_670},
+    "TIER4": {"max": 10000, "share": 0.5, "reward": 56},
+}
+
+# Storage backends create_db_files can generate, as in test_phase03_01.py
+STORAGE_BACKENDS = ("lowdb", "log", "sqlite", "sharded")
+
+# The file that holds each backend's data, which no other backend writes
+STORAGE_FILES = {
+    "lowdb": "subjects.json",
+    "log": "votes.snapshot.json",
+    "sqlite": "votes.db",
+    "sharded": "shards/index.json",
+}
+
+# PRAGMA user_version of a votes.db in micro-points, as POINTS_FORMAT in storage.js
+SQLITE_POINTS_FORMAT = 1
+
+
+def _reward_bands() -> List[Tuple[str, int, int, int]]:
+    """(tier, from_position, to_position, reward), stopping below MIN_REWARD"""
+    bands = []
+    for tier, rule in REWARD_TIERS.items():
+        if rule["reward"] < MIN_REWARD:
+            break
+        start = bands[-1][2] + 1 if bands else 1
+        bands.append((tier, start, rule["max"], rule["reward"]))
+    return bands
+
+
+REWARD_BANDS = _reward_bands()
+MAX_REWARDED_POSITION = REWARD_BANDS[-1][2] if REWARD_BANDS else 0
+
+
+def to_epoch_ms(timestamp: str) -> int:
+    """ISO-8601 timestamp as stored in voterHistory to epoch milliseconds"""
+    if not timestamp:
+        return 0
+    return int(datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def to_iso(epoch_ms: int) -> str:
+    """Epoch milliseconds to the toISOString() format used by the handler"""
+    moment = datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{epoch_ms % 1000:03d}Z"
+
+
+def reward_for_position(position: int) -> int:
+    """Reward paid to the earlier voter at position by each later voter"""
+    for _, start, end, reward in REWARD_BANDS:
+        if start <= position <= end:
+            return reward
+    return 0
+
+
+class VoteRejected(ValueError):
+    """A vote the handler would answer with 400"""
+
+
+class Vote:
+    """One vote as stored in voterHistory"""
+    __slots__ = ("subject_id", "user_id", "vote_type", "timestamp")
+
+    def __init__(self, subject_id: int, user_id: str, vote_type: str, timestamp: str = ""):
+        self.subject_id = subject_id
+        self.user_id = user_id
+        self.vote_type = vote_type
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"Vote({self.subject_id!r}, {self.user_id!r}, {self.vote_type!r}, {self.timestamp!r})"
+
+
+class SubjectColumns:
+    """Voter history of one subject, one array per column"""
+    __slots__ = ("subject_id", "users", "vote_types", "timestamps", "voters", "members")
+
+    def __init__(self, subject_id: int):
+        self.subject_id = subject_id
+        self.users = array("l")          # user index per history entry
+        self.vote_types = array("b")     # vote type index per history entry
+        self.timestamps = array("q")     # epoch milliseconds per history entry
+        self.voters: Dict[int, array] = {}   # vote type -> user indexes in order
+        self.members = set()             # member_key(user index, vote type index)
+
+    def __len__(self):
+        return len(self.users)
+
+
+def member_key(user: int, vote_type: int) -> int:
+    return (user << 8) | vote_type
+
+
+class Ledger:
+    """Subjects, voter history and user balances with the handler's rules"""
+
+    def __init__(self, subject_ids: Iterable[int] = ()):
+        self.subjects: Dict[int, SubjectColumns] = {}
+        self.user_ids: List[str] = []
+        self.user_index: Dict[str, int] = {}
+        self.points = array("q")
+        self.rewards: List[Dict[Tuple[int, int], int]] = []   # (subject, vote type) -> total
+        self.vote_type_names: List[str] = ["up", "down"]
+        self.vote_type_index: Dict[str, int] = {"up": 0, "down": 1}
+        for subject_id in subject_ids:
+            self.add_subject(subject_id)
+
+    def add_subject(self, subject_id: int) -> SubjectColumns:
+        columns = self.subjects.get(subject_id)
+        if columns is None:
+            columns = self.subjects[subject_id] = SubjectColumns(subject_id)
+        return columns
+
+    def user(self, user_id: str) -> int:
+        """Index of user_id, initialising the account like initializeUser"""
+        index = self.user_index.get(user_id)
+        if index is None:
+            index = self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.points.append(INITIAL_POINTS)
+            self.rewards.append({})
+        return index
+
+    def vote_type(self, name: str) -> int:
+        index = self.vote_type_index.get(name)
+        if index is None:
+            index = self.vote_type_index[name] = len(self.vote_type_names)
+            self.vote_type_names.append(name)
+        return index
+
+    def _append(self, columns: SubjectColumns, user: int, vote_type: int, timestamp: int):
+        columns.users.append(user)
+        columns.vote_types.append(vote_type)
+        columns.timestamps.append(timestamp)
+        columns.members.add(member_key(user, vote_type))
+        voters = columns.voters.get(vote_type)
+        if voters is None:
+            voters = columns.voters[vote_type] = array("l")
+        voters.append(user)
+
+    def apply_vote(self, vote: Vote) -> List[dict]:
+        """Validate and apply one vote, crediting earlier voters per band"""
+        user = self.user(vote.user_id)
+        if self.points[user] < VOTE_COST:
+            raise VoteRejected("Not enough points to vote")
+
+        columns = self.subjects.get(vote.subject_id)
+        if columns is None:
+            raise VoteRejected("Subject not found")
+
+        vote_type = self.vote_type(vote.vote_type)
+        if member_key(user, vote_type) in columns.members:
+            raise VoteRejected("You have already voted this way on this subject")
+
+        self.points[user] -= VOTE_COST
+        self._append(columns, user, vote_type, to_epoch_ms(vote.timestamp))
+
+        # The voter just appended is last, so earlier voters are the prefix
+        voters = columns.voters[vote_type]
+        earlier = len(voters) - 1
+        key = (vote.subject_id, vote_type)
+        distributions = []
+        for tier, start, end, reward in REWARD_BANDS:
+            stop = min(end, earlier)
+            if stop < start:
+                break
+            for position in range(start - 1, stop):
+                credited = voters[position]
+                self.points[credited] += reward
+                rewards = self.rewards[credited]
+                rewards[key] = rewards.get(key, 0) + reward
+            count = stop - start + 1
+            distributions.append({
+                "tier": tier,
+                "fromPosition": start,
+                "toPosition": stop,
+                "count": count,
+                "reward": reward,
+                "total": count * reward,
+            })
+        return distributions
+
+    def replay(self, votes: Iterable[Vote]) -> int:
+        """Apply votes in order through apply_vote; returns rejected count"""
+        rejected = 0
+        for vote in votes:
+            try:
+                self.apply_vote(vote)
+            except VoteRejected:
+                rejected += 1
+        return rejected
+
+    def record(self, subject_id: int, user_id: str, vote_type: str, timestamp: int = 0) -> bool:
+        """Append an accepted vote without crediting rewards.
+
+        Call settle_rewards() once all votes are recorded. Returns False for
+        a duplicate (user, vote type) on the subject, which is skipped.
+        """
+        columns = self.add_subject(subject_id)
+        user = self.user(user_id)
+        vote_type = self.vote_type(vote_type)
+        if member_key(user, vote_type) in columns.members:
+            return False
+        self.points[user] -= VOTE_COST
+        self._append(columns, user, vote_type, timestamp)
+        return True
+
+    def settle_rewards(self):
+        """Credit rewards for all recorded votes in closed form.
+
+        Every later same-type voter pays the voter at position p the reward
+        for p, so the total is reward(p) * (voters - p). This is O(votes)
+        rather than O(votes * rewarded voters).
+        """
+        for subject_id, columns in self.subjects.items():
+            for vote_type, voters in columns.voters.items():
+                total_voters = len(voters)
+                key = (subject_id, vote_type)
+                for tier, start, end, reward in REWARD_BANDS:
+                    for position in range(start, min(end, total_voters - 1) + 1):
+                        credited = voters[position - 1]
+                        amount = reward * (total_voters - position)
+                        self.points[credited] += amount
+                        rewards = self.rewards[credited]
+                        rewards[key] = rewards.get(key, 0) + amount
+
+    def load_history(self, subjects: Iterable[dict]):
+        """Load recorded voterHistory as-is and settle rewards in closed form.
+
+        History is trusted, since it only contains accepted votes.
+        """
+        for subject in subjects:
+            self.add_subject(subject["id"])
+            for entry in subject.get("voterHistory") or []:
+                self.record(subject["id"], entry["userId"], entry["voteType"],
+                            to_epoch_ms(entry.get("timestamp", "")))
+        self.settle_rewards()
+
+    def voted_on(self) -> Dict[int, Dict[str, Dict[str, int]]]:
+        """Per user index: subject id -> vote type -> position among that type's voters"""
+        voted: Dict[int, Dict[str, Dict[str, int]]] = {}
+        for subject_id, columns in self.subjects.items():
+            for vote_type, voters in columns.voters.items():
+                name = self.vote_type_names[vote_type]
+                for rank, user in enumerate(voters, start=1):
+                    voted.setdefault(user, {}).setdefault(str(subject_id), {})[name] = rank
+        return voted
+
+    def iter_points(self) -> Iterator[Tuple[str, dict]]:
+        """(user id, users.json "points" record) for every user, in order"""
+        voted = self.voted_on()
+        for user, user_id in enumerate(self.user_ids):
+            up_rewards, down_rewards = {}, {}
+            for (subject_id, vote_type), amount in self.rewards[user].items():
+                target = up_rewards if self.vote_type_names[vote_type] == "up" else down_rewards
+                target[str(subject_id)] = target.get(str(subject_id), 0) + amount
+            votes = voted.get(user, {})
+            donations = {"up": 0, "down": 0}
+            for vote_types in votes.values():
+                for name in vote_types:
+                    donations[name] += VOTE_COST
+            yield user_id, {
+                "points": self.points[user],
+                "upVoteRewards": up_rewards,
+                "downVoteRewards": down_rewards,
+                "stats": {
+                    "upVoteDonations": donations["up"],
+                    "downVoteDonations": donations["down"],
+                    "upVoteRewards": sum(up_rewards.values()),
+                    "downVoteRewards": sum(down_rewards.values()),
+                    "votedOn": votes,
+                },
+            }
+
+    def to_points(self) -> Dict[str, dict]:
+        """Balances in the shape of users.json "points" """
+        return dict(self.iter_points())
+
+    def verify(self, points: Dict[str, dict]) -> List[str]:
+        """Compare against users.json "points"; returns mismatch descriptions"""
+        problems = []
+        expected = self.to_points()
+        for user_id in sorted(set(expected) | set(points)):
+            want = expected.get(user_id, {"points": INITIAL_POINTS, "upVoteRewards": {}, "downVoteRewards": {}})
+            got = points.get(user_id, {"points": INITIAL_POINTS, "upVoteRewards": {}, "downVoteRewards": {}})
+            if want["points"] != got.get("points", 0):
+                problems.append(f"{user_id}: points {got.get('points')} != expected {want['points']}")
+            for category in ("upVoteRewards", "downVoteRewards"):
+                have = got.get(category) or {}
+                for subject_id in set(want[category]) | set(have):
+                    if want[category].get(subject_id, 0) != have.get(subject_id, 0):
+                        problems.append(
+                            f"{user_id}: {category}[{subject_id}] {have.get(subject_id, 0)} "
+                            f"!= expected {want[category].get(subject_id, 0)}"
+                        )
+            # Materialized per-user statistics, where the backend keeps them
+            if "stats" in got and "stats" in want:
+                problems.extend(f"{user_id}: {problem}"
+                                for problem in self._verify_stats(want["stats"], got["stats"]))
+        return problems
+
+    @staticmethod
+    def _verify_stats(want: dict, got: dict) -> List[str]:
+        problems = []
+        for name in ("upVoteDonations", "downVoteDonations", "upVoteRewards", "downVoteRewards"):
+            if want[name] != got.get(name, 0):
+                problems.append(f"stats.{name} {got.get(name)} != expected {want[name]}")
+        if want["votedOn"] != got.get("votedOn"):
+            problems.append(f"stats.votedOn {got.get('votedOn')} != expected {want['votedOn']}")
+        return problems
+
+
+def _subject_votes(order: int, subject: dict) -> Iterator[Tuple[tuple, Vote]]:
+    for position, entry in enumerate(subject.get("voterHistory") or []):
+        timestamp = entry.get("timestamp", "")
+        yield (timestamp, order, position), Vote(subject["id"], entry["userId"], entry["voteType"], timestamp)
+
+
+def history_votes(subjects: Iterable[dict]) -> Iterator[Vote]:
+    """All voterHistory entries as Votes, merged across subjects by timestamp"""
+    streams = [_subject_votes(order, subject) for order, subject in enumerate(subjects)]
+    for _, vote in heapq.merge(*streams, key=lambda item: item[0]):
+        yield vote
+
+
+def with_archive(backend_path: Path, subjects: List[dict]) -> List[dict]:
+    """subjects with their archived entries (archive/subject-<id>.log) merged
+    back into voterHistory, in position order
+
+    Read as the backend reads it: the last line per position wins, entries
+    still in voterHistory win over archived ones, and positions past the
+    subject's vote count were never committed.
+    """
+    merged = []
+    for subject in subjects:
+        path = backend_path / "archive" / f"subject-{subject['id']}.log"
+        if not path.exists():
+            merged.append(subject)
+            continue
+        total = sum((subject.get("votes") or {}).values())
+        entries = {}
+        with open(path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                entry = json.loads(line)
+                if entry["position"] <= total:
+                    entries[entry["position"]] = entry
+        for entry in subject.get("voterHistory") or []:
+            entries[entry["position"]] = entry
+        merged.append({**subject, "voterHistory": [entries[position] for position in sorted(entries)]})
+    return merged
+
+
+def _read_lowdb(backend_path: Path) -> Tuple[List[dict], dict]:
+    with open(backend_path / "subjects.json") as f:
+        subjects = json.load(f)["subjects"]
+    with open(backend_path / "users.json") as f:
+        users = json.load(f)
+    return subjects, users
+
+
+def _read_sharded(backend_path: Path) -> Tuple[List[dict], dict]:
+    shards_path = backend_path / "shards"
+    with open(shards_path / "index.json") as f:
+        index = json.load(f)
+    subjects = []
+    for shard in index["subjects"]:
+        with open(shards_path / shard["file"]) as f:
+            subjects.append(json.load(f))
+    points = {}
+    for name in index["users"]:
+        with open(shards_path / name) as f:
+            points.update(json.load(f)["points"])
+    return subjects, {"pointsUnit": index.get("pointsUnit"), "profiles": index.get("profiles", []),
+                      "points": points}
+
+
+def _read_sqlite(backend_path: Path) -> Tuple[List[dict], dict]:
+    connection = sqlite3.connect(backend_path / "votes.db")
+    try:
+        # One read transaction, so a commit cannot land between the tables
+        connection.execute("BEGIN")
+        subjects = [
+            {"id": subject_id, "title": title, "emoji": emoji, "votes": {"up": up, "down": down},
+             "voterHistory": [], "lastUpdated": last_updated}
+            for subject_id, title, emoji, up, down, last_updated in connection.execute(
+                "SELECT id, title, emoji, up, down, last_updated FROM subjects ORDER BY id")
+        ]
+        by_id = {subject["id"]: subject for subject in subjects}
+        for subject_id, user_id, vote_type, position, points, timestamp in connection.execute(
+                "SELECT subject_id, user_id, vote_type, history_position, points, timestamp FROM votes "
+                "ORDER BY subject_id, history_position"):
+            by_id[subject_id]["voterHistory"].append({
+                "userId": user_id, "timestamp": timestamp, "points": points,
+                "voteType": vote_type, "position": position,
+            })
+        points = {}
+        for user_id, balance, up_rewards, down_rewards, stats in connection.execute(
+                "SELECT id, points, up_vote_rewards, down_vote_rewards, stats FROM users"):
+            points[user_id] = {"points": balance, "upVoteRewards": json.loads(up_rewards),
+                               "downVoteRewards": json.loads(down_rewards)}
+            if stats:
+                points[user_id]["stats"] = json.loads(stats)
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        connection.close()
+    return subjects, {"pointsUnit": POINTS_UNIT if version >= SQLITE_POINTS_FORMAT else None,
+                      "points": points}
+
+
+def _replay_log(subjects: List[dict], points: Dict[str, dict], votes: List[dict]):
+    """Apply votes.log lines to the snapshot state, as the backend does on load
+
+    The lines hold only the votes. Each accepted one is appended to its
+    subject's voterHistory, and the balances it changed get what a ledger
+    replay of it adds. Their stats are dropped rather than rebuilt.
+    """
+    ledger = Ledger(subject["id"] for subject in subjects)
+    ledger.load_history(subjects)
+    before = ledger.to_points()
+    by_id = {subject["id"]: subject for subject in subjects}
+    for vote in votes:
+        try:
+            ledger.apply_vote(Vote(vote["id"], vote["userId"], vote["voteType"], vote["timestamp"]))
+        except VoteRejected:
+            continue
+        subject = by_id[vote["id"]]
+        counts = subject["votes"]
+        counts[vote["voteType"]] = counts.get(vote["voteType"], 0) + 1
+        subject["voterHistory"].append({
+            "userId": vote["userId"], "timestamp": vote["timestamp"], "points": VOTE_COST,
+            "voteType": vote["voteType"], "position": sum(counts.values()),
+        })
+        subject["lastUpdated"] = vote["timestamp"]
+
+    unchanged = {"points": INITIAL_POINTS, "upVoteRewards": {}, "downVoteRewards": {}}
+    for user_id, after in ledger.iter_points():
+        was = before.get(user_id, unchanged)
+        if after["points"] == was["points"] and all(
+                after[category] == was[category] for category in ("upVoteRewards", "downVoteRewards")):
+            continue
+        record = points.setdefault(user_id, {"points": INITIAL_POINTS, "upVoteRewards": {}, "downVoteRewards": {}})
+        record["points"] += after["points"] - was["points"]
+        for category in ("upVoteRewards", "downVoteRewards"):
+            rewards = record.setdefault(category, {})
+            for subject_id, amount in after[category].items():
+                added = amount - was[category].get(subject_id, 0)
+                if added:
+                    rewards[subject_id] = rewards.get(subject_id, 0) + added
+        record.pop("stats", None)
+
+
+def _read_log(backend_path: Path) -> Tuple[List[dict], dict]:
+    from history_snapshot import read_history  # imports this module
+
+    with open(backend_path / "votes.snapshot.json") as f:
+        snapshot = json.load(f)
+    subjects = snapshot["subjects"]["subjects"]
+    users = snapshot["users"]
+    if snapshot.get("history"):
+        histories = read_history(backend_path / snapshot["history"])
+        for subject in subjects:
+            subject["voterHistory"] = histories.get(subject["id"], [])
+    subjects = with_archive(backend_path, subjects)
+
+    votes = []
+    log_path = backend_path / "votes.log"
+    if log_path.exists():
+        with open(log_path) as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                if not line.strip():
+                    continue
+                vote = json.loads(line)
+                if vote.pop("g") == snapshot["generation"]:
+                    votes.append(vote)
+    if votes:
+        _replay_log(subjects, users.setdefault("points", {}), votes)
+    return subjects, users
+
+
+_READERS = {"lowdb": _read_lowdb, "sharded": _read_sharded, "sqlite": _read_sqlite}
+
+
+def check_storage(backend_path: Path, storage: str):
+    """Raise FileNotFoundError, naming the backends whose data is there
+    instead, if the storage backend's own file is missing"""
+    if not (backend_path / STORAGE_FILES[storage]).exists():
+        present = [f"{name} ({file})" for name, file in STORAGE_FILES.items() if (backend_path / file).exists()]
+        found = f"found {', '.join(present)}; pass the matching --storage" if present else "no backend's data is there"
+        raise FileNotFoundError(f"No {storage} data in {backend_path}: {STORAGE_FILES[storage]} is missing, {found}")
+
+
+def read_backend(backend_path: Path, storage: str = "lowdb") -> Tuple[List[dict], dict]:
+    """Subjects, with archived entries merged back, and the users document
+    ("pointsUnit", "points") held in the layout of the storage backend
+
+    Raises FileNotFoundError as check_storage() does.
+    """
+    check_storage(backend_path, storage)
+    if storage == "log":
+        return _read_log(backend_path)
+    subjects, users = _READERS[storage](backend_path)
+    return with_archive(backend_path, subjects), users
+
+
+def verify_backend(backend_path: Path, storage: str = "lowdb", incremental: bool = False) -> bool:
+    """Replay the stored voter history and check the stored balances against it"""
+    try:
+        subjects, users = read_backend(backend_path, storage)
+    except FileNotFoundError as error:
+        print(f"❌ {error}")
+        return False
+    if users.get("pointsUnit") != POINTS_UNIT:
+        print(f"❌ The {storage} balances are in whole points; the backend converts them on its next commit")
+        return False
+    points = users.get("points", {})
+
+    started = time.perf_counter()
+    ledger = Ledger(subject["id"] for subject in subjects)
+    if incremental:
+        rejected = ledger.replay(history_votes(subjects))
+    else:
+        ledger.load_history(subjects)
+        rejected = 0
+    elapsed = time.perf_counter() - started
+
+    votes = sum(len(columns) for columns in ledger.subjects.values())
+    print(f"Replayed {votes} votes for {len(ledger.user_ids)} users in {elapsed:.2f}s")
+    if rejected:
+        print(f"❌ {rejected} recorded votes would have been rejected")
+
+    problems = ledger.verify(points)
+    for problem in problems[:50]:
+        print(f"❌ {problem}")
+    if len(problems) > 50:
+        print(f"... and {len(problems) - 50} more")
+    if not problems and not rejected:
+        print(f"✅ The {storage} balances match the replayed ledger")
+    return not problems and not rejected
+
+
+def simulate(subjects: int, users: int, votes: int, seed: Optional[int] = None) -> Ledger:
+    """Apply random votes to a fresh ledger and report throughput"""
+    rng = random.Random(seed)
+    ledger = Ledger(range(1, subjects + 1))
+    vote_types = ("up", "down")
+
+    started = time.perf_counter()
+    rejected = ledger.replay(
+        Vote(rng.randint(1, subjects), f"user{rng.randint(1, users)}", rng.choice(vote_types))
+        for _ in range(votes)
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"Applied {votes - rejected} votes ({rejected} rejected) in {elapsed:.2f}s "
+          f"({votes / elapsed:,.0f} votes/s)")
+    return ledger
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline replay of the kaul2-app vote ledger")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = commands.add_parser("verify", help="check the stored balances against the voter history")
+    verify_parser.add_argument("--backend-path", type=Path, default=Path.cwd() / "kaul2-app" / "backend")
+    verify_parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="lowdb",
+                               help="storage backend whose data to read (default: lowdb)")
+    verify_parser.add_argument("--incremental", action="store_true",
+                               help="replay vote by vote with validation instead of closed form")
+
+    simulate_parser = commands.add_parser("simulate", help="apply random votes in memory")
+    simulate_parser.add_argument("--subjects", type=int, default=4)
+    simulate_parser.add_argument("--users", type=int, default=1000)
+    simulate_parser.add_argument("--votes", type=int, default=10000)
+    simulate_parser.add_argument("--seed", type=int)
+
+    args = parser.parse_args()
+    if args.command == "verify":
+        success = verify_backend(args.backend_path, args.storage, args.incremental)
+    else:
+        simulate(args.subjects, args.users, args.votes, args.seed)
+        success = True
+    sys.exit(0 if success else 1)
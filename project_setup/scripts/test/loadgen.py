@@ -0,0 +1,278 @@
+"""asyncio load generator for the kaul2-app backend.
+
+Drives POST /vote and GET /subjects on a running serverless-offline
+(see run_test_phase03_01.sh) at a fixed concurrency and request mix, then
+reports throughput, latency percentiles and outcomes. Vote responses the
+handler rejects on purpose (duplicate vote, insufficient points, unknown
+subject) are counted separately from failures.
+
+    python3 project_setup/scripts/test/loadgen.py --concurrency 50 --duration 30 --vote-ratio 0.2
+"""
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+
+# Error messages the handler returns with 400 for rejected votes
+BUSINESS_REJECTIONS = {
+    "You have already voted this way on this subject": "duplicate_vote",
+    "Not enough points to vote": "insufficient_points",
+    "Subject not found": "subject_not_found",
+}
+
+
+class HttpConnection:
+    """Minimal keep-alive HTTP/1.1 client connection on asyncio streams"""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: Optional[dict] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Send one request; returns (status, lower-cased headers, body)"""
+        try:
+            return await asyncio.wait_for(self._request(method, path, body, headers), self.timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _request(self, method, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        payload = json.dumps(body).encode() if body is not None else b""
+        lines = [f"{method} {self.prefix}{path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                 "Connection: keep-alive", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif status in (204, 304):
+            data = b""
+        else:
+            data = await self.reader.read()
+            await self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, data
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def classify_vote(status: int, body: bytes) -> str:
+    """ok, a BUSINESS_REJECTIONS category, or failure"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return "failure"
+    if status == 200 and data.get("success"):
+        return "ok"
+    if status == 400:
+        return BUSINESS_REJECTIONS.get(data.get("error"), "failure")
+    return "failure"
+
+
+class LoadStats:
+    """Latencies and outcomes per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.bytes_received = 0
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, endpoint: str, latency: float, outcome: str, size: int = 0):
+        self.latencies[endpoint].append(latency)
+        self.outcomes[endpoint][outcome] += 1
+        self.bytes_received += size
+
+    def summary(self) -> dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        endpoints = {}
+        total = 0
+        for endpoint, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            outcomes = self.outcomes[endpoint]
+            count = len(ordered)
+            total += count
+            rejections = sum(n for name, n in outcomes.items() if name in BUSINESS_REJECTIONS.values())
+            endpoints[endpoint] = {
+                "requests": count,
+                "throughput_rps": count / elapsed,
+                "latency_ms": {
+                    "p50": percentile(ordered, 0.50) * 1000,
+                    "p95": percentile(ordered, 0.95) * 1000,
+                    "p99": percentile(ordered, 0.99) * 1000,
+                    "max": ordered[-1] * 1000 if ordered else 0.0,
+                },
+                "outcomes": dict(outcomes),
+                "rejection_rate": rejections / count if count else 0.0,
+                "error_rate": outcomes["failure"] / count if count else 0.0,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "throughput_rps": total / elapsed,
+            "bytes_received": self.bytes_received,
+            "endpoints": endpoints,
+        }
+
+
+async def run_load(base_url: str, concurrency: int = 10, duration: Optional[float] = 10.0,
+                   requests: Optional[int] = None, vote_ratio: float = 0.2, users: int = 4,
+                   subjects: int = 4, up_ratio: float = 0.5, seed: Optional[int] = None,
+                   timeout: float = 30.0) -> LoadStats:
+    """Run `concurrency` workers until duration elapses or requests are sent"""
+    rng = random.Random(seed)
+    stats = LoadStats()
+    deadline = stats.started + duration if duration else None
+    remaining = [requests] if requests else None
+
+    def take() -> bool:
+        if deadline and time.perf_counter() >= deadline:
+            return False
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+        return True
+
+    async def worker():
+        connection = HttpConnection(base_url, timeout)
+        try:
+            while take():
+                if rng.random() < vote_ratio:
+                    endpoint = "POST /vote"
+                    body = {
+                        "id": rng.randint(1, subjects),
+                        "voteType": "up" if rng.random() < up_ratio else "down",
+                        "userId": f"user{rng.randint(1, users)}",
+                    }
+                    method, path = "POST", "/vote"
+                else:
+                    endpoint, method, path, body = "GET /subjects", "GET", "/subjects", None
+
+                started = time.perf_counter()
+                try:
+                    status, _, data = await connection.request(method, path, body)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    stats.record(endpoint, time.perf_counter() - started, "failure")
+                    continue
+                latency = time.perf_counter() - started
+
+                if endpoint == "POST /vote":
+                    outcome = classify_vote(status, data)
+                else:
+                    outcome = "ok" if status in (200, 304) else "failure"
+                stats.record(endpoint, latency, outcome, len(data))
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats.finished = time.perf_counter()
+    return stats
+
+
+def print_summary(summary: dict):
+    print(f"Sent {summary['requests']} requests in {summary['elapsed_s']:.1f}s "
+          f"({summary['throughput_rps']:.1f} req/s, {summary['bytes_received'] / 1e6:.1f} MB received)")
+    for endpoint, result in summary["endpoints"].items():
+        latency = result["latency_ms"]
+        print(f"\n{endpoint}: {result['requests']} requests, {result['throughput_rps']:.1f} req/s")
+        print(f"  latency p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+              f"p99 {latency['p99']:.1f} ms, max {latency['max']:.1f} ms")
+        print(f"  outcomes: {', '.join(f'{name}={n}' for name, n in sorted(result['outcomes'].items()))}")
+        print(f"  business rejections {result['rejection_rate']:.1%}, errors {result['error_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test POST /vote and GET /subjects")
+    parser.add_argument("--base-url", default="http://localhost:3001")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (default: 10)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead")
+    parser.add_argument("--vote-ratio", type=float, default=0.2,
+                        help="share of requests that are POST /vote (default: 0.2)")
+    parser.add_argument("--users", type=int, default=4, help="vote as user1..userN")
+    parser.add_argument("--subjects", type=int, default=4, help="vote on subjects 1..N")
+    parser.add_argument("--up-ratio", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run_load(
+        args.base_url,
+        concurrency=args.concurrency,
+        duration=None if args.requests else args.duration,
+        requests=args.requests,
+        vote_ratio=args.vote_ratio,
+        users=args.users,
+        subjects=args.subjects,
+        up_ratio=args.up_ratio,
+        seed=args.seed,
+        timeout=args.timeout,
+    ))
+    summary = stats.summary()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+    sys.exit(0 if summary["requests"] else 1)
@@ -1,8 +1,22 @@
 #!/bin/bash
 # Auto-generated runner for test_phase03_01
+# Usage: run_test_phase03_01.sh [--storage lowdb|log|sqlite|sharded] [--reset]
+#   --storage  storage backend to generate (default: lowdb)
+#   --reset    reset that backend's data with test_reset_db.py before starting
+
+STORAGE=lowdb
+RESET=0
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --storage) STORAGE="$2"; shift 2 ;;
+        --storage=*) STORAGE="${1#--storage=}"; shift ;;
+        --reset) RESET=1; shift ;;
+        *) echo "Unknown option: $1"; exit 1 ;;
+    esac
+done
 
 # First run the Python setup script
-python3 /Users/kk/Documents/shared/softwares/git_repo/kaultoken/project_setup/scripts/test/test_phase03_01.py
+python3 /Users/kk/Documents/shared/softwares/git_repo/kaultoken/project_setup/scripts/test/test_phase03_01.py --storage "$STORAGE"
 
 if [ $? -ne 0 ]; then
     echo "Python setup failed!"
@@ -19,10 +33,16 @@ echo "Starting servers for kaul2-app..."
 # Kill any existing processes
 echo "Cleaning up existing processes..."
 lsof -ti:3001 | xargs kill -9 2>/dev/null || true
+lsof -ti:3002 | xargs kill -9 2>/dev/null || true
 lsof -ti:5173 | xargs kill -9 2>/dev/null || true
 
+if [ "$RESET" -eq 1 ]; then
+    echo "Resetting $STORAGE data..."
+    python3 /Users/kk/Documents/shared/softwares/git_repo/kaultoken/project_setup/scripts/test/test_reset_db.py --storage "$STORAGE" || exit 1
+fi
+
 # Install dependencies if needed
-if [ ! -d "$BACKEND_PATH/node_modules" ]; then
+if [ ! -d "$BACKEND_PATH/node_modules" ] || [ "$BACKEND_PATH/package.json" -nt "$BACKEND_PATH/node_modules" ]; then
     echo "Installing backend dependencies..."
     cd $BACKEND_PATH && npm install
 fi
@@ -37,16 +57,21 @@ echo "Starting backend server..."
 cd $BACKEND_PATH && npm run dev &
 BACKEND_PID=$!
 
+echo "Starting event stream server..."
+cd $BACKEND_PATH && node eventServer.js &
+EVENTS_PID=$!
+
 echo "Starting frontend server..."
 cd $FRONTEND_PATH && npm run dev &
 FRONTEND_PID=$!
 
 # Handle termination
-trap "kill $BACKEND_PID $FRONTEND_PID" SIGINT SIGTERM EXIT
+trap "kill $BACKEND_PID $EVENTS_PID $FRONTEND_PID" SIGINT SIGTERM EXIT
 
 echo "🚀 Servers started!"
 echo "📱 Frontend: http://localhost:5173"
 echo "⚙️  Backend: http://localhost:3001"
+echo "📡 Events: http://localhost:3002/events"
 echo ""
 echo "Points System:"
 echo "- Each user starts with 100 points"
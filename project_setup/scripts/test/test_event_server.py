@@ -0,0 +1,118 @@
+"""GET /events of the generated eventServer.js with an empty and a filled buffer
+
+Runs the server from kaul2-app/backend on a free port, in a temporary
+directory of its own, so events.log starts out as each test writes it.
+Needs node; skipped without it.
+"""
+from pathlib import Path
+import json
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+
+BACKEND_PATH = Path(__file__).resolve().parents[3] / "kaul2-app" / "backend"
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def event_server(tmp_path):
+    """Start eventServer.js over tmp_path; yields (port, process)"""
+    servers = []
+
+    def start(events=()):
+        for name in ("eventServer.js", "events.js"):
+            shutil.copy(BACKEND_PATH / name, tmp_path / name)
+        (tmp_path / "package.json").write_text('{"type": "module"}')
+        if events:
+            (tmp_path / "events.log").write_text("".join(json.dumps(event) + "\n" for event in events))
+        port = free_port()
+        process = subprocess.Popen(
+            ["node", "eventServer.js"], cwd=tmp_path,
+            env={"PATH": shutil.os.environ["PATH"], "EVENTS_PORT": str(port)},
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        servers.append(process)
+        assert "Event stream on" in process.stdout.readline()
+        return port, process
+
+    yield start
+    for process in servers:
+        process.kill()
+        process.wait()
+
+
+def get_events(port, query="", headers=None, wait=0.5):
+    """Status line and whatever the stream sent within wait seconds"""
+    lines = [f"GET /events{query} HTTP/1.1", "Host: localhost", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+        sock.settimeout(wait)
+        received = b""
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                break
+            if not chunk:
+                break
+            received += chunk
+    head, _, body = received.decode().partition("\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+def event_ids(body):
+    return [int(line[4:]) for line in body.splitlines() if line.startswith("id: ")]
+
+
+@pytest.mark.parametrize("request_args", [
+    {"query": "?since=-1"},
+    {"headers": {"Last-Event-ID": "-3"}},
+])
+def test_negative_since_is_rejected_with_empty_buffer(event_server, request_args):
+    port, process = event_server()
+    status, body = get_events(port, **request_args)
+    assert status == 400
+    error = next(line for line in body.splitlines() if line.startswith("{"))
+    assert "negative" in json.loads(error)["error"]
+    # Still serving
+    assert get_events(port, "?since=0")[0] == 200
+    assert process.poll() is None
+
+
+@pytest.mark.parametrize("query", ["", "?since=0", "?since=7"])
+def test_empty_buffer_streams_without_replay(event_server, query):
+    port, process = event_server()
+    status, body = get_events(port, query)
+    assert status == 200
+    assert event_ids(body) == []
+    assert process.poll() is None
+
+
+def test_negative_since_is_rejected_with_events(event_server):
+    port, process = event_server([{"seq": seq, "type": "vote"} for seq in (1, 2, 3)])
+    assert get_events(port, "?since=-1")[0] == 400
+    assert process.poll() is None
+
+
+def test_replay_and_reset(event_server):
+    port, _ = event_server([{"seq": seq, "type": "vote"} for seq in (5, 6, 7)])
+    status, body = get_events(port, "?since=5")
+    assert status == 200
+    assert event_ids(body) == [6, 7]
+
+    # Older than the buffer reaches: a reset at the last seq instead
+    status, body = get_events(port, "?since=2")
+    assert status == 200
+    assert event_ids(body) == [7]
+    assert "event: reset" in body
@@ -1,14 +1,19 @@
 from pathlib import Path
+import argparse
 import os
 import json
 from typing import Dict, Any
 import shutil
 
+# Storage backends create_db_files can generate
+STORAGE_BACKENDS = ("lowdb", "log", "sqlite", "sharded")
+
 class ProjectSetup:
-    def __init__(self, project_name: str, phase: str, task: str):
+    def __init__(self, project_name: str, phase: str, task: str, storage: str = "lowdb"):
         self.project_name = project_name
         self.phase = phase
         self.task = task
+        self.storage = storage
         self.script_name = f"test_phase{phase}_{task}"
         self.base_path = Path.cwd()
         self.project_path = self.base_path / project_name
@@ -22,46 +27,53 @@ class ProjectSetup:
         self.scripts_path.mkdir(parents=True, exist_ok=True)
         print(f"Created directories at {self.backend_path}")
 
-    def create_db_files(self):
-        """Create separate db files for subjects and users"""
-        
-        # subjects.js
-        subjects_db_code = """import { Low } from 'lowdb'
-import { JSONFile } from 'lowdb/node'
-import path from 'path'
-import { fileURLToPath } from 'url'
-
-const __dirname = path.dirname(fileURLToPath(import.meta.url))
-const dbPath = path.join(__dirname, 'subjects.json')
-
-const defaultData = {
+    def create_db_files(self, storage: str = "lowdb"):
+        """Create separate db files for subjects and users
+
+        storage selects how votes are persisted:
+        - "lowdb": subjects.json/users.json rewritten whole on every vote,
+          re-parsed only when they changed on disk (cachedFile.js)
+        - "log": votes appended to votes.log, state rebuilt from
+          votes.snapshot.json plus the log tail, compacted periodically;
+          voter history is snapshotted in columnar form (history.js)
+        - "sqlite": tables in votes.db (WAL), each commit writing only the
+          rows it changed; needs better-sqlite3, added to package.json
+        - "sharded": shards/ with one JSON file per subject, users hashed
+          into a fixed number of files and an index naming them; each
+          commit writes only the shards it changed and swaps the index
+        """
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend: {storage}")
+
+        subjects_default_data = """{
+  pointsUnit: 'micro',
   subjects: [
-    { 
-      id: 1, 
+    {
+      id: 1,
       title: 'Kubernetes',
       emoji: '🚢',
       votes: { up: 0, down: 0 },
       voterHistory: [],
       lastUpdated: new Date().toISOString()
     },
-    { 
-      id: 2, 
+    {
+      id: 2,
       title: 'AWS Cloud',
       emoji: '☁️',
       votes: { up: 0, down: 0 },
       voterHistory: [],
       lastUpdated: new Date().toISOString()
     },
-    { 
-      id: 3, 
+    {
+      id: 3,
       title: 'Ubuntu Linux',
       emoji: '🐧',
       votes: { up: 0, down: 0 },
       voterHistory: [],
       lastUpdated: new Date().toISOString()
     },
-    { 
-      id: 4, 
+    {
+      id: 4,
       title: 'LangChain',
       emoji: '🔗',
       votes: { up: 0, down: 0 },
@@ -69,9 +81,31 @@ const defaultData = {
       lastUpdated: new Date().toISOString()
     }
   ]
-}
+}"""
+
+        users_default_data = """{
+  pointsUnit: 'micro',
+  profiles: [
+    { id: 'user1', name: 'Alice', avatar: '👩‍💻' },
+    { id: 'user2', name: 'Bob', avatar: '👨‍💻' },
+    { id: 'user3', name: 'Charlie', avatar: '🧑‍💻' },
+    { id: 'user4', name: 'Diana', avatar: '👩‍🔬' }
+  ],
+  points: {}  // Stores points and rewards for each user
+}"""
+
+        # subjects.js
+        subjects_db_code = """import { Low } from 'lowdb'
+import { CachedJSONFile } from './cachedFile.js'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+const dbPath = path.join(__dirname, 'subjects.json')
 
-const subjectsDb = new Low(new JSONFile(dbPath), defaultData)
+const defaultData = """ + subjects_default_data + """
+
+const subjectsDb = new Low(new CachedJSONFile(dbPath), defaultData)
 
 // Initialize database
 await subjectsDb.read()
@@ -85,231 +119,2768 @@ export default subjectsDb
 
         # users.js
         users_db_code = """import { Low } from 'lowdb'
-import { JSONFile } from 'lowdb/node'
+import { CachedJSONFile } from './cachedFile.js'
 import path from 'path'
 import { fileURLToPath } from 'url'
 
 const __dirname = path.dirname(fileURLToPath(import.meta.url))
 const dbPath = path.join(__dirname, 'users.json')
 
-const defaultData = {
-  profiles: [
-    { id: 'user1', name: 'Alice', avatar: '👩‍💻' },
-    { id: 'user2', name: 'Bob', avatar: '👨‍💻' },
-    { id: 'user3', name: 'Charlie', avatar: '🧑‍💻' },
-    { id: 'user4', name: 'Diana', avatar: '👩‍🔬' }
-  ],
-  points: {}  // Stores points and rewards for each user
+const defaultData = """ + users_default_data + """
+
+const usersDb = new Low(new CachedJSONFile(dbPath), defaultData)
+
+// Initialize database
+await usersDb.read()
+if (!usersDb.data) {
+  usersDb.data = defaultData
+  await usersDb.write()
+}
+
+export default usersDb
+"""
+
+        # cachedFile.js: lowdb adapter keeping a warm container's parsed data
+        cached_file_code = """import { stat } from 'fs/promises'
+import { JSONFile } from 'lowdb/node'
+
+// Keeps the parsed document in memory between invocations and only
+// re-parses the file when its inode, size or mtime differ from what this
+// process last read or wrote. lowdb writes via tmp file + rename, so a
+// write from another process always shows up as a new inode.
+export class CachedJSONFile {
+  constructor(filename) {
+    this.filename = filename
+    this.file = new JSONFile(filename)
+    this.data = null
+    this.signature = null
+    this.stats = { hits: 0, misses: 0 }
+  }
+
+  async currentSignature() {
+    try {
+      const { ino, size, mtimeMs } = await stat(this.filename)
+      return `${ino}:${size}:${mtimeMs}`
+    } catch (error) {
+      if (error.code === 'ENOENT') return null
+      throw error
+    }
+  }
+
+  async read() {
+    const signature = await this.currentSignature()
+    if (signature && signature === this.signature) {
+      this.stats.hits++
+      return this.data
+    }
+    this.stats.misses++
+    this.data = await this.file.read()
+    this.signature = signature
+    return this.data
+  }
+
+  // Re-parse the file on the next read, dropping in-memory changes
+  invalidate() {
+    this.signature = null
+  }
+
+  async write(data) {
+    // Memory may be ahead of disk if the write fails, so reload next time
+    this.signature = null
+    await this.file.write(data)
+    this.data = data
+    this.signature = await this.currentSignature()
+  }
+}
+"""
+
+        # history.js: columnar voter history for the log backend's snapshots
+        history_code = """import { VOTE_COST } from './ledger.js'
+
+// Columnar voter history, the format of votes.history.<generation>.bin.
+// Little-endian, each column aligned to its item size:
+//   header      'KVH1', u32 version, subjects, votes, users, dictionary
+//               bytes, flags, reserved
+//   subjects    u32 id and u32 vote count per subject
+//   timestamps  i64 epoch milliseconds per vote
+//   users       u32 dictionary index per vote
+//   positions   u32 per vote, only with the POSITIONS flag
+//   offsets     u32 per user plus one, into the dictionary
+//   vote types  one bit per vote, set for down
+//   dictionary  UTF-8 user ids
+// Votes are grouped by subject in position order. Positions are implicit
+// (1..n) unless archived entries left gaps. Every vote cost VOTE_COST.
+// Version 1 files have a 24-byte header and no flags. Keep in sync with
+// history_snapshot.py.
+const MAGIC = 0x3148564b  // 'KVH1'
+const VERSION = 2
+const HEADER_BYTES = { 1: 24, 2: 32 }
+const POSITIONS = 1
+
+// One subject's voterHistory: a window onto the snapshot columns, viewed
+// in place, plus the votes recorded since as plain entries. Supports the
+// array operations the ledger and handlers use; entries of the snapshot
+// part are built on access.
+export class VoterHistory {
+  constructor(columns = null, start = 0, count = 0) {
+    this.columns = columns
+    this.start = start
+    this.count = count
+    this.tail = []
+  }
+
+  get length() {
+    return this.count + this.tail.length
+  }
+
+  at(index) {
+    if (index < 0) index += this.length
+    if (index < 0 || index >= this.length) return undefined
+    if (index >= this.count) return this.tail[index - this.count]
+
+    const { timestamps, users, positions, voteTypes, userIds } = this.columns
+    const i = this.start + index
+    return {
+      userId: userIds[users[i]],
+      timestamp: new Date(Number(timestamps[i])).toISOString(),
+      points: VOTE_COST,
+      voteType: (voteTypes[i >> 3] >> (i & 7)) & 1 ? 'down' : 'up',
+      position: positions ? positions[i] : index + 1
+    }
+  }
+
+  push(...entries) {
+    return this.count + this.tail.push(...entries)
+  }
+
+  slice(start = 0, end = this.length) {
+    const clamp = (index) => Math.min(Math.max(index < 0 ? index + this.length : index, 0), this.length)
+    const from = clamp(start)
+    return Array.from({ length: Math.max(clamp(end) - from, 0) }, (_, i) => this.at(from + i))
+  }
+
+  * [Symbol.iterator] () {
+    for (let i = 0; i < this.length; i++) yield this.at(i)
+  }
+
+  // (userId, epoch ms, voteType, position) per vote without building entries
+  forEachVote(fn) {
+    if (this.count) {
+      const { timestamps, users, positions, voteTypes, userIds } = this.columns
+      for (let i = this.start; i < this.start + this.count; i++) {
+        const voteType = (voteTypes[i >> 3] >> (i & 7)) & 1 ? 'down' : 'up'
+        fn(userIds[users[i]], Number(timestamps[i]), voteType, positions ? positions[i] : i - this.start + 1)
+      }
+    }
+    for (const { userId, timestamp, voteType, position } of this.tail) {
+      fn(userId, Date.parse(timestamp) || 0, voteType, position)
+    }
+  }
+
+  toJSON() {
+    return this.slice()
+  }
+}
+
+const forEachVote = (history, fn) => {
+  if (history instanceof VoterHistory) return history.forEachVote(fn)
+  for (const { userId, timestamp, voteType, position } of history) {
+    fn(userId, Date.parse(timestamp) || 0, voteType, position)
+  }
+}
+
+// Typed arrays are little-endian on every platform Node supports
+const bytesOf = (array) => Buffer.from(array.buffer, array.byteOffset, array.byteLength)
+
+export const encodeHistory = (subjects) => {
+  const histories = subjects.map(subject => subject.voterHistory || [])
+  const votes = histories.reduce((total, history) => total + history.length, 0)
+  const table = new Uint32Array(subjects.length * 2)
+  const timestamps = new BigInt64Array(votes)
+  const users = new Uint32Array(votes)
+  const positions = new Uint32Array(votes)
+  const voteTypes = new Uint8Array(Math.ceil(votes / 8))
+  const userIndex = new Map()
+  const names = []
+
+  let i = 0
+  let dense = true
+  subjects.forEach((subject, s) => {
+    table[2 * s] = subject.id
+    table[2 * s + 1] = histories[s].length
+    const start = i
+    forEachVote(histories[s], (userId, timestamp, voteType, position) => {
+      let user = userIndex.get(userId)
+      if (user === undefined) {
+        user = names.push(Buffer.from(userId, 'utf-8')) - 1
+        userIndex.set(userId, user)
+      }
+      timestamps[i] = BigInt(timestamp)
+      users[i] = user
+      positions[i] = position
+      if (position !== i - start + 1) dense = false
+      if (voteType === 'down') voteTypes[i >> 3] |= 1 << (i & 7)
+      else if (voteType !== 'up') throw new Error(`Unknown vote type: ${voteType}`)
+      i++
+    })
+  })
+
+  const offsets = new Uint32Array(names.length + 1)
+  names.forEach((name, user) => { offsets[user + 1] = offsets[user] + name.length })
+
+  const header = Buffer.alloc(HEADER_BYTES[VERSION])
+  const fields = [MAGIC, VERSION, subjects.length, votes, names.length, offsets[names.length], dense ? 0 : POSITIONS]
+  fields.forEach((value, field) => header.writeUInt32LE(value, field * 4))
+  return Buffer.concat([header, bytesOf(table), bytesOf(timestamps), bytesOf(users),
+    ...(dense ? [] : [bytesOf(positions)]), bytesOf(offsets), voteTypes, ...names])
+}
+
+// Subject id -> VoterHistory over buffer, which must not be modified
+export const readHistory = (buffer) => {
+  // Views need aligned offsets; a file read into its own buffer is
+  if (buffer.byteOffset % 8) {
+    const copy = new Uint8Array(buffer.length)
+    copy.set(buffer)
+    buffer = Buffer.from(copy.buffer)
+  }
+  const field = (index) => buffer.readUInt32LE(index * 4)
+  const headerBytes = buffer.length >= 8 && field(0) === MAGIC && HEADER_BYTES[field(1)]
+  if (!headerBytes || buffer.length < headerBytes) {
+    throw new Error('Not a voter history snapshot')
+  }
+  const [subjects, votes, userCount] = [field(2), field(3), field(4)]
+  const flags = field(1) === 1 ? 0 : field(6)
+
+  let offset = headerBytes
+  const view = (Type, length) => {
+    const array = new Type(buffer.buffer, buffer.byteOffset + offset, length)
+    offset += array.byteLength
+    return array
+  }
+  const table = view(Uint32Array, subjects * 2)
+  const timestamps = view(BigInt64Array, votes)
+  const users = view(Uint32Array, votes)
+  const positions = flags & POSITIONS ? view(Uint32Array, votes) : null
+  const offsets = view(Uint32Array, userCount + 1)
+  const voteTypes = view(Uint8Array, Math.ceil(votes / 8))
+  const userIds = Array.from({ length: userCount }, (_, user) =>
+    buffer.toString('utf-8', offset + offsets[user], offset + offsets[user + 1]))
+
+  const columns = { timestamps, users, positions, voteTypes, userIds }
+  const histories = new Map()
+  let start = 0
+  for (let s = 0; s < subjects; s++) {
+    const count = table[2 * s + 1]
+    histories.set(table[2 * s], new VoterHistory(columns, start, count))
+    start += count
+  }
+  return histories
+}
+"""
+
+        # storage.js: loadState() before reading, transaction() to record votes.
+        # The transaction's fn returns what it recorded as { vote, entry }
+        # pairs, entry being the voterHistory entry added (null if archived).
+        storage_code = """import { migratePoints } from './ledger.js'
+import subjectsDb from './subjects.js'
+import usersDb from './users.js'
+
+// Loads and commits run one at a time, so a reload can never replace the
+// in-memory documents between applying votes and writing them out
+let lock = Promise.resolve()
+const exclusive = (fn) => {
+  const run = lock.then(fn)
+  lock = run.catch(() => {})
+  return run
+}
+
+// Bumped whenever the in-memory data changes: a commit or a reload
+let version = 0
+
+const readState = async () => {
+  const { data: subjects } = subjectsDb
+  const { data: users } = usersDb
+  await Promise.all([subjectsDb.read(), usersDb.read()])
+  // Files still in whole points are written back converted by the next commit
+  migratePoints(subjectsDb.data, usersDb.data)
+  if (subjectsDb.data !== subjects || usersDb.data !== users) version++
+}
+
+export const loadState = () => exclusive(readState)
+
+export const dataVersion = () => version
+
+// Hit/miss counters of the in-memory document caches
+export const cacheStats = () => ({
+  subjects: { ...subjectsDb.adapter.stats },
+  users: { ...usersDb.adapter.stats }
+})
+
+// Load, let fn apply votes in memory and return them ({ vote, entry }
+// each), then persist once. If fn returns no votes, whatever it changed in
+// memory (users created by rejected votes, say) is dropped by reloading
+// next time. Resolves with the data version that includes the votes.
+export const transaction = (fn) => exclusive(async () => {
+  await readState()
+  const recorded = await fn()
+  if (!recorded.length) {
+    subjectsDb.adapter.invalidate()
+    usersDb.adapter.invalidate()
+    return version
+  }
+  await Promise.all([subjectsDb.write(), usersDb.write()])
+  version++
+  return version
+})
+"""
+
+        if storage == "log":
+            subjects_db_code = """import { subjectsDb } from './storage.js'
+
+export default subjectsDb
+"""
+            users_db_code = """import { usersDb } from './storage.js'
+
+export default usersDb
+"""
+            storage_code = """import { appendFile, open, readFile, rename, stat, unlink, writeFile } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+import { encodeHistory, readHistory } from './history.js'
+import { applyVote, migratePoints } from './ledger.js'
+
+// Append-only vote log. votes.snapshot.json holds the full state as of a
+// generation, except voterHistory, which is kept in the columnar file it
+// names (history.js); votes.log holds one JSON line per vote recorded
+// since. Lines carry the generation they belong to, so lines left over
+// from before a compaction are skipped on replay. Commits from different
+// processes take turns on the write lock (lock.js).
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+const snapshotPath = path.join(__dirname, 'votes.snapshot.json')
+const logPath = path.join(__dirname, 'votes.log')
+const COMPACT_EVERY = Number(process.env.VOTE_LOG_COMPACT_EVERY) || 1000
+
+const subjectsDefaultData = """ + subjects_default_data + """
+
+const usersDefaultData = """ + users_default_data + """
+
+export const subjectsDb = { data: null }
+export const usersDb = { data: null }
+
+const log = {
+  generation: 0,
+  history: null,
+  offset: 0,
+  pending: 0,
+  snapshotMtimeMs: 0,
+  stale: false
+}
+
+// A load is a hit when neither the snapshot nor new log lines were read
+const cache = { hits: 0, misses: 0 }
+
+// Bumped whenever the in-memory data changes: a commit or a reload
+let version = 0
+
+// Loads and commits run one at a time, so the tail is never replayed twice
+// and a reload never lands between applying votes and appending them
+let lock = Promise.resolve()
+const exclusive = (fn) => {
+  const run = lock.then(fn)
+  lock = run.catch(() => {})
+  return run
+}
+
+const statOrNull = async (filePath) => {
+  try {
+    return await stat(filePath)
+  } catch (error) {
+    if (error.code === 'ENOENT') return null
+    throw error
+  }
+}
+
+const writeSnapshot = async (snapshot) => {
+  const tmpPath = `${snapshotPath}.tmp`
+  await writeFile(tmpPath, JSON.stringify(snapshot))
+  await rename(tmpPath, snapshotPath)
+  log.snapshotMtimeMs = (await stat(snapshotPath)).mtimeMs
+}
+
+const loadSnapshot = async () => {
+  let snapshot = null
+  try {
+    snapshot = JSON.parse(await readFile(snapshotPath, 'utf-8'))
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+  }
+  if (!snapshot) {
+    snapshot = { generation: 0, subjects: subjectsDefaultData, users: usersDefaultData }
+    await writeSnapshot(snapshot)
+  } else {
+    log.snapshotMtimeMs = (await stat(snapshotPath)).mtimeMs
+  }
+
+  // Snapshots still in whole points are converted here on every load until
+  // the next compaction writes one with the marker. Log lines hold votes
+  // only, so the tail replays the same either way.
+  migratePoints(snapshot.subjects, snapshot.users)
+
+  // Snapshots written before the history file keep voterHistory inline
+  if (snapshot.history) {
+    const histories = readHistory(await readFile(path.join(__dirname, snapshot.history)))
+    for (const subject of snapshot.subjects.subjects) {
+      subject.voterHistory = histories.get(subject.id) || []
+    }
+  }
+
+  subjectsDb.data = snapshot.subjects
+  usersDb.data = snapshot.users
+  log.generation = snapshot.generation
+  log.history = snapshot.history || null
+  log.offset = 0
+  log.pending = 0
+  log.stale = false
+}
+
+// Apply complete log lines past the current offset; returns the bytes read
+const readTail = async () => {
+  let handle
+  try {
+    handle = await open(logPath, 'r')
+  } catch (error) {
+    if (error.code === 'ENOENT') return 0
+    throw error
+  }
+
+  try {
+    const { size } = await handle.stat()
+    if (size <= log.offset) return 0
+
+    const buffer = Buffer.alloc(size - log.offset)
+    await handle.read(buffer, 0, buffer.length, log.offset)
+    const end = buffer.lastIndexOf(0x0a)
+    if (end === -1) return 0
+
+    const state = { subjects: subjectsDb.data.subjects, points: usersDb.data.points }
+    for (const line of buffer.toString('utf-8', 0, end).split('\\n')) {
+      if (!line) continue
+      const { g, ...vote } = JSON.parse(line)
+      if (g !== log.generation) continue
+      applyVote(state, vote)
+      log.pending++
+    }
+    log.offset += end + 1
+    return end + 1
+  } finally {
+    await handle.close()
+  }
+}
+
+const readState = async () => {
+  const [snapshotStat, logStat] = await Promise.all([
+    statOrNull(snapshotPath),
+    statOrNull(logPath)
+  ])
+
+  // Reset or compacted elsewhere: start again from the snapshot
+  if (
+    log.stale ||
+    !subjectsDb.data ||
+    !snapshotStat ||
+    snapshotStat.mtimeMs !== log.snapshotMtimeMs ||
+    (logStat ? logStat.size : 0) < log.offset
+  ) {
+    await loadSnapshot()
+    await readTail()
+    cache.misses++
+    version++
+  } else if (await readTail()) {
+    cache.misses++
+    version++
+  } else {
+    cache.hits++
+  }
+}
+
+// The history file gets a new name per generation, so the snapshot naming
+// it is the only file replaced
+const compact = async () => {
+  const generation = log.generation + 1
+  const history = `votes.history.${generation}.bin`
+  const { subjects } = subjectsDb.data
+  const encoded = encodeHistory(subjects)
+  await writeFile(path.join(__dirname, history), encoded)
+  await writeSnapshot({
+    generation,
+    history,
+    subjects: { ...subjectsDb.data, subjects: subjects.map(({ voterHistory, ...subject }) => subject) },
+    users: usersDb.data
+  })
+  await writeFile(logPath, '')
+  if (log.history) {
+    await unlink(path.join(__dirname, log.history)).catch(() => {})
+  }
+  log.generation = generation
+  log.history = history
+  log.offset = 0
+  log.pending = 0
+
+  // Fold the votes held as entries into the columns just written
+  const histories = readHistory(encoded)
+  for (const subject of subjects) {
+    subject.voterHistory = histories.get(subject.id)
+  }
+}
+
+const appendVotes = async (votes) => {
+  const lines = votes.map(vote => JSON.stringify({ g: log.generation, ...vote }) + '\\n').join('')
+  await appendFile(logPath, lines)
+  log.offset += Buffer.byteLength(lines)
+  log.pending += votes.length
+
+  if (log.pending >= COMPACT_EVERY) {
+    await compact()
+  }
+}
+
+export const loadState = () => exclusive(readState)
+
+// Hit/miss counters of the in-memory state
+export const cacheStats = () => ({ log: { ...cache } })
+
+export const dataVersion = () => version
+
+// Load, let fn apply votes in memory and return them ({ vote, entry }
+// each), then append the votes in one write. On failure memory is ahead of
+// disk, so reload next time; the same if fn returns no votes, to drop
+// whatever it changed in memory. Resolves with the data version that
+// includes the votes.
+export const transaction = (fn) => exclusive(async () => {
+  await readState()
+  const recorded = await fn()
+  if (!recorded.length) {
+    log.stale = true
+    return version
+  }
+  try {
+    await appendVotes(recorded.map(({ vote }) => vote))
+    version++
+  } catch (error) {
+    log.stale = true
+    throw error
+  }
+  return version
+})
+
+await loadState()
+"""
+
+        if storage == "sharded":
+            subjects_db_code = """import { subjectsDb } from './storage.js'
+
+export default subjectsDb
+"""
+            users_db_code = """import { usersDb } from './storage.js'
+
+export default usersDb
+"""
+            storage_code = """import { readFileSync } from 'fs'
+import { mkdir, readFile, rename, stat, unlink, writeFile } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+import { migrateSubject, migrateUser, POINTS_UNIT } from './ledger.js'
+
+// Sharded JSON storage under shards/. Every subject has its own file and
+// users are hashed into a fixed number of files; index.json names the
+// current file of each shard and holds the profiles. A commit writes the
+// shards it changed under new names and then replaces index.json, so it is
+// atomic and replaces one file however many shards it touches. A load
+// reads only index.json: a subject's shard is read when that subject is
+// first used, a user shard when one of its users is. Superseded files
+// stay for SHARD_RETIRE_MS, listed in the index, so a reader still on the
+// previous index can read them. Keep the layout and userShard() in sync
+// with test_reset_db.py.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+const shardsPath = path.join(__dirname, 'shards')
+const indexPath = path.join(shardsPath, 'index.json')
+const USER_SHARDS = 16
+const SHARD_RETIRE_MS = Number(process.env.SHARD_RETIRE_MS) || 60000
+
+const subjectsDefaultData = """ + subjects_default_data + """
+
+const usersDefaultData = """ + users_default_data + """
+
+export const subjectsDb = { data: null }
+export const usersDb = { data: null }
+
+// FNV-1a of the user id's UTF-8 bytes
+export const userShard = (userId, shards) => {
+  let hash = 0x811c9dc5
+  for (const byte of Buffer.from(userId, 'utf-8')) {
+    hash = Math.imul(hash ^ byte, 0x01000193) >>> 0
+  }
+  return hash % shards
+}
+
+// Parsed shard files by name. Names are never reused, so an entry only
+// goes stale when memory is ahead of disk after a failed commit.
+const shardData = new Map()
+const store = { index: null, signature: null, stale: false }
+
+// A load is a hit when index.json had not changed
+const cache = { hits: 0, misses: 0 }
+
+// Bumped whenever the in-memory data changes: a commit or a reload
+let version = 0
+
+// Loads and commits run one at a time, so a reload never lands between
+// applying votes and writing them
+let lock = Promise.resolve()
+const exclusive = (fn) => {
+  const run = lock.then(fn)
+  lock = run.catch(() => {})
+  return run
+}
+
+const signatureOf = async (filePath) => {
+  try {
+    const { ino, size, mtimeMs } = await stat(filePath)
+    return `${ino}:${size}:${mtimeMs}`
+  } catch (error) {
+    if (error.code === 'ENOENT') return null
+    throw error
+  }
+}
+
+const shardName = (prefix, index) => `${prefix}.${index.commit}-${process.pid}.json`
+
+// Synchronous, so records can be read on first use from inside the ledger.
+// Under an index without pointsUnit the shards are in whole points and are
+// converted as they are read; the next commit rewrites them all.
+const loadShard = (name) => {
+  let data = shardData.get(name)
+  if (!data) {
+    try {
+      data = JSON.parse(readFileSync(path.join(shardsPath, name), 'utf-8'))
+    } catch (error) {
+      // Removed by reset_db since the index was read: read it again next time
+      if (error.code === 'ENOENT') store.signature = null
+      throw error
+    }
+    if (store.index.pointsUnit !== POINTS_UNIT) {
+      if (name.startsWith('users-')) Object.values(data.points).forEach(migrateUser)
+      else migrateSubject(data)
+    }
+    shardData.set(name, data)
+  }
+  return data
+}
+
+// New names only, so nothing is replaced until the index is
+const writeShard = async (name, data) => {
+  await writeFile(path.join(shardsPath, name), JSON.stringify(data))
+  shardData.set(name, data)
+}
+
+const writeIndex = async (index) => {
+  const tmpPath = `${indexPath}.tmp`
+  await writeFile(tmpPath, JSON.stringify(index))
+  await rename(tmpPath, indexPath)
+  store.index = index
+  store.signature = await signatureOf(indexPath)
+}
+
+// One proxy per subject, which knows the subject's id and reads the rest
+// from its shard on first use, so finding a subject by id reads nothing.
+// A view is kept while its document is: across reloads that leave the
+// shard's file alone and across this process's own commits, which write
+// the same document under a new name. Per-subject state keyed by the
+// subject object (the voter index in ledger.js) survives with it.
+const subjectViews = new Map()
+
+const subjectView = (id, file) => {
+  const current = subjectViews.get(id)
+  if (current?.file === file) return current.proxy
+
+  const view = { file, proxy: null }
+  const doc = () => loadShard(view.file)
+  view.proxy = new Proxy({ id }, {
+    get: (target, key) => key === 'id' ? id : Reflect.get(doc(), key),
+    set: (target, key, value) => Reflect.set(doc(), key, value),
+    has: (target, key) => key in doc(),
+    deleteProperty: (target, key) => Reflect.deleteProperty(doc(), key),
+    defineProperty: (target, key, descriptor) => Reflect.defineProperty(doc(), key, descriptor),
+    ownKeys: () => Reflect.ownKeys(doc()),
+    getOwnPropertyDescriptor: (target, key) => Reflect.getOwnPropertyDescriptor(doc(), key)
+  })
+  subjectViews.set(id, view)
+  return view.proxy
+}
+
+// The points record map of the shard a user id hashes to
+const pointsOf = (userId) => {
+  const { users } = store.index
+  return loadShard(users[userShard(userId, users.length)]).points
+}
+
+// Every user's points record, each read with its shard on first use.
+// Listing them all (GET /subjects?users=true) reads every user shard.
+const points = new Proxy({}, {
+  get: (target, userId) => typeof userId === 'string' ? pointsOf(userId)[userId] : undefined,
+  set: (target, userId, record) => {
+    pointsOf(userId)[userId] = record
+    return true
+  },
+  has: (target, userId) => typeof userId === 'string' && userId in pointsOf(userId),
+  deleteProperty: (target, userId) => delete pointsOf(userId)[userId],
+  ownKeys: () => store.index.users.flatMap(name => Object.keys(loadShard(name).points)),
+  getOwnPropertyDescriptor: (target, userId) => {
+    if (typeof userId !== 'string') return undefined
+    const shard = pointsOf(userId)
+    if (!(userId in shard)) return undefined
+    return { value: shard[userId], writable: true, enumerable: true, configurable: true }
+  }
+})
+
+const writeDefaults = async () => {
+  await mkdir(shardsPath, { recursive: true })
+  const index = {
+    commit: 1,
+    pointsUnit: POINTS_UNIT,
+    subjects: [],
+    users: [],
+    profiles: usersDefaultData.profiles,
+    retired: []
+  }
+  for (const subject of subjectsDefaultData.subjects) {
+    const file = shardName(`subject-${subject.id}`, index)
+    await writeShard(file, subject)
+    index.subjects.push({ id: subject.id, file })
+  }
+  for (let shard = 0; shard < USER_SHARDS; shard++) {
+    const file = shardName(`users-${shard}`, index)
+    await writeShard(file, { points: {} })
+    index.users.push(file)
+  }
+  await writeIndex(index)
+}
+
+const readState = async () => {
+  const signature = await signatureOf(indexPath)
+  if (!store.stale && subjectsDb.data && signature === store.signature) {
+    cache.hits++
+    return
+  }
+  if (store.stale) {
+    shardData.clear()
+    subjectViews.clear()
+  }
+  if (!signature) {
+    await writeDefaults()
+  } else {
+    store.index = JSON.parse(await readFile(indexPath, 'utf-8'))
+    store.signature = signature
+  }
+
+  const { index } = store
+  const current = new Set([...index.subjects.map(({ file }) => file), ...index.users])
+  for (const name of shardData.keys()) {
+    if (!current.has(name)) shardData.delete(name)
+  }
+  const ids = new Set(index.subjects.map(({ id }) => id))
+  for (const id of subjectViews.keys()) {
+    if (!ids.has(id)) subjectViews.delete(id)
+  }
+
+  // Records are shared with the shard documents, so a commit writes the
+  // shard objects as the ledger left them
+  subjectsDb.data = { subjects: index.subjects.map(({ id, file }) => subjectView(id, file)) }
+  usersDb.data = { profiles: index.profiles, points }
+  store.stale = false
+  cache.misses++
+  version++
+}
+
+const writeShards = async (votes, userIds) => {
+  const now = Date.now()
+  const retired = store.index.retired || []
+  // Shards still in whole points are all written out converted
+  const migrating = store.index.pointsUnit !== POINTS_UNIT
+  const index = {
+    ...store.index,
+    commit: store.index.commit + 1,
+    pointsUnit: POINTS_UNIT,
+    subjects: [...store.index.subjects],
+    users: [...store.index.users],
+    retired: retired.filter(({ at }) => now - at < SHARD_RETIRE_MS)
+  }
+  const superseded = []
+  const writes = []
+
+  const subjectIds = new Set(votes.map(vote => vote.id))
+  const rewritten = (id) => migrating || subjectIds.has(id)
+  index.subjects.forEach(({ id, file }, position) => {
+    if (!rewritten(id)) return
+    const name = shardName(`subject-${id}`, index)
+    writes.push(writeShard(name, loadShard(file)))
+    index.subjects[position] = { id, file: name }
+    superseded.push(file)
+  })
+
+  // Records fn created or changed are already in their shard's document
+  const changed = new Set(migrating ? index.users.keys() : [])
+  for (const userId of userIds) {
+    const shard = userShard(userId, index.users.length)
+    if (userId in loadShard(index.users[shard]).points) changed.add(shard)
+  }
+  for (const shard of changed) {
+    const name = shardName(`users-${shard}`, index)
+    writes.push(writeShard(name, loadShard(index.users[shard])))
+    superseded.push(index.users[shard])
+    index.users[shard] = name
+  }
+
+  index.retired.push(...superseded.map(file => ({ file, at: now })))
+  await Promise.all(writes)
+  await writeIndex(index)
+  index.subjects.forEach(({ id, file }) => {
+    const view = subjectViews.get(id)
+    if (view && rewritten(id)) view.file = file
+  })
+  for (const name of superseded) shardData.delete(name)
+  for (const entry of retired) {
+    if (now - entry.at < SHARD_RETIRE_MS) continue
+    await unlink(path.join(shardsPath, entry.file)).catch(() => {})
+  }
+}
+
+export const loadState = () => exclusive(readState)
+
+// Hit/miss counters of the in-memory state
+export const cacheStats = () => ({ shards: { ...cache } })
+
+export const dataVersion = () => version
+
+// Load, let fn apply votes in memory and return them ({ vote, entry }
+// each), then write the shards they changed. Every user record fn looks up
+// counts as changed. On failure memory is ahead of disk, so reload next
+// time; the same if fn returns no votes, to drop whatever it changed in
+// memory. Resolves with the data version that includes the votes.
+export const transaction = (fn) => exclusive(async () => {
+  await readState()
+  const { points } = usersDb.data
+  const userIds = new Set()
+  usersDb.data.points = new Proxy(points, {
+    get: (target, key) => {
+      if (typeof key === 'string') userIds.add(key)
+      return target[key]
+    }
+  })
+
+  let recorded
+  try {
+    recorded = await fn()
+  } finally {
+    usersDb.data.points = points
+  }
+  if (!recorded.length) {
+    store.stale = true
+    return version
+  }
+  try {
+    await writeShards(recorded.map(({ vote }) => vote), userIds)
+    version++
+  } catch (error) {
+    store.stale = true
+    throw error
+  }
+  return version
+})
+
+await loadState()
+"""
+
+        if storage == "sqlite":
+            subjects_db_code = """import { subjectsDb } from './storage.js'
+
+export default subjectsDb
+"""
+            users_db_code = """import { usersDb } from './storage.js'
+
+export default usersDb
+"""
+            storage_code = """import Database from 'better-sqlite3'
+import path from 'path'
+import { fileURLToPath } from 'url'
+import { addVoter, MICRO_POINTS, migrateUser, voterPosition } from './ledger.js'
+
+// SQLite storage in votes.db with a WAL journal. The state is loaded into
+// memory once, in the shape the ledger and handlers use, and each commit
+// writes only the rows it changed: the new votes, the counters of the
+// subjects voted on and the balances of the users debited or credited.
+// Commits are numbered and every row carries the commit that last wrote
+// it, so when another process commits the next load reads just the rows
+// newer than the ones it has. When reset_db replaces the tables it starts
+// a new generation, and the next load reads them in full. Keep the schema
+// in sync with test_reset_db.py.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+const dbPath = path.join(__dirname, 'votes.db')
+
+const SCHEMA = `
+CREATE TABLE IF NOT EXISTS subjects (
+  id INTEGER PRIMARY KEY,
+  title TEXT NOT NULL,
+  emoji TEXT NOT NULL,
+  up INTEGER NOT NULL DEFAULT 0,
+  down INTEGER NOT NULL DEFAULT 0,
+  last_updated TEXT NOT NULL,
+  commit_id INTEGER NOT NULL DEFAULT 0
+);
+-- position is the rank among the subject's voters of that vote type,
+-- history_position the place in the subject's voterHistory
+CREATE TABLE IF NOT EXISTS votes (
+  subject_id INTEGER NOT NULL,
+  vote_type TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  user_id TEXT NOT NULL,
+  history_position INTEGER NOT NULL,
+  points INTEGER NOT NULL,
+  timestamp TEXT NOT NULL,
+  commit_id INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (subject_id, vote_type, position)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS votes_history ON votes (subject_id, history_position);
+CREATE UNIQUE INDEX IF NOT EXISTS votes_voter ON votes (subject_id, vote_type, user_id);
+-- Reward maps and stats are JSON, as in users.json
+CREATE TABLE IF NOT EXISTS users (
+  id TEXT PRIMARY KEY,
+  points INTEGER NOT NULL,
+  up_vote_rewards TEXT NOT NULL,
+  down_vote_rewards TEXT NOT NULL,
+  stats TEXT,
+  commit_id INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS profiles (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  avatar TEXT NOT NULL,
+  sort INTEGER NOT NULL
+);
+-- One row: last_commit numbers the commits (commit_id on the rows above),
+-- generation changes whenever the tables are replaced or rewritten
+CREATE TABLE IF NOT EXISTS commits (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  generation INTEGER NOT NULL,
+  last_commit INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO commits (id, generation, last_commit) VALUES (1, 0, 0);
+`
+
+// Tables whose rows carry commit_id. Their indexes are created once the
+// columns exist: tables from before commits were numbered lack them.
+const CHANGED_TABLES = ['subjects', 'votes', 'users']
+const COMMIT_INDEXES = CHANGED_TABLES
+  .map(table => `CREATE INDEX IF NOT EXISTS ${table}_commit ON ${table} (commit_id);`)
+  .join('\\n')
+
+const subjectsDefaultData = """ + subjects_default_data + """
+
+const usersDefaultData = """ + users_default_data + """
+
+export const subjectsDb = { data: null }
+export const usersDb = { data: null }
+
+const db = new Database(dbPath)
+// First, so opening next to another process's commit waits for it
+db.pragma('busy_timeout = 5000')
+db.pragma('journal_mode = WAL')
+// With WAL a commit survives a crash of this process; only an OS crash
+// can lose the last commits before a checkpoint
+db.pragma('synchronous = NORMAL')
+db.exec(SCHEMA)
+
+// Tables created before commits were numbered get the column, as 0
+const addCommitColumns = db.transaction(() => {
+  for (const table of CHANGED_TABLES) {
+    if (db.pragma(`table_info(${table})`).some(({ name }) => name === 'commit_id')) continue
+    db.exec(`ALTER TABLE ${table} ADD COLUMN commit_id INTEGER NOT NULL DEFAULT 0`)
+  }
+  db.exec(COMMIT_INDEXES)
+})
+addCommitColumns.immediate()
+
+const SUBJECT_COLUMNS = 'id, title, emoji, up, down, last_updated'
+const VOTE_COLUMNS = 'subject_id, vote_type, user_id, history_position, points, timestamp'
+const USER_COLUMNS = 'id, points, up_vote_rewards, down_vote_rewards, stats'
+
+const statements = {
+  countSubjects: db.prepare('SELECT COUNT(*) AS count FROM subjects'),
+  selectCommits: db.prepare('SELECT generation, last_commit FROM commits WHERE id = 1'),
+  selectSubjects: db.prepare(`SELECT ${SUBJECT_COLUMNS} FROM subjects ORDER BY id`),
+  selectVotes: db.prepare(`SELECT ${VOTE_COLUMNS} FROM votes ORDER BY subject_id, history_position`),
+  selectUsers: db.prepare(`SELECT ${USER_COLUMNS} FROM users`),
+  selectProfiles: db.prepare('SELECT id, name, avatar FROM profiles ORDER BY sort'),
+  // Rows written by commits after the given one
+  selectSubjectsSince: db.prepare(`SELECT ${SUBJECT_COLUMNS} FROM subjects WHERE commit_id > ?`),
+  selectVotesSince: db.prepare(
+    `SELECT ${VOTE_COLUMNS} FROM votes WHERE commit_id > ? ORDER BY subject_id, history_position`
+  ),
+  selectUsersSince: db.prepare(`SELECT ${USER_COLUMNS} FROM users WHERE commit_id > ?`),
+  insertSubject: db.prepare(
+    'INSERT INTO subjects (id, title, emoji, up, down, last_updated) VALUES (?, ?, ?, ?, ?, ?)'
+  ),
+  insertProfile: db.prepare('INSERT INTO profiles (id, name, avatar, sort) VALUES (?, ?, ?, ?)'),
+  insertVote: db.prepare(
+    'INSERT INTO votes (subject_id, vote_type, position, user_id, history_position, points, timestamp, commit_id) ' +
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+  ),
+  updateSubject: db.prepare('UPDATE subjects SET up = ?, down = ?, last_updated = ?, commit_id = ? WHERE id = ?'),
+  upsertUser: db.prepare(
+    'INSERT INTO users (id, points, up_vote_rewards, down_vote_rewards, stats, commit_id) VALUES (?, ?, ?, ?, ?, ?) ' +
+    'ON CONFLICT (id) DO UPDATE SET points = excluded.points, up_vote_rewards = excluded.up_vote_rewards, ' +
+    'down_vote_rewards = excluded.down_vote_rewards, stats = excluded.stats, commit_id = excluded.commit_id'
+  ),
+  nextCommit: db.prepare('UPDATE commits SET last_commit = last_commit + 1 WHERE id = 1 RETURNING last_commit'),
+  nextGeneration: db.prepare('UPDATE commits SET generation = generation + 1 WHERE id = 1')
+}
+
+const userFromRow = (row) => ({
+  points: row.points,
+  upVoteRewards: JSON.parse(row.up_vote_rewards),
+  downVoteRewards: JSON.parse(row.down_vote_rewards),
+  ...(row.stats && { stats: JSON.parse(row.stats) })
+})
+
+const entryFromRow = (row) => ({
+  userId: row.user_id,
+  timestamp: row.timestamp,
+  points: row.points,
+  voteType: row.vote_type,
+  position: row.history_position
+})
+
+// PRAGMA user_version is POINTS_FORMAT once the points columns and JSON
+// hold micro-points. Tables written in whole points are converted once,
+// by the first process to open them, as a new generation.
+const POINTS_FORMAT = 1
+const migratePoints = db.transaction(() => {
+  if (db.pragma('user_version', { simple: true }) >= POINTS_FORMAT) return
+  db.exec(`UPDATE votes SET points = CAST(ROUND(points * ${MICRO_POINTS}) AS INTEGER)`)
+  for (const row of statements.selectUsers.all()) {
+    const user = migrateUser(userFromRow(row))
+    statements.upsertUser.run(
+      row.id, user.points,
+      JSON.stringify(user.upVoteRewards), JSON.stringify(user.downVoteRewards),
+      user.stats ? JSON.stringify(user.stats) : null,
+      0
+    )
+  }
+  statements.nextGeneration.run()
+  db.pragma(`user_version = ${POINTS_FORMAT}`)
+})
+migratePoints.immediate()
+
+const seedDefaults = db.transaction(() => {
+  if (statements.countSubjects.get().count) return
+  for (const { id, title, emoji, votes, lastUpdated } of subjectsDefaultData.subjects) {
+    statements.insertSubject.run(id, title, emoji, votes.up, votes.down, lastUpdated)
+  }
+  usersDefaultData.profiles.forEach(({ id, name, avatar }, sort) => {
+    statements.insertProfile.run(id, name, avatar, sort)
+  })
+})
+
+// dataVersion is PRAGMA data_version as of the last load: it changes when
+// another connection commits, never for this connection's own commits.
+// generation and commit are the commits row as of the last load or commit.
+const store = { dataVersion: null, generation: null, commit: 0, stale: false }
+
+// A load is a hit when nothing had to be read, a partial load when only
+// the rows other processes committed since were, and a miss otherwise
+const cache = { hits: 0, partial: 0, misses: 0 }
+
+// Bumped whenever the in-memory data changes: a commit or a reload
+let version = 0
+
+// Loads and commits run one at a time, so a reload never lands between
+// applying votes and writing them
+let lock = Promise.resolve()
+const exclusive = (fn) => {
+  const run = lock.then(fn)
+  lock = run.catch(() => {})
+  return run
+}
+
+const loadTables = () => {
+  const subjects = statements.selectSubjects.all().map(row => ({
+    id: row.id,
+    title: row.title,
+    emoji: row.emoji,
+    votes: { up: row.up, down: row.down },
+    voterHistory: [],
+    lastUpdated: row.last_updated
+  }))
+  const byId = new Map(subjects.map(subject => [subject.id, subject]))
+  for (const row of statements.selectVotes.iterate()) {
+    byId.get(row.subject_id).voterHistory.push(entryFromRow(row))
+  }
+
+  const points = {}
+  for (const row of statements.selectUsers.iterate()) {
+    points[row.id] = userFromRow(row)
+  }
+
+  subjectsDb.data = { subjects }
+  usersDb.data = {
+    profiles: statements.selectProfiles.all().map(({ id, name, avatar }) => ({ id, name, avatar })),
+    points
+  }
+}
+
+// The tables and the commits row, read in one snapshot
+const loadAll = db.transaction(() => {
+  loadTables()
+  return statements.selectCommits.get()
+})
+
+// Apply the rows committed since store.commit to the loaded state, keeping
+// its subject objects (and their voter indexes). Null when that cannot be
+// done: the tables are of another generation, or a subject is new.
+const loadChanges = db.transaction(() => {
+  const commits = statements.selectCommits.get()
+  if (commits.generation !== store.generation) return null
+  const byId = new Map(subjectsDb.data.subjects.map(subject => [subject.id, subject]))
+  const rows = statements.selectSubjectsSince.all(store.commit)
+  if (rows.some(row => !byId.has(row.id))) return null
+
+  for (const row of rows) {
+    const subject = byId.get(row.id)
+    subject.votes = { ...subject.votes, up: row.up, down: row.down }
+    subject.lastUpdated = row.last_updated
+  }
+  for (const row of statements.selectVotesSince.iterate(store.commit)) {
+    const subject = byId.get(row.subject_id)
+    subject.voterHistory.push(entryFromRow(row))
+    addVoter(subject, row.user_id, row.vote_type)
+  }
+  const { points } = usersDb.data
+  for (const row of statements.selectUsersSince.iterate(store.commit)) {
+    points[row.id] = userFromRow(row)
+  }
+  return commits
+})
+
+const readState = () => {
+  const dataVersion = db.pragma('data_version', { simple: true })
+  if (!store.stale && subjectsDb.data && dataVersion === store.dataVersion) {
+    cache.hits++
+    return
+  }
+  let commits = !store.stale && subjectsDb.data ? loadChanges() : null
+  if (commits) {
+    cache.partial++
+  } else {
+    seedDefaults()
+    commits = loadAll()
+    cache.misses++
+  }
+  store.dataVersion = dataVersion
+  store.generation = commits.generation
+  store.commit = commits.last_commit
+  store.stale = false
+  version++
+}
+
+// Rows for the votes just applied in memory, in one SQLite transaction,
+// numbered as the next commit. Returns that number.
+const writeVotes = db.transaction((recorded, userIds) => {
+  const { last_commit: commit } = statements.nextCommit.get()
+  const subjects = new Map(subjectsDb.data.subjects.map(subject => [subject.id, subject]))
+  const changed = new Set()
+  for (const { vote: { id, voteType, userId }, entry } of recorded) {
+    const subject = subjects.get(id)
+    changed.add(subject)
+    // Archived (archive.js): counted on the subject, but no row
+    if (!entry) continue
+    statements.insertVote.run(
+      id, voteType, voterPosition(subject, userId, voteType),
+      userId, entry.position, entry.points, entry.timestamp, commit
+    )
+  }
+  for (const subject of changed) {
+    statements.updateSubject.run(subject.votes.up, subject.votes.down, subject.lastUpdated, commit, subject.id)
+  }
+
+  const { points } = usersDb.data
+  for (const userId of userIds) {
+    const user = points[userId]
+    if (!user) continue
+    statements.upsertUser.run(
+      userId, user.points,
+      JSON.stringify(user.upVoteRewards), JSON.stringify(user.downVoteRewards),
+      user.stats ? JSON.stringify(user.stats) : null,
+      commit
+    )
+  }
+  return commit
+})
+
+export const loadState = () => exclusive(readState)
+
+// Hit/miss counters of the in-memory state
+export const cacheStats = () => ({ sqlite: { ...cache } })
+
+export const dataVersion = () => version
+
+// Load, let fn apply votes in memory and return them ({ vote, entry }
+// each), then write the rows they changed. Every user record fn looks up
+// counts as changed. On failure memory is ahead of disk, so reload next
+// time; the same if fn returns no votes, to drop whatever it changed in
+// memory. Resolves with the data version that includes the votes.
+export const transaction = (fn) => exclusive(async () => {
+  readState()
+  const { points } = usersDb.data
+  const userIds = new Set()
+  usersDb.data.points = new Proxy(points, {
+    get: (target, key) => {
+      if (typeof key === 'string') userIds.add(key)
+      return target[key]
+    }
+  })
+
+  let recorded
+  try {
+    recorded = await fn()
+  } finally {
+    usersDb.data.points = points
+  }
+  if (!recorded.length) {
+    store.stale = true
+    return version
+  }
+  try {
+    const commit = writeVotes(recorded, userIds)
+    // A commit in between that this process has not read (one not taken
+    // under the write lock) would be skipped by the next partial load
+    if (commit === store.commit + 1) {
+      store.commit = commit
+    } else {
+      store.stale = true
+    }
+    version++
+  } catch (error) {
+    store.stale = true
+    throw error
+  }
+  return version
+})
+
+await loadState()
+"""
+
+        # Write the files
+        backend_path = self.backend_path
+        backend_path.mkdir(parents=True, exist_ok=True)
+
+        (backend_path / "subjects.js").write_text(subjects_db_code)
+        (backend_path / "users.js").write_text(users_db_code)
+        (backend_path / "storage.js").write_text(storage_code)
+        if storage == "lowdb":
+            (backend_path / "cachedFile.js").write_text(cached_file_code)
+        if storage == "log":
+            (backend_path / "history.js").write_text(history_code)
+        if storage == "sqlite":
+            self.add_backend_dependency("better-sqlite3", "^11.10.0")
+        print(f"Created separate database files ({storage} storage)")
+
+    def add_backend_dependency(self, name: str, version: str):
+        """Add a dependency to the backend package.json, if there is one"""
+        package_path = self.backend_path / "package.json"
+        if not package_path.exists():
+            print(f"⚠️  No package.json in {self.backend_path}, install {name} yourself")
+            return
+        package = json.loads(package_path.read_text())
+        dependencies = package.setdefault("dependencies", {})
+        if dependencies.get(name) == version:
+            return
+        dependencies[name] = version
+        package_path.write_text(json.dumps(package, indent=2) + "\n")
+        print(f"Added {name} to package.json")
+
+    def create_ledger_file(self):
+        """Create ledger.js with the vote and reward rules"""
+        ledger_code = """// Balances, costs and rewards are integers in micro-points, MICRO_POINTS
+// to the point, so every sum is exact. Clients convert for display.
+export const MICRO_POINTS = 1000000
+export const VOTE_COST = 10 * MICRO_POINTS
+export const INITIAL_POINTS = 100 * MICRO_POINTS
+export const MIN_REWARD = 1
+export const REWARD_TIERS = {
+  TIER1: { max: 10, share: 5, reward: 500000 },
+  TIER2: { max: 100, share: 3, reward: 33000 },
+  TIER3: { max: 1000, share: 1.5, reward: 1670 },
+  TIER4: { max: 10000, share: 0.5, reward: 56 }
+}
+
+// Used when replaying stored votes, which must not be logged again
+const silentLogger = {
+  info: () => {},
+  error: () => {},
+  debug: () => {},
+  metric: () => {}
+}
+
+// Voter index per subject: ordered voters for each vote type plus a map of
+// userId:voteType to the voter's position among that type's voters, and
+// how many voterHistory entries it covers. Keyed by the subject object and
+// maintained incrementally while that object lives. A reload brings new
+// subject objects: the index last used for the subject's id carries over
+// when the new history still starts with the entries it covers, and only
+// the entries past them are indexed. Otherwise (reset, memory that was
+// ahead of disk) it is rebuilt with one pass over the history.
+const voterIndex = new WeakMap()
+const latestIndex = new Map()  // subject id -> index
+
+const memberKey = (userId, voteType) => `${userId}:${voteType}`
+
+const addToIndex = (index, userId, voteType) => {
+  const key = memberKey(userId, voteType)
+  if (index.members.has(key)) return
+  if (!index.voters[voteType]) index.voters[voteType] = []
+  index.voters[voteType].push(userId)
+  index.members.set(key, index.voters[voteType].length)
+}
+
+// Record the history as covered up to its current end
+const cover = (index, history) => {
+  index.covered = history.length
+  const last = history.at(-1)
+  index.last = last && { userId: last.userId, voteType: last.voteType, timestamp: last.timestamp }
+}
+
+const covers = (index, history) => {
+  if (history.length < index.covered) return false
+  if (!index.covered) return true
+  const entry = history.at(index.covered - 1)
+  return entry.userId === index.last.userId &&
+    entry.voteType === index.last.voteType &&
+    entry.timestamp === index.last.timestamp
+}
+
+const indexFor = (subject) => {
+  let index = voterIndex.get(subject)
+  if (index) return index
+
+  const history = subject.voterHistory || []
+  index = latestIndex.get(subject.id)
+  if (index && covers(index, history)) {
+    for (let i = index.covered; i < history.length; i++) {
+      const { userId, voteType } = history.at(i)
+      addToIndex(index, userId, voteType)
+    }
+  } else {
+    index = { voters: {}, members: new Map(), covered: 0, last: null }
+    if (history.forEachVote) {
+      // Columnar history (history.js): no entry objects needed
+      history.forEachVote((userId, timestamp, voteType) => addToIndex(index, userId, voteType))
+    } else {
+      for (const vote of history) {
+        addToIndex(index, vote.userId, vote.voteType)
+      }
+    }
+  }
+  cover(index, history)
+  voterIndex.set(subject, index)
+  latestIndex.set(subject.id, index)
+  return index
+}
+
+export const getVoters = (subject, voteType) => indexFor(subject).voters[voteType] || []
+
+export const hasVoted = (subject, userId, voteType) =>
+  indexFor(subject).members.has(memberKey(userId, voteType))
+
+// Called once the vote's entry is in voterHistory, or left out of it
+// because it was archived
+export const addVoter = (subject, userId, voteType) => {
+  const index = indexFor(subject)
+  addToIndex(index, userId, voteType)
+  cover(index, subject.voterHistory)
+}
+
+// Position among the subject's voters of that type, or undefined
+export const voterPosition = (subject, userId, voteType) =>
+  indexFor(subject).members.get(memberKey(userId, voteType))
+
+export const emptyStats = () => ({
+  upVoteDonations: 0,
+  downVoteDonations: 0,
+  upVoteRewards: 0,
+  downVoteRewards: 0,
+  votedOn: {}  // subjectId -> { up/down: voter position }
+})
+
+export const initializeUser = (points, userId, logger = silentLogger) => {
+  if (!points[userId]) {
+    logger.info('Initializing new user', { userId, initialPoints: INITIAL_POINTS })
+    points[userId] = {
+      points: INITIAL_POINTS,
+      upVoteRewards: {},
+      downVoteRewards: {},
+      stats: emptyStats()
+    }
+  }
+  return points[userId]
+}
+
+const sum = (values) => values.reduce((total, value) => total + value, 0)
+
+// Per-user aggregates kept on the user record and updated on every vote
+// and reward, so reading them never scans history. Records written before
+// stats existed get them derived once, on first use.
+export const userStats = (state, userId, user) => {
+  if (user.stats) return user.stats
+  const stats = emptyStats()
+  for (const subject of state.subjects) {
+    for (const voteType of ['up', 'down']) {
+      const position = voterPosition(subject, userId, voteType)
+      if (!position) continue
+      stats.votedOn[subject.id] = { ...stats.votedOn[subject.id], [voteType]: position }
+      stats[`${voteType}VoteDonations`] += VOTE_COST
+    }
+  }
+  stats.upVoteRewards = sum(Object.values(user.upVoteRewards || {}))
+  stats.downVoteRewards = sum(Object.values(user.downVoteRewards || {}))
+  user.stats = stats
+  return stats
+}
+
+// Stored documents carry pointsUnit: POINTS_UNIT. Data written while
+// balances were whole points has no marker; storage converts it in place
+// on load (migratePoints) and the next write stores it with the marker.
+export const POINTS_UNIT = 'micro'
+
+const toMicroPoints = (value) => Math.round(value * MICRO_POINTS)
+
+const toMicroPointsMap = (map = {}) =>
+  Object.fromEntries(Object.entries(map).map(([key, value]) => [key, toMicroPoints(value)]))
+
+export const migrateUser = (user) => {
+  user.points = toMicroPoints(user.points)
+  user.upVoteRewards = toMicroPointsMap(user.upVoteRewards)
+  user.downVoteRewards = toMicroPointsMap(user.downVoteRewards)
+  if (user.stats) {
+    for (const key of ['upVoteDonations', 'downVoteDonations', 'upVoteRewards', 'downVoteRewards']) {
+      user.stats[key] = toMicroPoints(user.stats[key])
+    }
+  }
+  return user
+}
+
+// Inline entries only: columnar history (history.js) has no points column
+export const migrateSubject = (subject) => {
+  if (Array.isArray(subject.voterHistory)) {
+    for (const entry of subject.voterHistory) entry.points = toMicroPoints(entry.points)
+  }
+  return subject
+}
+
+// Convert a subjects and a users document that lack the marker
+export const migratePoints = (subjectsData, usersData) => {
+  if (subjectsData.pointsUnit !== POINTS_UNIT) {
+    subjectsData.subjects.forEach(migrateSubject)
+    subjectsData.pointsUnit = POINTS_UNIT
+  }
+  if (usersData.pointsUnit !== POINTS_UNIT) {
+    Object.values(usersData.points).forEach(migrateUser)
+    usersData.pointsUnit = POINTS_UNIT
+  }
+}
+
+const creditReward = (state, voterId, voteType, subjectKey, amount, logger) => {
+  const user = initializeUser(state.points, voterId, logger)
+  const rewardCategory = `${voteType}VoteRewards`
+  userStats(state, voterId, user)[rewardCategory] += amount
+  user[rewardCategory][subjectKey] = (user[rewardCategory][subjectKey] || 0) + amount
+  user.points += amount
+}
+
+// Reward bands in position order, built once from REWARD_TIERS. Every voter
+// in a band gets the same reward, so distributions are computed per band
+// from counts instead of per position. Distribution stops at the first
+// band whose reward is below MIN_REWARD.
+export const REWARD_BANDS = []
+for (const [tier, { max, reward }] of Object.entries(REWARD_TIERS)) {
+  if (reward < MIN_REWARD) break
+  const from = REWARD_BANDS.length ? REWARD_BANDS[REWARD_BANDS.length - 1].to + 1 : 1
+  REWARD_BANDS.push({ tier, from, to: max, reward })
+}
+
+// Same-type voters past this position can never be paid a reward
+export const MAX_REWARDED_POSITION = REWARD_BANDS.length ? REWARD_BANDS[REWARD_BANDS.length - 1].to : 0
+
+export const calculateRewardForPosition = (position) => {
+  const band = REWARD_BANDS.find(b => position >= b.from && position <= b.to)
+  return band ? band.reward : 0
+}
+
+export const distributeRewards = (state, subjectId, voteType, currentVoterId, logger = silentLogger) => {
+  try {
+    const subject = state.subjects.find(s => s.id === subjectId)
+    if (!subject || !subject.voterHistory) {
+      logger.error('Invalid subject or voter history', {}, { subjectId })
+      return []
+    }
+
+    const voters = getVoters(subject, voteType)
+    const subjectKey = String(subjectId)
+    let totalDistributed = 0
+    const distributions = []
+
+    // Earlier voters in order; the current voter does not count towards
+    // positions. Voters past the last band are never visited.
+    let i = 0
+    let position = 0
+    for (const band of REWARD_BANDS) {
+      let count = 0
+      for (; position < band.to && i < voters.length; i++) {
+        const voterId = voters[i]
+        if (voterId === currentVoterId) continue
+        position++
+        count++
+        creditReward(state, voterId, voteType, subjectKey, band.reward, logger)
+      }
+      if (!count) break
+
+      const distribution = {
+        tier: band.tier,
+        fromPosition: band.from,
+        toPosition: band.from + count - 1,
+        count,
+        reward: band.reward,
+        total: count * band.reward
+      }
+      totalDistributed += distribution.total
+      distributions.push(distribution)
+    }
+
+    // Counts only: who got what is in the reward ledger (rewards.js)
+    logger.info('Distributed rewards', {
+      subjectId,
+      voteType,
+      rewardedVoters: position,
+      bands: distributions.length,
+      totalDistributed
+    })
+
+    return distributions
+  } catch (error) {
+    logger.error('Error in distributeRewards', error, {
+      subjectId,
+      voteType,
+      currentVoterId
+    })
+    return []
+  }
+}
+
+// Bands a vote pays when it has `earlier` same-type voters before it, in
+// the shape distributeRewards returns, without crediting anyone
+const bandsPaidBy = (earlier) => {
+  const distributions = []
+  for (const band of REWARD_BANDS) {
+    const count = Math.min(band.to, earlier) - band.from + 1
+    if (count <= 0) break
+    distributions.push({
+      tier: band.tier,
+      fromPosition: band.from,
+      toPosition: band.from + count - 1,
+      count,
+      reward: band.reward,
+      total: count * band.reward
+    })
+  }
+  return distributions
+}
+
+// Credit the rewards owed by the votes a (subject, vote type) group gained
+// since it had `start` voters. Each of those votes pays every voter before
+// it, so the voter at position p is owed (end - max(p, start)) rewards.
+const creditGroup = (state, { subject, voteType, start }, logger) => {
+  const voters = getVoters(subject, voteType)
+  const end = subject.votes[voteType]
+  const subjectKey = String(subject.id)
+
+  let position = 0
+  for (const band of REWARD_BANDS) {
+    for (; position < band.to && position < end; position++) {
+      const owed = end - Math.max(position + 1, start)
+      if (owed <= 0) break
+      creditReward(state, voters[position], voteType, subjectKey, band.reward * owed, logger)
+    }
+  }
+  logger.debug('Distributed batched rewards', { subjectId: subject.id, voteType, votes: end - start })
+}
+
+// Validate and apply one vote to state ({ subjects, points }) in memory.
+// Throws on a rejected vote; persisting the result is up to the caller.
+// With deferRewards the caller credits earlier voters itself (applyVotes).
+// With archive a vote past MAX_REWARDED_POSITION among its type's voters
+// is counted but left out of voterHistory (result.archived), for the
+// caller to store elsewhere. Counters include such votes, so they, not
+// voterHistory, give positions.
+export const applyVote = (state, vote, logger = silentLogger, { deferRewards = false, archive = false } = {}) => {
+  const { id, voteType, userId, timestamp } = vote
+
+  // Only these have counters, columns and reward ledgers
+  if (voteType !== 'up' && voteType !== 'down') {
+    logger.error('Invalid vote type', {}, { userId, voteType })
+    throw new Error('Invalid vote type')
+  }
+
+  const user = initializeUser(state.points, userId, logger)
+  if (user.points < VOTE_COST) {
+    logger.error('Insufficient points', {}, { userId, points: user.points })
+    throw new Error('Not enough points to vote')
+  }
+
+  const subject = state.subjects.find(s => s.id === id)
+  if (!subject) {
+    logger.error('Subject not found', {}, { id })
+    throw new Error('Subject not found')
+  }
+
+  if (!subject.votes) subject.votes = { up: 0, down: 0 }
+  if (!subject.voterHistory) subject.voterHistory = []
+
+  // Archived voters are only in their own stats
+  const stats = userStats(state, userId, user)
+  if (hasVoted(subject, userId, voteType) || stats.votedOn[id]?.[voteType]) {
+    logger.error('Duplicate vote attempt', {}, { userId, subjectId: id, voteType })
+    throw new Error('You have already voted this way on this subject')
+  }
+
+  user.points -= VOTE_COST
+  logger.info('Points deducted for vote', {
+    userId,
+    cost: VOTE_COST,
+    newTotal: user.points
+  })
+
+  subject.votes[voteType]++
+  subject.lastUpdated = timestamp
+
+  const rank = subject.votes[voteType]
+  const entry = {
+    userId,
+    timestamp,
+    points: VOTE_COST,
+    voteType,
+    position: historyLength(subject)
+  }
+  const archived = archive && rank > MAX_REWARDED_POSITION
+  if (!archived) subject.voterHistory.push(entry)
+  addVoter(subject, userId, voteType)
+  stats[`${voteType}VoteDonations`] += VOTE_COST
+  stats.votedOn[id] = { ...stats.votedOn[id], [voteType]: rank }
+
+  logger.info('Vote recorded', {
+    subjectId: id,
+    voteType,
+    userId,
+    position: entry.position
+  })
+
+  if (deferRewards) {
+    return { subject, user, entry, archived, distributions: bandsPaidBy(rank - 1) }
+  }
+  const distributions = distributeRewards(state, id, voteType, userId, logger)
+  return { subject, user, entry, archived, distributions }
+}
+
+// Votes recorded on the subject, archived ones included
+export const historyLength = (subject) => sum(Object.values(subject.votes || {}))
+
+// Remove the entries no reward can reach any more from voterHistory and
+// return them. applyVote with archive never adds such entries; this moves
+// the ones recorded without it. Their voters' stats are derived first,
+// while voterHistory still holds the entries: once archived, a vote is
+// only in stats.votedOn for the duplicate check in applyVote.
+export const takeColdEntries = (state, subject) => {
+  const ranks = {}
+  const hot = []
+  const cold = []
+  for (const entry of subject.voterHistory || []) {
+    ranks[entry.voteType] = (ranks[entry.voteType] || 0) + 1
+    ;(ranks[entry.voteType] > MAX_REWARDED_POSITION ? cold : hot).push(entry)
+  }
+  if (!cold.length) return cold
+
+  for (const { userId } of cold) {
+    const user = state.points[userId]
+    if (user) userStats(state, userId, user)
+  }
+  subject.voterHistory = hot
+  cover(indexFor(subject), hot)
+  return cold
+}
+
+// Apply votes in order with the same outcome as applyVote one by one, but
+// credit rewards once per (subject, vote type) for the whole run instead of
+// once per vote. Credits still owed to a voter are settled before their
+// next vote is validated, so balance checks see what they would have seen
+// one vote at a time. Returns { result } or { error } per vote, where
+// result is snapshot(applyVote's result) taken right after that vote.
+// archive is passed on to applyVote.
+export const applyVotes = (state, votes, logger = silentLogger, snapshot = (result) => result, { archive = false } = {}) => {
+  const pending = new Map()  // subjectId:voteType -> { subject, voteType, start }
+  const settle = (key, group) => {
+    creditGroup(state, group, logger)
+    pending.delete(key)
+  }
+
+  const results = votes.map(vote => {
+    for (const [key, group] of pending) {
+      if (hasVoted(group.subject, vote.userId, group.voteType)) settle(key, group)
+    }
+    try {
+      const result = applyVote(state, vote, logger, { deferRewards: true, archive })
+      const key = `${vote.id}:${vote.voteType}`
+      if (!pending.has(key)) {
+        const start = result.subject.votes[vote.voteType] - 1
+        pending.set(key, { subject: result.subject, voteType: vote.voteType, start })
+      }
+      return { result: snapshot(result) }
+    } catch (error) {
+      return { error }
+    }
+  })
+
+  for (const [key, group] of pending) settle(key, group)
+  return results
+}
+"""
+        (self.backend_path / "ledger.js").write_text(ledger_code)
+        print("Created ledger.js with vote and reward rules")
+
+    def create_rewards_file(self):
+        """Create rewards.js, the append-only reward ledger"""
+        rewards_code = """import { appendFile, mkdir, open, readdir, readFile, rename, stat, writeFile } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Reward ledger: one JSON line per (vote, reward band) the vote paid, in
+// commit order. Positions are ranks among the subject's voters of that
+// vote type, so a user's credits are the rows whose band covers the
+// user's own rank (stats.votedOn) and no row per credited voter is needed.
+// Rows are appended to rewards.log under the write lock (lock.js). Past
+// REWARD_LOG_MAX_BYTES it is sealed as rewards/<n>.log, numbered on from
+// the last segment and never rewritten, next to rewards/<n>.idx.json: the
+// highest position each subject:voteType reaches in it. Every vote pays
+// positions 1 and up, so a segment holds credits for a user exactly when
+// its index reaches one of the user's positions, and only those segments
+// are read. rewards.log.1, from before segments were kept, is the oldest.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+export const rewardsPath = path.join(__dirname, 'rewards.log')
+const segmentsPath = path.join(__dirname, 'rewards')
+const legacyPath = `${rewardsPath}.1`
+const REWARD_LOG_MAX_BYTES = Number(process.env.REWARD_LOG_MAX_BYTES) || 4 * 1024 * 1024
+
+const statOrNull = async (filePath) => {
+  try {
+    return await stat(filePath)
+  } catch (error) {
+    if (error.code === 'ENOENT') return null
+    throw error
+  }
+}
+
+// Complete lines only: the writer may be halfway through appending
+const parseRows = (text) => text.slice(0, text.lastIndexOf('\\n') + 1)
+  .split('\\n')
+  .filter(Boolean)
+  .map(line => JSON.parse(line))
+
+const readRows = async (filePath) => {
+  try {
+    return parseRows(await readFile(filePath, 'utf-8'))
+  } catch (error) {
+    if (error.code === 'ENOENT') return []
+    throw error
+  }
+}
+
+// subjectId:voteType -> highest toPosition among rows
+const indexRows = (rows) => {
+  const index = {}
+  for (const { subjectId, voteType, toPosition } of rows) {
+    const key = `${subjectId}:${voteType}`
+    index[key] = Math.max(index[key] || 0, toPosition)
+  }
+  return index
+}
+
+// Sealed segments, oldest first, as { name, logPath, indexPath }
+const listSegments = async () => {
+  let names = []
+  try {
+    names = await readdir(segmentsPath)
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+  }
+  const numbers = names
+    .map(name => /^(\\d+)\\.log$/.exec(name))
+    .filter(Boolean)
+    .map(([, number]) => Number(number))
+    .sort((a, b) => a - b)
+  const segments = numbers.map(number => ({
+    name: String(number),
+    logPath: path.join(segmentsPath, `${number}.log`),
+    indexPath: path.join(segmentsPath, `${number}.idx.json`)
+  }))
+  if (await statOrNull(legacyPath)) {
+    segments.unshift({ name: 'legacy', logPath: legacyPath, indexPath: null })
+  }
+  return segments
+}
+
+// Indexes once read, by segment path. A sealed segment never changes, but
+// reset_db removes them all and numbering starts over, so an index is
+// only used while the segment's inode and mtime are the ones it was read
+// for.
+const segmentIndexes = new Map()
+
+const indexOf = async (segment) => {
+  const file = await statOrNull(segment.logPath)
+  if (!file) {
+    segmentIndexes.delete(segment.logPath)
+    return {}
+  }
+  const cached = segmentIndexes.get(segment.logPath)
+  if (cached?.ino === file.ino && cached.mtimeMs === file.mtimeMs) return cached.index
+
+  let index
+  try {
+    index = segment.indexPath && JSON.parse(await readFile(segment.indexPath, 'utf-8'))
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+  }
+  // The legacy file, or a seal interrupted before its index was written
+  index = index || indexRows(await readRows(segment.logPath))
+  segmentIndexes.set(segment.logPath, { ino: file.ino, mtimeMs: file.mtimeMs, index })
+  return index
+}
+
+const seal = async () => {
+  const segments = await listSegments()
+  const last = segments.filter(({ name }) => name !== 'legacy').at(-1)
+  const number = last ? Number(last.name) + 1 : 1
+  await mkdir(segmentsPath, { recursive: true })
+  const index = indexRows(await readRows(rewardsPath))
+  await writeFile(path.join(segmentsPath, `${number}.idx.json`), JSON.stringify(index))
+  await rename(rewardsPath, path.join(segmentsPath, `${number}.log`))
+}
+
+// Rows are { timestamp, subjectId, voteType, voterId, tier, fromPosition,
+// toPosition, reward }; call with the write lock held
+export const appendRewards = async (rows) => {
+  if (!rows.length) return
+  await appendFile(rewardsPath, rows.map(row => JSON.stringify(row) + '\\n').join(''))
+  if ((await stat(rewardsPath)).size > REWARD_LOG_MAX_BYTES) {
+    await seal()
+  }
+}
+
+// Rows of rewards.log, parsed once and then read on from where the last
+// read stopped; a seal or reset replaces the file, so start over then
+const active = { ino: null, offset: 0, rows: [] }
+
+const readActive = async () => {
+  let handle
+  try {
+    handle = await open(rewardsPath, 'r')
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error
+    Object.assign(active, { ino: null, offset: 0, rows: [] })
+    return active.rows
+  }
+
+  try {
+    const { ino, size } = await handle.stat()
+    if (ino !== active.ino || size < active.offset) {
+      Object.assign(active, { ino, offset: 0, rows: [] })
+    }
+    if (size > active.offset) {
+      const buffer = Buffer.alloc(size - active.offset)
+      await handle.read(buffer, 0, buffer.length, active.offset)
+      const end = buffer.lastIndexOf(0x0a) + 1
+      active.rows.push(...parseRows(buffer.toString('utf-8', 0, end)))
+      active.offset += end
+    }
+    return active.rows
+  } finally {
+    await handle.close()
+  }
+}
+
+const sameSegments = (a, b) =>
+  a.length === b.length && a.every((segment, i) => segment.logPath === b[i].logPath)
+
+// Credits in the ledger for a user whose stats.votedOn is votedOn, newest
+// first, reading sealed segments only until limit credits are found
+export const rewardsFor = async (votedOn, limit = Infinity) => {
+  const positions = Object.entries(votedOn).flatMap(([subjectId, types]) =>
+    Object.entries(types).map(([voteType, position]) => ({ key: `${subjectId}:${voteType}`, position }))
+  )
+  if (!positions.length) return []
+
+  // A seal between listing and reading would hide or repeat its rows
+  let segments = await listSegments()
+  let rows
+  for (;;) {
+    rows = await readActive()
+    const after = await listSegments()
+    if (sameSegments(segments, after)) break
+    segments = after
+  }
+
+  const credits = []
+  const collect = (rows) => {
+    for (let i = rows.length - 1; i >= 0 && credits.length < limit; i--) {
+      const { timestamp, subjectId, voteType, voterId, tier, fromPosition, toPosition, reward } = rows[i]
+      const position = votedOn[subjectId]?.[voteType]
+      if (position >= fromPosition && position <= toPosition) {
+        credits.push({ timestamp, subjectId, voteType, voterId, position, tier, reward })
+      }
+    }
+  }
+
+  collect(rows)
+  for (let i = segments.length - 1; i >= 0 && credits.length < limit; i--) {
+    const index = await indexOf(segments[i])
+    if (positions.some(({ key, position }) => index[key] >= position)) {
+      collect(await readRows(segments[i].logPath))
+    }
+  }
+  return credits
+}
+"""
+        (self.backend_path / "rewards.js").write_text(rewards_code)
+        print("Created rewards.js for the reward ledger")
+
+    def create_archive_file(self):
+        """Create archive.js, the cold store for voter history"""
+        archive_code = """import { appendFile, mkdir, open } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Cold voter history. With HISTORY_ARCHIVE=true, votes past the last
+// reward band among their type's voters are counted but kept out of the
+// subject's voterHistory (ledger.js), and the writer appends them here
+// instead: one JSON line per entry in archive/subject-<id>.log. Lines are
+// appended before the commit that records their votes, so a failed commit
+// can leave lines behind. Reading keeps the last line per position and
+// the caller drops positions the subject's counters do not reach.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+const archivePath = path.join(__dirname, 'archive')
+export const HISTORY_ARCHIVE = process.env.HISTORY_ARCHIVE === 'true'
+
+const READ_CHUNK_BYTES = 1024 * 1024
+
+const subjectPath = (subjectId) => path.join(archivePath, `subject-${subjectId}.log`)
+
+// [{ subjectId, entry }], one append per subject file
+export const appendArchive = async (archived) => {
+  if (!archived.length) return
+  const lines = new Map()
+  for (const { subjectId, entry } of archived) {
+    lines.set(subjectId, (lines.get(subjectId) || '') + JSON.stringify(entry) + '\\n')
+  }
+  await mkdir(archivePath, { recursive: true })
+  for (const [subjectId, text] of lines) {
+    await appendFile(subjectPath(subjectId), text)
+  }
+}
+
+// Per subject file: position, byte offset and length of the line kept for
+// each archived position, in position order, and how much of the file
+// has been indexed. Rebuilt when the file is replaced or truncated.
+const indexes = new Map()
+
+const binarySearch = (positions, position) => {
+  let low = 0
+  let high = positions.length
+  while (low < high) {
+    const middle = (low + high) >> 1
+    if (positions[middle] < position) low = middle + 1
+    else high = middle
+  }
+  return low
+}
+
+const indexLine = (index, position, offset, length) => {
+  const { positions, offsets, lengths } = index
+  // Positions only grow, except after a failed commit
+  const at = positions.length && positions[positions.length - 1] >= position
+    ? binarySearch(positions, position)
+    : positions.length
+  if (positions[at] === position) {
+    offsets[at] = offset
+    lengths[at] = length
+    return
+  }
+  positions.splice(at, 0, position)
+  offsets.splice(at, 0, offset)
+  lengths.splice(at, 0, length)
+}
+
+// Index the lines appended since the last call
+const refresh = async (handle, subjectId) => {
+  const { ino, size } = await handle.stat()
+  let index = indexes.get(subjectId)
+  if (!index || index.ino !== ino || size < index.size) {
+    index = { ino, size: 0, positions: [], offsets: [], lengths: [] }
+    indexes.set(subjectId, index)
+  }
+  while (index.size < size) {
+    const buffer = Buffer.alloc(Math.min(READ_CHUNK_BYTES, size - index.size))
+    const { bytesRead } = await handle.read(buffer, 0, buffer.length, index.size)
+    let start = 0
+    for (let end = buffer.indexOf(0x0a); end !== -1 && end < bytesRead; end = buffer.indexOf(0x0a, start)) {
+      const { position } = JSON.parse(buffer.toString('utf-8', start, end))
+      indexLine(index, position, index.size + start, end - start)
+      start = end + 1
+    }
+    // A line longer than the chunk, or one still being written
+    if (!start) break
+    index.size += start
+  }
+  return index
+}
+
+// Archived entries with from <= position <= to, in position order
+export const archivedEntries = async (subjectId, from, to) => {
+  let handle
+  try {
+    handle = await open(subjectPath(subjectId), 'r')
+  } catch (error) {
+    if (error.code === 'ENOENT') return []
+    throw error
+  }
+
+  try {
+    const { positions, offsets, lengths } = await refresh(handle, subjectId)
+    const first = binarySearch(positions, from)
+    const last = binarySearch(positions, to + 1)
+    if (first >= last) return []
+
+    const base = offsets[first]
+    const end = Math.max(...offsets.slice(first, last).map((offset, i) => offset + lengths[first + i]))
+    const buffer = Buffer.alloc(end - base)
+    await handle.read(buffer, 0, buffer.length, base)
+    const entries = []
+    for (let i = first; i < last; i++) {
+      const start = offsets[i] - base
+      entries.push(JSON.parse(buffer.toString('utf-8', start, start + lengths[i])))
+    }
+    return entries
+  } finally {
+    await handle.close()
+  }
+}
+"""
+        (self.backend_path / "archive.js").write_text(archive_code)
+        print("Created archive.js for archived voter history")
+
+    def create_lock_file(self):
+        """Create lock.js, the write lock shared by every process"""
+        lock_code = """import { open, stat, unlink, utimes } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Cross-process write lock. Each process, and each worker thread
+// serverless-offline runs invocations in, has its own writer queue and
+// in-memory state, so every read-modify-write of the stored data runs
+// while holding writer.lock, created with O_EXCL. The holder touches the
+// file while it works; a lock left untouched for WRITE_LOCK_STALE_MS
+// belongs to a holder that died, and is broken. This covers processes
+// sharing the backend directory; Lambda instances do not share one.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+export const lockPath = path.join(__dirname, 'writer.lock')
+const WRITE_LOCK_STALE_MS = Number(process.env.WRITE_LOCK_STALE_MS) || 10000
+const RETRY_MS = 2
+const MAX_RETRY_MS = 50
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms))
+
+const statOrNull = async () => {
+  try {
+    return await stat(lockPath)
+  } catch (error) {
+    if (error.code === 'ENOENT') return null
+    throw error
+  }
+}
+
+const tryAcquire = async () => {
+  try {
+    const handle = await open(lockPath, 'wx')
+    await handle.writeFile(`${process.pid}\\n`)
+    await handle.close()
+    return true
+  } catch (error) {
+    if (error.code === 'EEXIST') return false
+    throw error
+  }
+}
+
+const acquire = async () => {
+  for (let attempt = 0; !await tryAcquire(); attempt++) {
+    const held = await statOrNull()
+    if (held && Date.now() - held.mtimeMs > WRITE_LOCK_STALE_MS) {
+      // Only if it is still the same abandoned file
+      const current = await statOrNull()
+      if (current && current.ino === held.ino && current.mtimeMs === held.mtimeMs) {
+        await unlink(lockPath).catch(() => {})
+      }
+      continue
+    }
+    if (!held) continue
+    const delay = Math.min(RETRY_MS * 2 ** attempt, MAX_RETRY_MS)
+    await sleep(delay / 2 + Math.random() * delay / 2)
+  }
+}
+
+// Run fn while holding the lock; resolves or rejects with fn's outcome
+export const withWriteLock = async (fn) => {
+  await acquire()
+  const heartbeat = setInterval(() => {
+    const now = new Date()
+    utimes(lockPath, now, now).catch(() => {})
+  }, WRITE_LOCK_STALE_MS / 3)
+  heartbeat.unref()
+  try {
+    return await fn()
+  } finally {
+    clearInterval(heartbeat)
+    await unlink(lockPath).catch(() => {})
+  }
+}
+"""
+        (self.backend_path / "lock.js").write_text(lock_code)
+        print("Created lock.js for the cross-process write lock")
+
+    def create_writer_file(self):
+        """Create writer.js, the ordered group-commit writer for votes"""
+        writer_code = """import subjectsDb from './subjects.js'
+import usersDb from './users.js'
+import { appendArchive, HISTORY_ARCHIVE } from './archive.js'
+import { publish } from './events.js'
+import { applyVotes, takeColdEntries } from './ledger.js'
+import { withWriteLock } from './lock.js'
+import { appendRewards } from './rewards.js'
+import { transaction } from './storage.js'
+
+// Group commit. Requests of one or more votes are queued and applied in
+// arrival order by one flush at a time. The first request into an idle
+// queue opens a GROUP_COMMIT_MS window; everything queued by the time it
+// closes (or while the previous commit was being written) is persisted in
+// one commit, and each caller resolves only after that commit. A request
+// is never split across commits. The queue is per process (or worker
+// thread); commits from different ones take turns on the write lock
+// (lock.js), each reloading what the others wrote first.
+const GROUP_COMMIT_MS = Number(process.env.GROUP_COMMIT_MS ?? 5)
+const GROUP_COMMIT_MAX_BATCH = Number(process.env.GROUP_COMMIT_MAX_BATCH) || 1000
+
+const queue = []
+let timer = null
+let flushing = false
+
+const schedule = (delay) => {
+  if (timer || flushing) return
+  timer = setTimeout(flush, delay)
+}
+
+// Whole requests up to GROUP_COMMIT_MAX_BATCH votes, and at least one
+const takeBatch = () => {
+  let count = 0
+  let size = 0
+  while (size < queue.length && (size === 0 || count + queue[size].votes.length <= GROUP_COMMIT_MAX_BATCH)) {
+    count += queue[size].votes.length
+    size++
+  }
+  return queue.splice(0, size)
+}
+
+// Snapshot the delta right after each vote: later votes in the batch
+// change the subject's counters and may credit this user again
+const toDelta = ({ subject, user, entry, distributions }) => ({
+  subject: { id: subject.id, votes: { ...subject.votes }, lastUpdated: subject.lastUpdated },
+  entry,
+  user: structuredClone(user),
+  distributions
+})
+
+// Reward ledger rows for a committed vote, one per band it paid
+const toRewardRows = ({ vote, result }) => result.distributions.map(({ tier, fromPosition, toPosition, reward }) => ({
+  timestamp: vote.timestamp,
+  subjectId: vote.id,
+  voteType: vote.voteType,
+  voterId: vote.userId,
+  tier,
+  fromPosition,
+  toPosition,
+  reward
+}))
+
+// Compact stream event for a committed vote: the subject's counters, the
+// new history entry, the voter's balance and the reward bands it paid
+const toEvent = ({ vote, result }) => ({
+  type: 'vote',
+  subject: result.subject,
+  entry: result.entry,
+  user: { id: vote.userId, points: result.user.points },
+  rewards: result.distributions.map(({ fromPosition, toPosition, reward }) => ({ fromPosition, toPosition, reward }))
+})
+
+// Subjects whose voterHistory has been checked for entries recorded before
+// archiving was on. Keyed by the subject object, so reloads check again.
+const swept = new WeakSet()
+
+// Append the entries the batch archived, plus any the touched subjects
+// still hold past the last reward band, to the archive. If that fails they
+// go back into voterHistory, to be archived with the subject's next vote.
+// Resolves with the entries that ended up in the archive.
+const archiveHistory = async (state, subjects, archived, logger) => {
+  const cold = new Map()  // subject -> entries
+  for (const subject of subjects) {
+    if (swept.has(subject)) continue
+    swept.add(subject)
+    const entries = takeColdEntries(state, subject)
+    if (entries.length) cold.set(subject, entries)
+  }
+  for (const { subject, entry } of archived) {
+    cold.set(subject, [...(cold.get(subject) || []), entry])
+  }
+  if (!cold.size) return new Set()
+
+  try {
+    await appendArchive([...cold].flatMap(([subject, entries]) =>
+      entries.map(entry => ({ subjectId: subject.id, entry }))
+    ))
+    return new Set([...cold.values()].flat())
+  } catch (error) {
+    for (const [subject, entries] of cold) {
+      subject.voterHistory = [...subject.voterHistory, ...entries].sort((a, b) => a.position - b.position)
+      swept.delete(subject)
+    }
+    logger?.error('Failed to archive voter history', error)
+    return new Set()
+  }
+}
+
+const flush = async () => {
+  timer = null
+  flushing = true
+  const batch = takeBatch()
+  const logger = batch[0].logger
+  let outcomes = []
+  let accepted = []
+  let events = []
+
+  try {
+    // Reward rows and events are written under the same lock as the votes,
+    // so events are numbered in commit order across processes
+    const version = await withWriteLock(async () => {
+      const committed = await transaction(async () => {
+        const state = { subjects: subjectsDb.data.subjects, points: usersDb.data.points }
+        const votes = batch.flatMap(request =>
+          request.votes.map(vote => ({ ...vote, timestamp: new Date().toISOString() }))
+        )
+        const subjects = new Set()
+        const archived = []
+        const snapshot = (result) => {
+          subjects.add(result.subject)
+          if (result.archived) archived.push(result)
+          return toDelta(result)
+        }
+        outcomes = applyVotes(state, votes, logger, snapshot, { archive: HISTORY_ARCHIVE })
+          .map((outcome, index) => ({ ...outcome, vote: votes[index] }))
+        const archivedEntries = HISTORY_ARCHIVE
+          ? await archiveHistory(state, subjects, archived, logger)
+          : new Set()
+        return outcomes.filter(({ result }) => result).map(({ vote, result }) => ({
+          vote,
+          entry: archivedEntries.has(result.entry) ? null : result.entry
+        }))
+      })
+
+      accepted = outcomes.filter(({ result }) => result)
+      const rewardRows = accepted.flatMap(toRewardRows)
+      if (accepted.length) {
+        logger?.info('Group commit', {
+          batchSize: outcomes.length,
+          committed: accepted.length,
+          rewardRows: rewardRows.length
+        })
+      }
+
+      // The votes and balances are durable either way: the reward ledger
+      // is a record of them, and subscribers resync on a gap
+      try {
+        await appendRewards(rewardRows)
+      } catch (error) {
+        logger?.error('Failed to append reward ledger rows', error)
+      }
+      try {
+        if (accepted.length) events = await publish(accepted.map(toEvent))
+      } catch (error) {
+        logger?.error('Failed to publish vote events', error)
+      }
+      return committed
+    })
+
+    accepted.forEach((outcome, index) => {
+      outcome.result = { ...outcome.result, version, seq: events[index]?.seq ?? null }
+    })
+
+    let offset = 0
+    for (const request of batch) {
+      request.resolve(outcomes.slice(offset, offset + request.votes.length))
+      offset += request.votes.length
+    }
+  } catch (error) {
+    // Nothing from this batch is durable
+    for (const request of batch) request.reject(error)
+  } finally {
+    flushing = false
+    if (queue.length) schedule(0)
+  }
+}
+
+// Queue [{ id, voteType, userId }] to be applied in order in one commit.
+// Once committed resolves with { result } or { error } per vote, where
+// result is the vote's delta { subject: { id, votes, lastUpdated }, entry,
+// user, distributions, version, seq }; rejects if the commit fails.
+export const submitVotes = (votes, logger) => new Promise((resolve, reject) => {
+  queue.push({ votes, logger, resolve, reject })
+  schedule(GROUP_COMMIT_MS)
+})
+
+// Single vote: resolves with its delta, rejects if refused or not committed
+export const submitVote = async (vote, logger) => {
+  const [{ result, error }] = await submitVotes([vote], logger)
+  if (error) throw error
+  return result
+}
+"""
+        (self.backend_path / "writer.js").write_text(writer_code)
+        print("Created writer.js with group commit")
+
+    def create_events_files(self):
+        """Create events.js, the vote event journal, and eventServer.js, which
+        streams it to browsers as server-sent events"""
+        events_code = """import { appendFile, readFile, rename, stat, writeFile } from 'fs/promises'
+import path from 'path'
+import { fileURLToPath } from 'url'
+
+// Journal of committed vote deltas for the event stream. The writer appends
+// one JSON line per vote with a sequence number; eventServer.js tails the
+// file and pushes new lines to subscribers. Once the file grows past
+// EVENT_LOG_MAX_BYTES only the last EVENT_LOG_KEEP events are kept. Every
+// append happens under the write lock (lock.js), whichever process or
+// worker makes it, so sequence numbers have no gaps or repeats; reset_db
+// takes the lock to append a reset event of its own.
+const __dirname = path.dirname(fileURLToPath(import.meta.url))
+export const eventsPath = path.join(__dirname, 'events.log')
+export const EVENT_LOG_KEEP = Number(process.env.EVENT_LOG_KEEP) || 1000
+const EVENT_LOG_MAX_BYTES = Number(process.env.EVENT_LOG_MAX_BYTES) || 1024 * 1024
+
+// File as last written by this process; size -1 forces a re-read
+const journal = { seq: 0, ino: null, size: -1 }
+
+const fileOf = async () => {
+  try {
+    const { ino, size } = await stat(eventsPath)
+    return { ino, size }
+  } catch (error) {
+    if (error.code === 'ENOENT') return { ino: null, size: 0 }
+    throw error
+  }
+}
+
+const encode = (events) => events.map(event => JSON.stringify(event) + '\\n').join('')
+
+// Complete lines only: another process may be halfway through appending
+export const readEvents = async () => {
+  let text
+  try {
+    text = await readFile(eventsPath, 'utf-8')
+  } catch (error) {
+    if (error.code === 'ENOENT') return []
+    throw error
+  }
+  return text.slice(0, text.lastIndexOf('\\n') + 1)
+    .split('\\n')
+    .filter(Boolean)
+    .map(line => JSON.parse(line))
+}
+
+// Append deltas as events numbered after the last journalled one; call
+// with the write lock held. Resolves with the events.
+export const publish = async (deltas) => {
+  try {
+    // Appended to or trimmed elsewhere since: pick up the last seq again
+    const { ino, size } = await fileOf()
+    if (ino !== journal.ino || size !== journal.size) {
+      const events = await readEvents()
+      journal.seq = events.length ? events[events.length - 1].seq : journal.seq
+      journal.ino = ino
+      journal.size = size
+    }
+
+    const events = deltas.map(delta => ({ seq: ++journal.seq, ...delta }))
+    const text = encode(events)
+    await appendFile(eventsPath, text)
+    journal.size += Buffer.byteLength(text)
+
+    if (journal.size > EVENT_LOG_MAX_BYTES) {
+      const kept = encode((await readEvents()).slice(-EVENT_LOG_KEEP))
+      const tmpPath = `${eventsPath}.tmp`
+      await writeFile(tmpPath, kept)
+      await rename(tmpPath, eventsPath)
+      journal.size = Buffer.byteLength(kept)
+    }
+    journal.ino = (await fileOf()).ino
+    return events
+  } catch (error) {
+    journal.size = -1
+    throw error
+  }
+}
+"""
+
+        event_server_code = """import http from 'http'
+import { watch } from 'fs'
+import { open } from 'fs/promises'
+import path from 'path'
+import { EVENT_LOG_KEEP, eventsPath } from './events.js'
+
+// Server-sent events for vote deltas, tailing events.log (see events.js).
+// GET /events streams every event after ?since=<seq>, or after the
+// Last-Event-ID a browser sends when it reconnects; a negative one gets a
+// 400. A client that is further behind than the buffer gets a reset event
+// and should refetch.
+const PORT = Number(process.env.EVENTS_PORT) || 3002
+const HEARTBEAT_MS = 15000
+const POLL_MS = 1000
+
+let buffer = []  // last EVENT_LOG_KEEP events, oldest first
+const clients = new Set()
+const tail = { ino: null, offset: 0 }
+
+const lastSeq = () => buffer.length ? buffer[buffer.length - 1].seq : 0
+
+const format = (event) => `id: ${event.seq}\\nevent: ${event.type}\\ndata: ${JSON.stringify(event)}\\n\\n`
+
+const broadcast = (message) => {
+  for (const client of clients) client.write(message)
+}
+
+// Read complete lines appended since the last read; a trim replaces the
+// file, so start over from the top and skip events already buffered
+const readNew = async () => {
+  let handle
+  try {
+    handle = await open(eventsPath, 'r')
+  } catch (error) {
+    if (error.code === 'ENOENT') return
+    throw error
+  }
+
+  try {
+    const { ino, size } = await handle.stat()
+    if (ino !== tail.ino || size < tail.offset) {
+      tail.ino = ino
+      tail.offset = 0
+    }
+    if (size <= tail.offset) return
+
+    const chunk = Buffer.alloc(size - tail.offset)
+    await handle.read(chunk, 0, chunk.length, tail.offset)
+    const end = chunk.lastIndexOf(0x0a)
+    if (end === -1) return
+    tail.offset += end + 1
+
+    for (const line of chunk.toString('utf-8', 0, end).split('\\n')) {
+      if (!line) continue
+      const event = JSON.parse(line)
+      if (event.seq <= lastSeq()) continue
+      buffer.push(event)
+      broadcast(format(event))
+    }
+    if (buffer.length > EVENT_LOG_KEEP) buffer = buffer.slice(-EVENT_LOG_KEEP)
+  } finally {
+    await handle.close()
+  }
+}
+
+let reading = Promise.resolve()
+const scheduleRead = () => {
+  reading = reading.then(readNew).catch(error => console.error('Error reading events:', error))
 }
 
-const usersDb = new Low(new JSONFile(dbPath), defaultData)
+const subscribe = (req, res, url) => {
+  const since = Number(url.searchParams.get('since') ?? req.headers['last-event-id'] ?? NaN)
+  if (since < 0) {
+    res.writeHead(400, { 'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*' })
+    return res.end(JSON.stringify({ error: 'since must not be negative' }))
+  }
 
-// Initialize database
-await usersDb.read()
-if (!usersDb.data) {
-  usersDb.data = defaultData
-  await usersDb.write()
+  res.writeHead(200, {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    Connection: 'keep-alive',
+    'Access-Control-Allow-Origin': '*'
+  })
+  res.write('retry: 1000\\n\\n')
+
+  if (Number.isInteger(since) && since < lastSeq()) {
+    // Nothing buffered to replay from counts as too old
+    if (!buffer.length || since < buffer[0].seq - 1) {
+      res.write(`id: ${lastSeq()}\\nevent: reset\\ndata: {}\\n\\n`)
+    } else {
+      for (const event of buffer) {
+        if (event.seq > since) res.write(format(event))
+      }
+    }
+  }
+
+  clients.add(res)
+  req.on('close', () => clients.delete(res))
 }
 
-export default usersDb
+const server = http.createServer((req, res) => {
+  const url = new URL(req.url, `http://${req.headers.host || 'localhost'}`)
+  if (req.method === 'OPTIONS') {
+    res.writeHead(204, {
+      'Access-Control-Allow-Origin': '*',
+      'Access-Control-Allow-Methods': 'GET,OPTIONS',
+      'Access-Control-Allow-Headers': 'Last-Event-ID'
+    })
+    return res.end()
+  }
+  if (req.method === 'GET' && url.pathname === '/events') {
+    return subscribe(req, res, url)
+  }
+  res.writeHead(404, { 'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*' })
+  res.end(JSON.stringify({ error: 'Not found' }))
+})
+
+// fs.watch for low latency, plus a slow poll where watching is unreliable
+watch(path.dirname(eventsPath), (_, filename) => {
+  if (!filename || filename === path.basename(eventsPath)) scheduleRead()
+})
+setInterval(scheduleRead, POLL_MS)
+setInterval(() => broadcast(': heartbeat\\n\\n'), HEARTBEAT_MS)
+
+scheduleRead()
+await reading
+server.listen(PORT, () => console.log(`Event stream on http://localhost:${PORT}/events`))
 """
+        (self.backend_path / "events.js").write_text(events_code)
+        (self.backend_path / "eventServer.js").write_text(event_server_code)
+        print("Created events.js and eventServer.js for the vote event stream")
+
+    def create_logger_file(self):
+        """Create logger.js, the structured logger used by the backend"""
+        logger_code = """import { writeSync } from 'fs'
+
+// Structured JSON logger. Events below LOG_LEVEL (debug, info, error or
+// silent; default info) return before anything is serialized, and data may
+// be passed as a function so building it is skipped as well. Debug events
+// are sampled at LOG_DEBUG_SAMPLE_RATE. Lines are buffered and written in
+// one write after the current tick, straight to process.stdout, so console
+// wrappers such as serverless-offline's never see them.
+const LEVELS = { debug: 10, info: 20, metric: 20, error: 40, silent: 50 }
+const threshold = LEVELS[process.env.LOG_LEVEL?.toLowerCase()] ?? LEVELS.info
+const debugSampleRate = Number(process.env.LOG_DEBUG_SAMPLE_RATE ?? 1)
+const LOG_BUFFER_MAX_BYTES = 64 * 1024
+
+let buffer = []
+let bufferedBytes = 0
+let scheduled = false
+
+export const flushLogs = () => {
+  scheduled = false
+  if (!buffer.length) return
+  const text = buffer.join('')
+  buffer = []
+  bufferedBytes = 0
+  process.stdout.write(text)
+}
 
-        # Write the files
-        backend_path = self.backend_path
-        backend_path.mkdir(parents=True, exist_ok=True)
-        
-        (backend_path / "subjects.js").write_text(subjects_db_code)
-        (backend_path / "users.js").write_text(users_db_code)
-        print("Created separate database files")
+const write = (line) => {
+  buffer.push(line)
+  bufferedBytes += line.length
+  if (bufferedBytes >= LOG_BUFFER_MAX_BYTES) {
+    flushLogs()
+  } else if (!scheduled) {
+    scheduled = true
+    setImmediate(flushLogs)
+  }
+}
 
-    def create_handler_file(self):
-        """Create handler.js with separate db imports"""
-        handler_code = """import subjectsDb from './subjects.js'
-import usersDb from './users.js'
+// No more ticks are coming: write what is left synchronously
+process.on('exit', () => {
+  if (buffer.length) writeSync(1, buffer.join(''))
+})
 
-const VOTE_COST = 10
-const INITIAL_POINTS = 100
-const MIN_REWARD = 0.000001
-const REWARD_TIERS = {
-  TIER1: { max: 10, share: 5, reward: 0.5 },
-  TIER2: { max: 100, share: 3, reward: 0.033 },
-  TIER3: { max: 1000, share: 1.5, reward: 0.00167 },
-  TIER4: { max: 10000, share: 0.5, reward: 0.000056 }
-}
+const enabled = (level) => LEVELS[level] >= threshold
 
-const logger = {
+const format = (level, message, data, extra) => JSON.stringify({
+  timestamp: new Date().toISOString(),
+  level: level.toUpperCase(),
+  message,
+  ...extra,
+  ...(typeof data === 'function' ? data() : data)
+}) + '\\n'
+
+export const logger = {
   info: (message, data = {}) => {
-    console.log(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'INFO',
-      message,
-      ...data
-    }))
+    if (enabled('info')) write(format('info', message, data))
   },
+  // Errors are rare and wanted promptly: buffered lines first, then stderr
   error: (message, error = {}, data = {}) => {
-    console.error(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'ERROR',
-      message,
-      error: {
-        name: error.name,
-        message: error.message,
-        stack: error.stack
-      },
-      ...data
+    if (!enabled('error')) return
+    flushLogs()
+    process.stderr.write(format('error', message, data, {
+      error: { name: error.name, message: error.message, stack: error.stack }
     }))
   },
   debug: (message, data = {}) => {
-    console.debug(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'DEBUG',
-      message,
-      ...data
-    }))
+    if (!enabled('debug') || (debugSampleRate < 1 && Math.random() >= debugSampleRate)) return
+    write(format('debug', message, data, debugSampleRate < 1 ? { sampleRate: debugSampleRate } : {}))
   },
   metric: (message, metrics = {}) => {
-    console.log(JSON.stringify({
-      timestamp: new Date().toISOString(),
-      level: 'METRIC',
-      message,
-      ...metrics
-    }))
+    if (enabled('metric')) write(format('metric', message, metrics))
   }
 }
+"""
+        (self.backend_path / "logger.js").write_text(logger_code)
+        print("Created logger.js for structured logging")
 
-const initializeUser = (userId) => {
-  if (!usersDb.data.points[userId]) {
-    logger.info('Initializing new user', { userId, initialPoints: INITIAL_POINTS })
-    usersDb.data.points[userId] = {
-      points: INITIAL_POINTS,
-      upVoteRewards: {},
-      downVoteRewards: {},
-      rewardHistory: []
-    }
-  }
-  return usersDb.data.points[userId]
+    def create_handler_file(self):
+        """Create handler.js with separate db imports"""
+        handler_code = """import subjectsDb from './subjects.js'
+import usersDb from './users.js'
+import { archivedEntries } from './archive.js'
+import { emptyStats, historyLength, INITIAL_POINTS, initializeUser, userStats } from './ledger.js'
+import { logger } from './logger.js'
+import { rewardsFor } from './rewards.js'
+import { cacheStats, dataVersion, loadState } from './storage.js'
+import { submitVote, submitVotes } from './writer.js'
+
+// ETags are the data version, prefixed per process so a restarted backend
+// never matches a tag handed out before the restart
+const etagPrefix = `${process.pid.toString(36)}-${Date.now().toString(36)}`
+const etagFor = (version, variant = '') => `"${etagPrefix}-${version}${variant}"`
+
+// If-None-Match uses weak comparison and may list several tags
+const notModified = (event, etag) => {
+  const header = event.headers?.['if-none-match'] ?? event.headers?.['If-None-Match']
+  if (!header) return false
+  return header.split(',').some(tag => {
+    const value = tag.trim()
+    return value === '*' || value === etag || value === `W/${etag}`
+  })
 }
 
-const calculateRewardForPosition = (position) => {
-  let tier = 'NONE'
-  let reward = 0
-
-  if (position <= REWARD_TIERS.TIER1.max) {
-    tier = 'TIER1'
-    reward = REWARD_TIERS.TIER1.reward
-  } else if (position <= REWARD_TIERS.TIER2.max) {
-    tier = 'TIER2'
-    reward = REWARD_TIERS.TIER2.reward
-  } else if (position <= REWARD_TIERS.TIER3.max) {
-    tier = 'TIER3'
-    reward = REWARD_TIERS.TIER3.reward
-  } else if (position <= REWARD_TIERS.TIER4.max) {
-    tier = 'TIER4'
-    reward = REWARD_TIERS.TIER4.reward
+const jsonResponse = (statusCode, data) => ({
+  statusCode,
+  headers: {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+  },
+  body: JSON.stringify(data)
+})
+
+const cachedResponse = (event, etag, cacheControl, body) => {
+  const headers = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'ETag',
+    'Cache-Control': cacheControl,
+    ETag: etag
   }
+  if (notModified(event, etag)) {
+    return { statusCode: 304, headers, body: '' }
+  }
+  return { statusCode: 200, headers, body: body() }
+}
 
-  logger.debug('Calculated reward', { position, tier, reward })
-  return reward
+// ?view=summary leaves out voterHistory, see GET /subjects/{id}/history
+const SUBJECT_VIEWS = {
+  full: (subject) => subject,
+  summary: ({ id, title, emoji, votes, lastUpdated }) => ({ id, title, emoji, votes, lastUpdated })
 }
 
-const distributeRewards = async (subjectId, voteType, currentVoterId) => {
-  try {
-    logger.info('Starting reward distribution', {
-      subjectId,
-      voteType,
-      currentVoterId
-    })
+// Serialized GET /subjects bodies per variant, reused until the data
+// version changes
+const subjectsResponses = {}
 
-    const subject = subjectsDb.data.subjects.find(s => s.id === subjectId)
-    if (!subject || !subject.voterHistory) {
-      logger.error('Invalid subject or voter history', {}, { subjectId })
-      return
+// ?users=false leaves out every user's points record, see GET /users/{id}
+export const getSubjects = async (event) => {
+  try {
+    const query = event.queryStringParameters || {}
+    const view = query.view || 'full'
+    if (!SUBJECT_VIEWS[view]) {
+      return jsonResponse(400, { error: `Unknown view: ${view}` })
     }
-
-    const previousVoters = subject.voterHistory
-      .filter(vote => vote.voteType === voteType && vote.userId !== currentVoterId)
-
-    logger.info('Found previous voters', {
-      subjectId,
-      voterCount: previousVoters.length
-    })
-
-    let totalDistributed = 0
-    const distributions = []
-    
-    for (let i = 0; i < previousVoters.length; i++) {
-      const voter = previousVoters[i]
-      const position = i + 1
-      const rewardShare = calculateRewardForPosition(position)
-      
-      if (rewardShare < MIN_REWARD) {
-        logger.debug('Reward too small, stopping distribution', {
-          position,
-          rewardShare
+    if (query.users !== undefined && query.users !== 'true' && query.users !== 'false') {
+      return jsonResponse(400, { error: 'users must be true or false' })
+    }
+    const withUsers = query.users !== 'false'
+
+    await loadState()
+    const version = dataVersion()
+    const variant = `${view === 'full' ? '' : `-${view}`}${withUsers ? '' : '-nousers'}`
+    const cached = subjectsResponses[variant] ??= { version: -1, body: null }
+    // Votes change it at any time, so clients must revalidate every poll
+    return cachedResponse(event, etagFor(version, variant), 'no-cache', () => {
+      if (cached.version !== version) {
+        cached.body = JSON.stringify({
+          subjects: subjectsDb.data.subjects.map(SUBJECT_VIEWS[view]),
+          ...(withUsers && { users: usersDb.data.points }),
+          userProfiles: usersDb.data.profiles
         })
-        break
-      }
-
-      const user = initializeUser(voter.userId)
-      const rewardCategory = voteType === 'up' ? 'upVoteRewards' : 'downVoteRewards'
-      
-      if (!user[rewardCategory][String(subjectId)]) {
-        user[rewardCategory][String(subjectId)] = 0
+        cached.version = version
       }
-      
-      user[rewardCategory][String(subjectId)] += rewardShare
-      user.points += rewardShare
-      totalDistributed += rewardShare
-
-      distributions.push({
-        userId: voter.userId,
-        position,
-        reward: rewardShare,
-        newTotal: user.points
-      })
-
-      logger.debug('Distributed reward', {
-        userId: voter.userId,
-        position,
-        reward: rewardShare,
-        newTotal: user.points
-      })
-    }
-    
-    logger.info('Completed reward distribution', {
-      subjectId,
-      totalDistributed,
-      distributionCount: distributions.length,
-      distributions
+      return cached.body
     })
-
-    await usersDb.write()
   } catch (error) {
-    logger.error('Error in distributeRewards', error, {
-      subjectId,
-      voteType,
-      currentVoterId
-    })
-  }
-}
-
-export const getSubjects = async (event) => {
-  try {
-    await Promise.all([subjectsDb.read(), usersDb.read()])
+    logger.error('Failed to read data', error)
     return {
-      statusCode: 200,
+      statusCode: 500,
       headers: {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*'
       },
-      body: JSON.stringify({
-        subjects: subjectsDb.data.subjects,
-        users: usersDb.data.points,
-        userProfiles: usersDb.data.profiles
-      })
+      body: JSON.stringify({ error: 'Failed to read data' })
     }
+  }
+}
+
+// Profiles only change when the data is reset, so browsers may reuse them
+export const getProfiles = async (event) => {
+  try {
+    await loadState()
+    return cachedResponse(event, etagFor(dataVersion()), 'public, max-age=300', () =>
+      JSON.stringify({ userProfiles: usersDb.data.profiles })
+    )
   } catch (error) {
-    console.error('Error:', error)
+    logger.error('Failed to read data', error)
     return {
       statusCode: 500,
       headers: {
@@ -321,77 +2892,191 @@ export const getSubjects = async (event) => {
   }
 }
 
-const _recordVote = async (event) => {
-  const startTime = Date.now()
-  const requestId = event.requestContext?.requestId || 'unknown'
+const HISTORY_PAGE_SIZE = 50
+const HISTORY_MAX_PAGE_SIZE = 500
+
+// Entries at positions start + 1 to end, newest first. voterHistory is in
+// position order and holds every position unless some were archived
+// (archive.js); those are read from the archive, in one range read.
+const historyPage = async (subject, start, end) => {
+  const history = subject.voterHistory || []
+  let low = 0
+  let high = history.length
+  while (low < high) {
+    const middle = (low + high) >> 1
+    if (history.at(middle).position <= start) low = middle + 1
+    else high = middle
+  }
 
-  try {
-    const { id, voteType, userId } = JSON.parse(event.body)
-    logger.info('Vote request received', { 
-      requestId,
-      subjectId: id,
-      voteType,
-      userId 
-    })
+  const entries = new Map()
+  for (let i = low; i < history.length && history.at(i).position <= end; i++) {
+    const entry = history.at(i)
+    entries.set(entry.position, entry)
+  }
+  if (entries.size < end - start) {
+    for (const entry of await archivedEntries(subject.id, start + 1, end)) {
+      if (!entries.has(entry.position)) entries.set(entry.position, entry)
+    }
+  }
+  return [...entries.values()].sort((a, b) => b.position - a.position)
+}
 
-    await Promise.all([subjectsDb.read(), usersDb.read()])
-    
-    const user = initializeUser(userId)
-    if (user.points < VOTE_COST) {
-      logger.error('Insufficient points', {}, { userId, points: user.points })
-      throw new Error('Not enough points to vote')
+// Newest first. ?cursor=<position> continues with the entries below that
+// position; positions run from 1 to the subject's vote count.
+export const getSubjectHistory = async (event) => {
+  try {
+    const id = Number(event.pathParameters?.id)
+    const query = event.queryStringParameters || {}
+    const limit = query.limit === undefined ? HISTORY_PAGE_SIZE : Number(query.limit)
+    const cursor = query.cursor === undefined ? null : Number(query.cursor)
+    if (!Number.isInteger(limit) || limit < 1 || limit > HISTORY_MAX_PAGE_SIZE) {
+      return jsonResponse(400, { error: `limit must be between 1 and ${HISTORY_MAX_PAGE_SIZE}` })
+    }
+    if (cursor !== null && (!Number.isInteger(cursor) || cursor < 1)) {
+      return jsonResponse(400, { error: 'Invalid cursor' })
     }
 
+    await loadState()
     const subject = subjectsDb.data.subjects.find(s => s.id === id)
     if (!subject) {
-      logger.error('Subject not found', {}, { id })
-      throw new Error('Subject not found')
+      return jsonResponse(404, { error: 'Subject not found' })
     }
 
-    if (!subject.votes) subject.votes = { up: 0, down: 0 }
-    if (!subject.voterHistory) subject.voterHistory = []
+    const total = historyLength(subject)
+    const end = cursor === null ? total : Math.min(cursor - 1, total)
+    const start = Math.max(end - limit, 0)
+    const etag = etagFor(dataVersion(), `-history-${id}-${cursor ?? ''}-${limit}`)
+    // Checked first so a revalidation never reads the archive
+    if (notModified(event, etag)) {
+      return cachedResponse(event, etag, 'no-cache', () => '')
+    }
+    const entries = await historyPage(subject, start, end)
+    return cachedResponse(event, etag, 'no-cache', () => JSON.stringify({
+      subjectId: id,
+      total,
+      entries,
+      nextCursor: start > 0 ? start + 1 : null
+    }))
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
 
-    const hasVoted = subject.voterHistory.some(vote => 
-      vote.userId === userId && vote.voteType === voteType
-    )
-    
-    if (hasVoted) {
-      logger.error('Duplicate vote attempt', {}, { userId, subjectId: id, voteType })
-      throw new Error('You have already voted this way on this subject')
+// One user's points record, for clients that show a single user. Users
+// who have not voted yet get the record they would start with.
+export const getUser = async (event) => {
+  try {
+    const userId = event.pathParameters?.id
+    if (!userId) {
+      return jsonResponse(400, { error: 'Missing user id' })
     }
 
-    user.points -= VOTE_COST
-    logger.info('Points deducted for vote', {
-      userId,
-      cost: VOTE_COST,
-      newTotal: user.points
+    await loadState()
+    const points = usersDb.data.points
+    return cachedResponse(event, etagFor(dataVersion(), `-user-${userId}`), 'no-cache', () => {
+      const user = points[userId] || initializeUser({}, userId)
+      const stats = userStats({ subjects: subjectsDb.data.subjects, points }, userId, user)
+      return JSON.stringify({
+        userId,
+        points: user.points,
+        upVoteRewards: user.upVoteRewards,
+        downVoteRewards: user.downVoteRewards,
+        stats
+      })
     })
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
 
-    subject.votes[voteType]++
-    subject.lastUpdated = new Date().toISOString()
-    
-    subject.voterHistory.push({
-      userId,
-      timestamp: new Date().toISOString(),
-      points: VOTE_COST,
-      voteType,
-      position: subject.voterHistory.length + 1
-    })
+const REWARDS_PAGE_SIZE = 50
+const REWARDS_MAX_PAGE_SIZE = 500
+
+// Most recent credits to a user from the reward ledger, newest first. Only
+// rewards paid by votes this backend recorded are listed; balances in
+// GET /users/{id} are the complete totals.
+export const getUserRewards = async (event) => {
+  try {
+    const userId = event.pathParameters?.id
+    const query = event.queryStringParameters || {}
+    const limit = query.limit === undefined ? REWARDS_PAGE_SIZE : Number(query.limit)
+    if (!userId) {
+      return jsonResponse(400, { error: 'Missing user id' })
+    }
+    if (!Number.isInteger(limit) || limit < 1 || limit > REWARDS_MAX_PAGE_SIZE) {
+      return jsonResponse(400, { error: `limit must be between 1 and ${REWARDS_MAX_PAGE_SIZE}` })
+    }
+
+    await loadState()
+    const points = usersDb.data.points
+    const user = points[userId]
+    const entries = user
+      ? await rewardsFor(userStats({ subjects: subjectsDb.data.subjects, points }, userId, user).votedOn, limit)
+      : []
+    return jsonResponse(200, { userId, entries })
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
+
+// Per-user aggregates maintained by the ledger on every vote, so this is
+// a lookup rather than a scan of every subject's history
+export const getUserStats = async (event) => {
+  try {
+    const userId = event.pathParameters?.id
+    if (!userId) {
+      return jsonResponse(400, { error: 'Missing user id' })
+    }
+
+    await loadState()
+    const points = usersDb.data.points
+    const user = points[userId]
+    return cachedResponse(event, etagFor(dataVersion(), `-stats-${userId}`), 'no-cache', () =>
+      JSON.stringify({
+        userId,
+        points: user ? user.points : INITIAL_POINTS,
+        stats: user ? userStats({ subjects: subjectsDb.data.subjects, points }, userId, user) : emptyStats()
+      })
+    )
+  } catch (error) {
+    logger.error('Failed to read data', error)
+    return jsonResponse(500, { error: 'Failed to read data' })
+  }
+}
+
+const isVote = (vote) =>
+  vote !== null && typeof vote === 'object' &&
+  Number.isInteger(vote.id) &&
+  (vote.voteType === 'up' || vote.voteType === 'down') &&
+  typeof vote.userId === 'string' && vote.userId !== ''
+
+export const recordVote = async (event) => {
+  const startTime = Date.now()
+  const requestId = event.requestContext?.requestId || 'unknown'
+
+  let vote
+  try {
+    vote = JSON.parse(event.body)
+  } catch (error) {
+    return jsonResponse(400, { success: false, error: 'Invalid JSON body' })
+  }
+  if (!isVote(vote)) {
+    return jsonResponse(400, { success: false, error: 'Invalid vote' })
+  }
 
-    logger.info('Vote recorded', {
+  try {
+    const { id, voteType, userId } = vote
+    logger.info('Vote request received', { 
+      requestId,
       subjectId: id,
       voteType,
-      userId,
-      position: subject.voterHistory.length
+      userId 
     })
 
-    await Promise.all([
-      subjectsDb.write(),
-      distributeRewards(id, voteType, userId)
-    ])
-
-    await usersDb.read()
-    const updatedUser = usersDb.data.points[userId]
+    const { subject, entry, user: updatedUser, version, seq } = await submitVote({ id, voteType, userId }, logger)
 
     // Log final points as DEBUG
     logger.debug('Points updated', {
@@ -408,8 +3093,11 @@ const _recordVote = async (event) => {
       },
       body: JSON.stringify({ 
         success: true, 
-        subjects: subjectsDb.data.subjects,
+        subject,
+        entry,
         user: updatedUser,
+        version,
+        seq,
         message: `Vote recorded! Rewards distributed to previous voters.`
       })
     }
@@ -422,14 +3110,15 @@ const _recordVote = async (event) => {
       userId
     })
 
-    logger.metric('Lambda execution metrics', {
+    logger.metric('Lambda execution metrics', () => ({
       requestId,
       functionName: 'recordVote',
       duration: `${duration} ms`,
       billedDuration: `${billedDuration} ms`,
       memoryUsed: process.memoryUsage().heapUsed,
+      cache: cacheStats(),
       timestamp: new Date().toISOString()
-    })
+    }))
 
     return response
   } catch (error) {
@@ -439,7 +3128,7 @@ const _recordVote = async (event) => {
     })
 
     const duration = Date.now() - startTime
-    logger.metric('Lambda execution metrics', {
+    logger.metric('Lambda execution metrics', () => ({
       requestId,
       functionName: 'recordVote',
       duration: `${duration} ms`,
@@ -447,7 +3136,7 @@ const _recordVote = async (event) => {
       memoryUsed: process.memoryUsage().heapUsed,
       status: 'error',
       timestamp: new Date().toISOString()
-    })
+    }))
 
     return {
       statusCode: 400,
@@ -463,42 +3152,63 @@ const _recordVote = async (event) => {
   }
 }
 
-// Wrapper to prevent AWS default logging
-export const recordVote = async (event, context) => {
-  // Disable AWS Lambda's default logging
-  context.callbackWaitsForEmptyEventLoop = false
-  
-  // Store original console
-  const originalConsole = {
-    log: console.log,
-    error: console.error,
-    debug: console.debug
-  }
+const MAX_BATCH_VOTES = 10000
 
-  // Replace console temporarily
-  console.log = (...args) => {
-    if (typeof args[0] === 'string' && !args[0].includes('(λ: recordVote)')) {
-      originalConsole.log.apply(console, args)
-    }
-  }
-  console.error = (...args) => {
-    if (typeof args[0] === 'string' && !args[0].includes('(λ: recordVote)')) {
-      originalConsole.error.apply(console, args)
-    }
+// POST /votes: [{ id, voteType, userId }, ...] applied in order in one
+// commit. Each vote succeeds or fails on its own; results are in order.
+export const recordVotes = async (event) => {
+  const startTime = Date.now()
+  const requestId = event.requestContext?.requestId || 'unknown'
+
+  let votes
+  try {
+    votes = JSON.parse(event.body)
+  } catch (error) {
+    return jsonResponse(400, { success: false, error: 'Invalid JSON body' })
   }
-  console.debug = (...args) => {
-    if (typeof args[0] === 'string' && !args[0].includes('(λ: recordVote)')) {
-      originalConsole.debug.apply(console, args)
-    }
+  if (!Array.isArray(votes) || votes.length === 0 || votes.length > MAX_BATCH_VOTES) {
+    return jsonResponse(400, {
+      success: false,
+      error: `Body must be an array of 1 to ${MAX_BATCH_VOTES} votes`
+    })
   }
 
   try {
-    return await _recordVote(event)
-  } finally {
-    // Restore original console
-    console.log = originalConsole.log
-    console.error = originalConsole.error
-    console.debug = originalConsole.debug
+    logger.info('Batch vote request received', { requestId, votes: votes.length })
+
+    const valid = votes.filter(isVote).map(({ id, voteType, userId }) => ({ id, voteType, userId }))
+    const outcomes = valid.length ? await submitVotes(valid, logger) : []
+
+    let next = 0
+    const results = votes.map(vote => {
+      if (!isVote(vote)) return { success: false, error: 'Invalid vote' }
+      const { result, error } = outcomes[next++]
+      if (error) return { success: false, error: error.message }
+      return {
+        success: true,
+        subject: result.subject,
+        entry: result.entry,
+        points: result.user.points,
+        seq: result.seq
+      }
+    })
+    const committed = results.filter(result => result.success).length
+
+    const duration = Date.now() - startTime
+    logger.metric('Lambda execution metrics', () => ({
+      requestId,
+      functionName: 'recordVotes',
+      duration: `${duration} ms`,
+      votes: votes.length,
+      committed,
+      memoryUsed: process.memoryUsage().heapUsed,
+      timestamp: new Date().toISOString()
+    }))
+
+    return jsonResponse(200, { success: true, committed, rejected: votes.length - committed, results })
+  } catch (error) {
+    logger.error('Batch vote processing failed', error, { requestId })
+    return jsonResponse(500, { success: false, error: error.message })
   }
 }
 
@@ -509,7 +3219,7 @@ export const options = async (event) => {
     headers: {
       'Access-Control-Allow-Origin': '*',
       'Access-Control-Allow-Methods': 'GET,POST,OPTIONS',
-      'Access-Control-Allow-Headers': 'Content-Type'
+      'Access-Control-Allow-Headers': 'Content-Type,If-None-Match'
     },
     body: JSON.stringify({})
   }
@@ -517,11 +3227,62 @@ export const options = async (event) => {
         (self.backend_path / "handler.js").write_text(handler_code)
         print("Created handler.js with separate db handling")
 
+    def create_serverless_file(self):
+        """Create serverless.yml with an httpApi route per handler export"""
+        routes = [
+            ("getSubjects", "/subjects", "get"),
+            ("getProfiles", "/profiles", "get"),
+            ("getSubjectHistory", "/subjects/{id}/history", "get"),
+            ("getUser", "/users/{id}", "get"),
+            ("getUserStats", "/users/{id}/stats", "get"),
+            ("getUserRewards", "/users/{id}/rewards", "get"),
+            ("recordVote", "/vote", "post"),
+            ("recordVotes", "/votes", "post"),
+            ("options", "/{proxy+}", "options"),
+        ]
+        functions = "".join(f"""  {name}:
+    handler: handler.{name}
+    events:
+      - httpApi:
+          path: {path}
+          method: {method}
+""" for name, path, method in routes)
+
+        serverless_config = f"""service: subject-voting-api
+frameworkVersion: '4'
+
+provider:
+  name: aws
+  runtime: nodejs20.x
+  environment:
+    LOG_LEVEL: ${{env:LOG_LEVEL, 'info'}}
+    LOG_DEBUG_SAMPLE_RATE: ${{env:LOG_DEBUG_SAMPLE_RATE, '1'}}
+    HISTORY_ARCHIVE: ${{env:HISTORY_ARCHIVE, 'false'}}
+
+plugins:
+  - serverless-offline
+
+functions:
+{functions}
+custom:
+  serverless-offline:
+    httpPort: 3001
+    noPrependStageInUrl: true
+"""
+        (self.backend_path / "serverless.yml").write_text(serverless_config)
+        print("Created serverless.yml with handler routes")
+
     def create_app_file(self):
         """Create App.jsx with user selection and points display"""
-        app_code = """import React, { useState, useEffect } from 'react';
+        app_code = """import React, { useState, useEffect, useRef } from 'react';
 import './App.css';
 
+const EVENTS_URL = 'http://localhost:3002/events';
+
+// The API counts points in integer micro-points
+const MICRO_POINTS = 1000000;
+const formatPoints = (microPoints, digits = 1) => (microPoints / MICRO_POINTS).toFixed(digits);
+
 const EMOJIS = {
   UP: '\\u{1F44D}',
   DOWN: '\\u{1F44E}',
@@ -529,6 +3290,30 @@ const EMOJIS = {
 };
 
 function SubjectDetail({ subject, onClose, selectedUser }) {
+  const [history, setHistory] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingHistory, setLoadingHistory] = useState(false);
+
+  useEffect(() => {
+    setHistory([]);
+    fetchHistory(null);
+  }, [subject.id, subject.votes?.up, subject.votes?.down]);
+
+  const fetchHistory = async (cursor) => {
+    try {
+      setLoadingHistory(true);
+      const query = cursor ? `?cursor=${cursor}` : '';
+      const response = await fetch(`http://localhost:3001/subjects/${subject.id}/history${query}`);
+      const data = await response.json();
+      setHistory(prev => cursor ? [...prev, ...(data.entries || [])] : (data.entries || []));
+      setNextCursor(data.nextCursor);
+    } catch (error) {
+      console.error('Error fetching history:', error);
+    } finally {
+      setLoadingHistory(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleString();
   };
@@ -556,9 +3341,9 @@ function SubjectDetail({ subject, onClose, selectedUser }) {
           <div className="vote-history">
             <h3>Vote History</h3>
             <div className="vote-list">
-              {subject.voterHistory?.slice().reverse().map((vote, index) => (
+              {history.map(vote => (
                 <div 
-                  key={index} 
+                  key={vote.position} 
                   className={`vote-item ${vote.userId === selectedUser ? 'highlight' : ''}`}
                 >
                   <span className="emoji">
@@ -569,6 +3354,15 @@ function SubjectDetail({ subject, onClose, selectedUser }) {
                   <span className="vote-time">{formatDate(vote.timestamp)}</span>
                 </div>
               ))}
+              {nextCursor && (
+                <button
+                  className="load-more-button"
+                  onClick={() => fetchHistory(nextCursor)}
+                  disabled={loadingHistory}
+                >
+                  {loadingHistory ? 'Loading...' : 'Load more'}
+                </button>
+              )}
             </div>
           </div>
         </div>
@@ -580,31 +3374,116 @@ function SubjectDetail({ subject, onClose, selectedUser }) {
 function App() {
   const [subjects, setSubjects] = useState([]);
   const [selectedUser, setSelectedUser] = useState('user1');
-  const [userPoints, setUserPoints] = useState({});
+  // Only the selected user's record, from GET /users/{id}
+  const [activeUser, setActiveUser] = useState({ points: 100 * MICRO_POINTS, upVoteRewards: {}, downVoteRewards: {}, stats: null });
   const [userProfiles, setUserProfiles] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedSubject, setSelectedSubject] = useState(null);
+  const subjectsEtag = useRef(null);
+  const selectedUserRef = useRef(selectedUser);
+  const activeUserRef = useRef(activeUser);
+  const lastVoteSeq = useRef(null);
+  const refreshTimer = useRef(null);
+  selectedUserRef.current = selectedUser;
+  activeUserRef.current = activeUser;
+
+  useEffect(() => {
+    fetchProfiles();
+  }, []);
 
   useEffect(() => {
     fetchSubjects();
+    fetchUser(selectedUser);
   }, [selectedUser]);
 
-  const fetchSubjects = async () => {
+  // Live updates pushed by eventServer.js instead of polling. EventSource
+  // reconnects by itself and resumes after the last event id it saw.
+  useEffect(() => {
+    const events = new EventSource(EVENTS_URL);
+    events.addEventListener('vote', (message) => handleVoteEvent(JSON.parse(message.data)));
+    events.addEventListener('reset', () => {
+      subjectsEtag.current = null;
+      fetchSubjects({ quiet: true });
+    });
+    return () => {
+      events.close();
+      clearTimeout(refreshTimer.current);
+    };
+  }, []);
+
+  const fetchProfiles = async () => {
+    try {
+      const response = await fetch('http://localhost:3001/profiles');
+      const data = await response.json();
+      setUserProfiles(data.userProfiles || []);
+    } catch (error) {
+      console.error('Error fetching profiles:', error);
+    }
+  };
+
+  const fetchSubjects = async ({ quiet = false } = {}) => {
     try {
-      setLoading(true);
-      const response = await fetch('http://localhost:3001/subjects');
+      if (!quiet) setLoading(true);
+      // The list never shows voterHistory; the detail view pages through it
+      const response = await fetch('http://localhost:3001/subjects?view=summary&users=false', {
+        headers: subjectsEtag.current ? { 'If-None-Match': subjectsEtag.current } : {}
+      });
+      if (response.status === 304) return;  // Unchanged since the last fetch
       const data = await response.json();
       console.log('Fetched data:', data);  // Debug log
+      subjectsEtag.current = response.headers.get('ETag');
       setSubjects(data.subjects || []);
-      setUserPoints(data.users || {});
-      setUserProfiles(data.userProfiles || []);
     } catch (error) {
       console.error('Error fetching subjects:', error);
     } finally {
-      setLoading(false);
+      if (!quiet) setLoading(false);
+    }
+  };
+
+  const fetchUser = async (userId) => {
+    try {
+      const response = await fetch(`http://localhost:3001/users/${encodeURIComponent(userId)}`);
+      const data = await response.json();
+      if (userId === selectedUserRef.current) setActiveUser(data);
+    } catch (error) {
+      console.error('Error fetching user:', error);
     }
   };
 
+  // Apply a vote delta from the vote response or the event stream. The same
+  // vote can arrive both ways; counters only grow, so a subject whose count
+  // already includes it is skipped.
+  const mergeVoteDelta = ({ subject: changed, entry }) => {
+    setSubjects(prev => prev.map(subject => {
+      if (subject.id !== changed.id) return subject;
+      if ((subject.votes?.[entry.voteType] || 0) >= changed.votes[entry.voteType]) return subject;
+      return { ...subject, ...changed };
+    }));
+  };
+
+  // Coalesce refetches when a burst of events concerns the selected user
+  const scheduleRefresh = () => {
+    if (refreshTimer.current) return;
+    refreshTimer.current = setTimeout(() => {
+      refreshTimer.current = null;
+      fetchSubjects({ quiet: true });
+      fetchUser(selectedUserRef.current);
+    }, 250);
+  };
+
+  const handleVoteEvent = (delta) => {
+    const user = selectedUserRef.current;
+    // This vote paid the earlier voters of its type up to the last band's
+    // toPosition; the user's own position is kept in their stats
+    const position = activeUserRef.current.stats?.votedOn?.[delta.subject.id]?.[delta.entry.voteType];
+    const paidUpTo = Math.max(0, ...delta.rewards.map(band => band.toPosition));
+    const credited = delta.entry.userId !== user && position !== undefined && position <= paidUpTo;
+    const votedElsewhere = delta.entry.userId === user && delta.seq !== lastVoteSeq.current;
+
+    mergeVoteDelta(delta);
+    if (credited || votedElsewhere) scheduleRefresh();
+  };
+
   const handleVote = async (subjectId, voteType) => {
     try {
       const response = await fetch('http://localhost:3001/vote', {
@@ -620,11 +3499,9 @@ function App() {
       console.log('Vote response:', data);  // Debug log
       
       if (data.success) {
-        setSubjects(data.subjects);
-        setUserPoints(prev => ({
-          ...prev,
-          [selectedUser]: data.user
-        }));
+        lastVoteSeq.current = data.seq;
+        mergeVoteDelta(data);
+        setActiveUser({ userId: selectedUser, ...data.user });
       } else {
         alert(data.error || 'Failed to vote');
       }
@@ -635,45 +3512,17 @@ function App() {
   };
 
   const calculatePointsStats = () => {
-    const user = userPoints[selectedUser] || { 
-      points: 100, 
-      upVoteRewards: {}, 
-      downVoteRewards: {} 
-    };
-    
-    // Calculate rewards
-    const totalUpVoteRewards = Object.values(user.upVoteRewards || {})
-      .reduce((sum, reward) => sum + reward, 0);
-    const totalDownVoteRewards = Object.values(user.downVoteRewards || {})
-      .reduce((sum, reward) => sum + reward, 0);
-    
-    // Calculate donations (votes made by this user)
-    const donatedPoints = subjects.reduce((total, subject) => {
-      const userVotes = subject.voterHistory?.filter(vote => vote.userId === selectedUser) || [];
-      return total + (userVotes.length * 10); // Each vote costs 10 points
-    }, 0);
-
-    // Calculate donations by type
-    const upVoteDonations = subjects.reduce((total, subject) => {
-      const userUpVotes = subject.voterHistory?.filter(
-        vote => vote.userId === selectedUser && vote.voteType === 'up'
-      ) || [];
-      return total + (userUpVotes.length * 10);
-    }, 0);
-
-    const downVoteDonations = subjects.reduce((total, subject) => {
-      const userDownVotes = subject.voterHistory?.filter(
-        vote => vote.userId === selectedUser && vote.voteType === 'down'
-      ) || [];
-      return total + (userDownVotes.length * 10);
-    }, 0);
-    
+    const stats = activeUser.stats || {};
+    const upVoteRewards = stats.upVoteRewards || 0;
+    const downVoteRewards = stats.downVoteRewards || 0;
+    const upVoteDonations = stats.upVoteDonations || 0;
+    const downVoteDonations = stats.downVoteDonations || 0;
     return {
-      current: user.points || 100,
-      upVoteRewards: totalUpVoteRewards,
-      downVoteRewards: totalDownVoteRewards,
-      totalRewards: totalUpVoteRewards + totalDownVoteRewards,
-      donatedPoints,
+      current: activeUser.points,
+      upVoteRewards,
+      downVoteRewards,
+      totalRewards: upVoteRewards + downVoteRewards,
+      donatedPoints: upVoteDonations + downVoteDonations,
       upVoteDonations,
       downVoteDonations
     };
@@ -683,6 +3532,8 @@ function App() {
     return <div className="loading">Loading...</div>;
   }
 
+  const pointsStats = calculatePointsStats();
+
   return (
     <div className="app">
       <div className="user-panel">
@@ -702,55 +3553,55 @@ function App() {
           <div className="points-summary">
             <div className="points-row">
               <span>Current Points:</span>
-              <span className="points">{calculatePointsStats().current}</span>
+              <span className="points">{formatPoints(pointsStats.current)}</span>
             </div>
             
             <div className="section-divider">Rewards Earned</div>
             <div className="points-row">
               <span>From Upvotes:</span>
-              <span className="points up-rewards">+{calculatePointsStats().upVoteRewards.toFixed(1)}</span>
+              <span className="points up-rewards">+{formatPoints(pointsStats.upVoteRewards)}</span>
             </div>
             <div className="points-row">
               <span>From Downvotes:</span>
-              <span className="points down-rewards">+{calculatePointsStats().downVoteRewards.toFixed(1)}</span>
+              <span className="points down-rewards">+{formatPoints(pointsStats.downVoteRewards)}</span>
             </div>
             <div className="points-row total">
               <span>Total Rewards:</span>
-              <span className="points">+{calculatePointsStats().totalRewards.toFixed(1)}</span>
+              <span className="points">+{formatPoints(pointsStats.totalRewards)}</span>
             </div>
 
             <div className="section-divider">Points Donated</div>
             <div className="points-row">
               <span>Upvotes Given:</span>
-              <span className="points donated-up">-{calculatePointsStats().upVoteDonations}</span>
+              <span className="points donated-up">-{formatPoints(pointsStats.upVoteDonations, 0)}</span>
             </div>
             <div className="points-row">
               <span>Downvotes Given:</span>
-              <span className="points donated-down">-{calculatePointsStats().downVoteDonations}</span>
+              <span className="points donated-down">-{formatPoints(pointsStats.downVoteDonations, 0)}</span>
             </div>
             <div className="points-row total-donated">
               <span>Total Donated:</span>
-              <span className="points">-{calculatePointsStats().donatedPoints}</span>
+              <span className="points">-{formatPoints(pointsStats.donatedPoints, 0)}</span>
             </div>
           </div>
           
           <div className="rewards-breakdown">
             <h3>Rewards by Subject:</h3>
-            {Object.entries(userPoints[selectedUser]?.upVoteRewards || {}).map(([subjectId, reward]) => {
+            {Object.entries(activeUser.upVoteRewards || {}).map(([subjectId, reward]) => {
               const subject = subjects.find(s => s.id === parseInt(subjectId));
               return reward > 0 && (
                 <div key={`up-${subjectId}`} className="reward-item up">
                   <span>👍 {subject?.title || `Subject ${subjectId}`}:</span>
-                  <span className="reward-points">+{reward.toFixed(1)}</span>
+                  <span className="reward-points">+{formatPoints(reward)}</span>
                 </div>
               );
             })}
-            {Object.entries(userPoints[selectedUser]?.downVoteRewards || {}).map(([subjectId, reward]) => {
+            {Object.entries(activeUser.downVoteRewards || {}).map(([subjectId, reward]) => {
               const subject = subjects.find(s => s.id === parseInt(subjectId));
               return reward > 0 && (
                 <div key={`down-${subjectId}`} className="reward-item down">
                   <span>👎 {subject?.title || `Subject ${subjectId}`}:</span>
-                  <span className="reward-points">+{reward.toFixed(1)}</span>
+                  <span className="reward-points">+{formatPoints(reward)}</span>
                 </div>
               );
             })}
@@ -1086,6 +3937,20 @@ export default App;
   background: #fff3e0;
 }
 
+.load-more-button {
+  display: block;
+  width: 100%;
+  padding: 10px;
+  border: none;
+  background: #f5f5f5;
+  cursor: pointer;
+}
+
+.load-more-button:disabled {
+  cursor: default;
+  color: #999;
+}
+
 .vote-type {
   font-size: 1.2em;
 }
@@ -1160,9 +4025,23 @@ export default App;
         """Create the bash runner script"""
         run_script_content = f"""#!/bin/bash
 # Auto-generated runner for {self.script_name}
+# Usage: run_{self.script_name}.sh [--storage {'|'.join(STORAGE_BACKENDS)}] [--reset]
+#   --storage  storage backend to generate (default: lowdb)
+#   --reset    reset that backend's data with test_reset_db.py before starting
+
+STORAGE=lowdb
+RESET=0
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --storage) STORAGE="$2"; shift 2 ;;
+        --storage=*) STORAGE="${{1#--storage=}}"; shift ;;
+        --reset) RESET=1; shift ;;
+        *) echo "Unknown option: $1"; exit 1 ;;
+    esac
+done
 
 # First run the Python setup script
-python3 {self.scripts_path}/{self.script_name}.py
+python3 {self.scripts_path}/{self.script_name}.py --storage "$STORAGE"
 
 if [ $? -ne 0 ]; then
     echo "Python setup failed!"
@@ -1179,10 +4058,16 @@ echo "Starting servers for {self.project_name}..."
 # Kill any existing processes
 echo "Cleaning up existing processes..."
 lsof -ti:3001 | xargs kill -9 2>/dev/null || true
+lsof -ti:3002 | xargs kill -9 2>/dev/null || true
 lsof -ti:5173 | xargs kill -9 2>/dev/null || true
 
+if [ "$RESET" -eq 1 ]; then
+    echo "Resetting $STORAGE data..."
+    python3 {self.scripts_path}/test_reset_db.py --storage "$STORAGE" || exit 1
+fi
+
 # Install dependencies if needed
-if [ ! -d "$BACKEND_PATH/node_modules" ]; then
+if [ ! -d "$BACKEND_PATH/node_modules" ] || [ "$BACKEND_PATH/package.json" -nt "$BACKEND_PATH/node_modules" ]; then
     echo "Installing backend dependencies..."
     cd $BACKEND_PATH && npm install
 fi
@@ -1197,16 +4082,21 @@ echo "Starting backend server..."
 cd $BACKEND_PATH && npm run dev &
 BACKEND_PID=$!
 
+echo "Starting event stream server..."
+cd $BACKEND_PATH && node eventServer.js &
+EVENTS_PID=$!
+
 echo "Starting frontend server..."
 cd $FRONTEND_PATH && npm run dev &
 FRONTEND_PID=$!
 
 # Handle termination
-trap "kill $BACKEND_PID $FRONTEND_PID" SIGINT SIGTERM EXIT
+trap "kill $BACKEND_PID $EVENTS_PID $FRONTEND_PID" SIGINT SIGTERM EXIT
 
 echo "🚀 Servers started!"
 echo "📱 Frontend: http://localhost:5173"
 echo "⚙️  Backend: http://localhost:3001"
+echo "📡 Events: http://localhost:3002/events"
 echo ""
 echo "Points System:"
 echo "- Each user starts with 100 points"
@@ -1230,8 +4120,16 @@ wait
         try:
             print(f"Setting up {self.project_name}...")
             self.create_directories()
-            self.create_db_files()
+            self.create_db_files(self.storage)
+            self.create_ledger_file()
+            self.create_rewards_file()
+            self.create_archive_file()
+            self.create_lock_file()
+            self.create_writer_file()
+            self.create_events_files()
+            self.create_logger_file()
             self.create_handler_file()
+            self.create_serverless_file()
             self.create_app_file()
             self.create_run_script()
             print("\nSetup completed successfully!")
@@ -1242,9 +4140,15 @@ wait
             raise
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the kaul2-app project")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="lowdb",
+                        help="storage backend to generate (default: lowdb)")
+    args = parser.parse_args()
+
     setup = ProjectSetup(
         project_name="kaul2-app",
         phase="03",
-        task="01"
+        task="01",
+        storage=args.storage
     )
-    setup.setup() 
\ No newline at end of file
+    setup.setup()
\ No newline at end of file
@@ -1,81 +1,619 @@
+from array import array
+from bisect import bisect
+from contextlib import contextmanager
+from itertools import accumulate
 from pathlib import Path
+import argparse
 import json
+import os
+import random
+import shutil
+import sqlite3
 import sys
+import threading
+import time
 
-def reset_db():
+from history_snapshot import write_history
+from ledger import (INITIAL_POINTS, POINTS_UNIT, SQLITE_POINTS_FORMAT, STORAGE_BACKENDS, VOTE_COST,
+                    Ledger, to_epoch_ms, to_iso)
+
+DEFAULT_SUBJECTS = [
+    ("Kubernetes", "🚢"),
+    ("AWS Cloud", "☁️"),
+    ("Ubuntu Linux", "🐧"),
+    ("LangChain", "🔗"),
+]
+
+DEFAULT_PROFILES = [
+    {"id": "user1", "name": "Alice", "avatar": "👩‍💻"},
+    {"id": "user2", "name": "Bob", "avatar": "👨‍💻"},
+    {"id": "user3", "name": "Charlie", "avatar": "🧑‍💻"},
+    {"id": "user4", "name": "Diana", "avatar": "👩‍🔬"},
+]
+
+EPOCH = "2024-01-01T00:00:00.000Z"
+
+# A writer.lock untouched for this long is abandoned, as WRITE_LOCK_STALE_MS in lock.js
+WRITE_LOCK_STALE_SECONDS = 10
+
+# Number of users-<n>.json files of the sharded storage backend
+USER_SHARDS = 16
+
+# Tables of the sqlite storage backend, as created by storage.js
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+  id INTEGER PRIMARY KEY,
+  title TEXT NOT NULL,
+  emoji TEXT NOT NULL,
+  up INTEGER NOT NULL DEFAULT 0,
+  down INTEGER NOT NULL DEFAULT 0,
+  last_updated TEXT NOT NULL,
+  commit_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS votes (
+  subject_id INTEGER NOT NULL,
+  vote_type TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  user_id TEXT NOT NULL,
+  history_position INTEGER NOT NULL,
+  points INTEGER NOT NULL,
+  timestamp TEXT NOT NULL,
+  commit_id INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (subject_id, vote_type, position)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS votes_history ON votes (subject_id, history_position);
+CREATE UNIQUE INDEX IF NOT EXISTS votes_voter ON votes (subject_id, vote_type, user_id);
+CREATE TABLE IF NOT EXISTS users (
+  id TEXT PRIMARY KEY,
+  points INTEGER NOT NULL,
+  up_vote_rewards TEXT NOT NULL,
+  down_vote_rewards TEXT NOT NULL,
+  stats TEXT,
+  commit_id INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS profiles (
+  id TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  avatar TEXT NOT NULL,
+  sort INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS commits (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  generation INTEGER NOT NULL,
+  last_commit INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO commits (id, generation, last_commit) VALUES (1, 0, 0);
+"""
+# Tables whose rows carry the commit that last wrote them
+SQLITE_CHANGED_TABLES = ("subjects", "votes", "users")
+
+
+def reset_db(storage="lowdb", subjects=None, users=None, votes=0,
+             distribution="zipf", zipf_exponent=1.0, up_ratio=0.5, seed=None):
     try:
         project_name = "kaul2-app"
         base_path = Path.cwd()
         backend_path = base_path / project_name / "backend"
-        
-        # Default data for subjects
-        subjects_data = {
-            "subjects": [
-                {
-                    "id": 1,
-                    "title": "Kubernetes",
-                    "emoji": "🚢",
-                    "votes": {"up": 0, "down": 0},
-                    "voterHistory": [],
-                    "lastUpdated": "2024-01-01T00:00:00.000Z"
-                },
-                {
-                    "id": 2,
-                    "title": "AWS Cloud",
-                    "emoji": "☁️",
-                    "votes": {"up": 0, "down": 0},
-                    "voterHistory": [],
-                    "lastUpdated": "2024-01-01T00:00:00.000Z"
-                },
-                {
-                    "id": 3,
-                    "title": "Ubuntu Linux",
-                    "emoji": "🐧",
-                    "votes": {"up": 0, "down": 0},
-                    "voterHistory": [],
-                    "lastUpdated": "2024-01-01T00:00:00.000Z"
-                },
-                {
-                    "id": 4,
-                    "title": "LangChain",
-                    "emoji": "🔗",
-                    "votes": {"up": 0, "down": 0},
-                    "voterHistory": [],
-                    "lastUpdated": "2024-01-01T00:00:00.000Z"
-                }
-            ]
-        }
-
-        # Default data for users
-        users_data = {
-            "profiles": [
-                {"id": "user1", "name": "Alice", "avatar": "👩‍💻"},
-                {"id": "user2", "name": "Bob", "avatar": "👨‍💻"},
-                {"id": "user3", "name": "Charlie", "avatar": "🧑‍💻"},
-                {"id": "user4", "name": "Diana", "avatar": "👩‍🔬"}
-            ],
-            "points": {}
-        }
 
         # Create directory if it doesn't exist
         backend_path.mkdir(parents=True, exist_ok=True)
 
-        # Write the separate database files
-        with open(backend_path / "subjects.json", 'w') as f:
-            json.dump(subjects_data, f, indent=2)
+        # No vote commits while the data is replaced (lock.js)
+        with write_lock(backend_path):
+            if subjects or users or votes:
+                return seed_db(
+                    backend_path, storage,
+                    subjects=subjects or len(DEFAULT_SUBJECTS),
+                    users=users or len(DEFAULT_PROFILES),
+                    votes=votes,
+                    distribution=distribution,
+                    zipf_exponent=zipf_exponent,
+                    up_ratio=up_ratio,
+                    seed=seed
+                )
+
+            # Default data for subjects
+            subjects_data = {
+                "pointsUnit": POINTS_UNIT,
+                "subjects": [
+                    {
+                        "id": subject_id,
+                        "title": title,
+                        "emoji": emoji,
+                        "votes": {"up": 0, "down": 0},
+                        "voterHistory": [],
+                        "lastUpdated": EPOCH
+                    }
+                    for subject_id, (title, emoji) in enumerate(DEFAULT_SUBJECTS, start=1)
+                ]
+            }
+
+            # Default data for users
+            users_data = {
+                "pointsUnit": POINTS_UNIT,
+                "profiles": DEFAULT_PROFILES,
+                "points": {}
+            }
 
-        with open(backend_path / "users.json", 'w') as f:
-            json.dump(users_data, f, indent=2)
+            if storage == "sharded":
+                subjects_by_id = {subject["id"]: subject for subject in subjects_data["subjects"]}
+                index_path = write_shards(
+                    backend_path, list(subjects_by_id),
+                    lambda f, subject_id: json.dump(subjects_by_id[subject_id], f),
+                    [], DEFAULT_PROFILES)
+                clear_rewards(backend_path)
+                clear_archive(backend_path)
+                publish_reset(backend_path)
 
-        print("✅ Successfully reset databases:")
-        print("- subjects.json: All votes reset")
-        print("- users.json: All points reset")
-        return True
+                print("✅ Successfully reset sharded storage:")
+                print(f"- {index_path.parent.name}/: All votes and points reset")
+                return True
+
+            if storage == "sqlite":
+                subject_rows = [
+                    (subject["id"], subject["title"], subject["emoji"], 0, 0, subject["lastUpdated"])
+                    for subject in subjects_data["subjects"]
+                ]
+                db_path = write_sqlite(backend_path, subject_rows, [], [], DEFAULT_PROFILES)
+                clear_rewards(backend_path)
+                clear_archive(backend_path)
+                publish_reset(backend_path)
+
+                print("✅ Successfully reset SQLite database:")
+                print(f"- {db_path.name}: All votes and points reset")
+                return True
+
+            if storage == "log":
+                # Fresh generation-0 snapshot and an empty vote log
+                subjects_doc = {"pointsUnit": POINTS_UNIT, "subjects": [
+                    {key: value for key, value in subject.items() if key != "voterHistory"}
+                    for subject in subjects_data["subjects"]
+                ]}
+                write_log(
+                    backend_path, Ledger(), [subject["id"] for subject in subjects_data["subjects"]],
+                    lambda f: json.dump(subjects_doc, f),
+                    lambda f: json.dump(users_data, f))
+                clear_rewards(backend_path)
+                clear_archive(backend_path)
+                publish_reset(backend_path)
+
+                print("✅ Successfully reset vote log:")
+                print("- votes.snapshot.json, votes.history.0.bin: All votes and points reset")
+                print("- votes.log: Truncated")
+                return True
+
+            # Write the separate database files
+            with open(backend_path / "subjects.json", 'w') as f:
+                json.dump(subjects_data, f, indent=2)
+
+            with open(backend_path / "users.json", 'w') as f:
+                json.dump(users_data, f, indent=2)
+            clear_rewards(backend_path)
+            clear_archive(backend_path)
+            publish_reset(backend_path)
+
+            print("✅ Successfully reset databases:")
+            print("- subjects.json: All votes reset")
+            print("- users.json: All points reset")
+            return True
 
     except Exception as e:
         print(f"❌ Error resetting databases: {e}")
         return False
 
+
+def user_shard(user_id, shards):
+    """FNV-1a of the user id's UTF-8 bytes, as userShard() in storage.js"""
+    value = 0x811c9dc5
+    for byte in user_id.encode("utf-8"):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return value % shards
+
+
+def write_shards(backend_path, subject_ids, write_subject_shard, points, profiles):
+    """Replace the shards/ layout; returns the index path
+
+    write_subject_shard(f, subject_id) writes one subject document and
+    points yields (user id, record). Shards go to new file names and the
+    index naming them replaces index.json last, so a running backend sees
+    either the old layout or the new one. Files the new index does not name
+    are removed afterwards.
+    """
+    shards_path = backend_path / "shards"
+    shards_path.mkdir(parents=True, exist_ok=True)
+    index_path = shards_path / "index.json"
+    commit = 1
+    if index_path.exists():
+        with open(index_path) as f:
+            commit = json.load(f).get("commit", 0) + 1
+    tag = f"{commit}-{os.getpid()}"
+
+    index = {"commit": commit, "pointsUnit": POINTS_UNIT, "subjects": [], "users": [], "profiles": profiles}
+    for subject_id in subject_ids:
+        name = f"subject-{subject_id}.{tag}.json"
+        with open(shards_path / name, "w") as f:
+            write_subject_shard(f, subject_id)
+        index["subjects"].append({"id": subject_id, "file": name})
+
+    index["users"] = [f"users-{shard}.{tag}.json" for shard in range(USER_SHARDS)]
+    files = [open(shards_path / name, "w") for name in index["users"]]
+    try:
+        written = [0] * USER_SHARDS
+        for f in files:
+            f.write('{"points": {')
+        for user_id, record in points:
+            shard = user_shard(user_id, USER_SHARDS)
+            if written[shard]:
+                files[shard].write(", ")
+            files[shard].write(f"{json.dumps(user_id)}: {json.dumps(record)}")
+            written[shard] += 1
+        for f in files:
+            f.write("}}")
+    finally:
+        for f in files:
+            f.close()
+
+    tmp_path = index_path.with_name("index.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    tmp_path.replace(index_path)
+
+    current = {entry["file"] for entry in index["subjects"]} | set(index["users"])
+    for path in shards_path.iterdir():
+        if path.name != "index.json" and path.name not in current:
+            path.unlink()
+    return index_path
+
+
+def write_log(backend_path, ledger, subject_ids, write_snapshot_subjects, write_snapshot_users):
+    """Replace the log backend's snapshot and empty its log; returns the paths
+
+    Voter history goes to votes.history.0.bin (history_snapshot.py) and the
+    rest of the state to votes.snapshot.json, which names it and is replaced
+    last. write_snapshot_subjects(f) and write_snapshot_users(f) write the
+    subjects (without voterHistory) and users documents. History files of
+    other generations are removed.
+    """
+    history_path = backend_path / "votes.history.0.bin"
+    tmp_path = history_path.with_name(history_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write_history(f, ledger, subject_ids)
+    tmp_path.replace(history_path)
+
+    snapshot_path = backend_path / "votes.snapshot.json"
+    tmp_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(f'{{"generation": 0, "history": {json.dumps(history_path.name)}, "subjects": ')
+        write_snapshot_subjects(f)
+        f.write(', "users": ')
+        write_snapshot_users(f)
+        f.write("}")
+    tmp_path.replace(snapshot_path)
+
+    log_path = backend_path / "votes.log"
+    log_path.write_text("")
+    for path in backend_path.glob("votes.history.*.bin"):
+        if path != history_path:
+            path.unlink()
+    return [snapshot_path, history_path, log_path]
+
+
+def write_sqlite(backend_path, subject_rows, vote_rows, user_rows, profiles):
+    """Replace every table of votes.db in one transaction; returns its path
+
+    A running backend sees the commit through PRAGMA data_version and,
+    as the rows are of a new generation, reads the tables in full. So the
+    file is never deleted from under it.
+    """
+    db_path = backend_path / "votes.db"
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.executescript(SQLITE_SCHEMA)
+        with connection:
+            for table in SQLITE_CHANGED_TABLES:
+                columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+                if "commit_id" not in columns:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN commit_id INTEGER NOT NULL DEFAULT 0")
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_commit ON {table} (commit_id)")
+            for table in ("votes", "users", "subjects", "profiles"):
+                connection.execute(f"DELETE FROM {table}")
+            connection.execute("UPDATE commits SET generation = generation + 1, last_commit = 0 WHERE id = 1")
+            # In the same transaction, so the rows are never taken for whole points
+            connection.execute(f"PRAGMA user_version = {SQLITE_POINTS_FORMAT}")
+            connection.executemany(
+                "INSERT INTO subjects (id, title, emoji, up, down, last_updated) VALUES (?, ?, ?, ?, ?, ?)",
+                subject_rows)
+            connection.executemany(
+                "INSERT INTO votes (subject_id, vote_type, position, user_id, history_position, points, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                vote_rows)
+            connection.executemany(
+                "INSERT INTO users (id, points, up_vote_rewards, down_vote_rewards, stats) VALUES (?, ?, ?, ?, ?)",
+                user_rows)
+            connection.executemany(
+                "INSERT INTO profiles (id, name, avatar, sort) VALUES (?, ?, ?, ?)",
+                ((p["id"], p["name"], p["avatar"], sort) for sort, p in enumerate(profiles)))
+    finally:
+        connection.close()
+    return db_path
+
+
+def sqlite_rows(ledger, subjects):
+    """Subject and vote rows for votes.db, vote rows generated one at a time"""
+    subject_rows = []
+    for subject_id in range(1, subjects + 1):
+        columns = ledger.subjects[subject_id]
+        title, emoji = subject_meta(subject_id)
+        counts = {"up": 0, "down": 0}
+        for vote_type, voters in columns.voters.items():
+            counts[ledger.vote_type_names[vote_type]] = len(voters)
+        last_updated = to_iso(columns.timestamps[-1]) if len(columns) else EPOCH
+        subject_rows.append((subject_id, title, emoji, counts["up"], counts["down"], last_updated))
+
+    def vote_rows():
+        for subject_id in range(1, subjects + 1):
+            columns = ledger.subjects[subject_id]
+            ranks = {}
+            for position in range(len(columns)):
+                vote_type = ledger.vote_type_names[columns.vote_types[position]]
+                ranks[vote_type] = ranks.get(vote_type, 0) + 1
+                yield (subject_id, vote_type, ranks[vote_type], ledger.user_ids[columns.users[position]],
+                       position + 1, VOTE_COST, to_iso(columns.timestamps[position]))
+
+    return subject_rows, vote_rows()
+
+
+@contextmanager
+def write_lock(backend_path, stale_seconds=WRITE_LOCK_STALE_SECONDS):
+    """Hold the backend's writer.lock, as withWriteLock() in lock.js does"""
+    lock_path = backend_path / "writer.lock"
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > stale_seconds:
+                    lock_path.unlink(missing_ok=True)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    os.write(fd, f"{os.getpid()}\n".encode())
+    os.close(fd)
+
+    # Keep it fresh while a large dataset is written
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(stale_seconds / 3):
+            os.utime(lock_path)
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+        lock_path.unlink(missing_ok=True)
+
+
+def clear_rewards(backend_path):
+    """Remove the reward ledger, whose rows refer to the votes being replaced"""
+    for name in ("rewards.log", "rewards.log.1"):
+        (backend_path / name).unlink(missing_ok=True)
+    shutil.rmtree(backend_path / "rewards", ignore_errors=True)
+
+
+def clear_archive(backend_path):
+    """Remove the voter history archive, whose entries belong to the votes being replaced"""
+    shutil.rmtree(backend_path / "archive", ignore_errors=True)
+
+
+def publish_reset(backend_path):
+    """Append a reset event to events.log, so event stream subscribers refetch"""
+    events_path = backend_path / "events.log"
+    if not events_path.exists():
+        return
+
+    last_seq = 0
+    for line in reversed(events_path.read_text().splitlines()):
+        try:
+            last_seq = json.loads(line)["seq"]
+            break
+        except (ValueError, KeyError):
+            continue
+    with open(events_path, 'a') as f:
+        f.write(json.dumps({"seq": last_seq + 1, "type": "reset"}) + "\n")
+
+
+def generate_votes(ledger, subjects, users, votes, distribution="zipf",
+                   zipf_exponent=1.0, up_ratio=0.5, seed=None):
+    """Record up to `votes` random accepted votes into ledger.
+
+    Subjects are drawn uniformly or by Zipf rank (subject 1 most popular),
+    users uniformly. A user casts at most INITIAL_POINTS // VOTE_COST votes,
+    so no vote can be rejected for insufficient points whatever the rewards,
+    and duplicate (user, subject, vote type) draws are skipped. Returns the
+    number of votes recorded.
+    """
+    rng = random.Random(seed)
+    if distribution == "zipf":
+        weights = [1 / rank ** zipf_exponent for rank in range(1, subjects + 1)]
+    else:
+        weights = [1] * subjects
+    cumulative = list(accumulate(weights))
+    total_weight = cumulative[-1]
+
+    max_votes_per_user = INITIAL_POINTS // VOTE_COST
+    votes_cast = array("b", bytes(users))
+    start_ms = to_epoch_ms(EPOCH)
+
+    recorded = 0
+    attempts = 0
+    max_attempts = votes * 20 + 1000
+    while recorded < votes and attempts < max_attempts:
+        attempts += 1
+        user = rng.randrange(users)
+        if votes_cast[user] >= max_votes_per_user:
+            continue
+        subject_id = min(bisect(cumulative, rng.random() * total_weight), subjects - 1) + 1
+        vote_type = "up" if rng.random() < up_ratio else "down"
+        if ledger.record(subject_id, f"user{user + 1}", vote_type, start_ms + recorded * 1000):
+            votes_cast[user] += 1
+            recorded += 1
+    return recorded
+
+
+def subject_meta(subject_id):
+    if subject_id <= len(DEFAULT_SUBJECTS):
+        return DEFAULT_SUBJECTS[subject_id - 1]
+    return f"Subject {subject_id}", "📚"
+
+
+def profile(user_number):
+    if user_number <= len(DEFAULT_PROFILES):
+        return DEFAULT_PROFILES[user_number - 1]
+    return {"id": f"user{user_number}", "name": f"User {user_number}", "avatar": "🧑"}
+
+
+def write_subject(f, ledger, subject_id, history=True):
+    """Stream one subject object, one history entry at a time
+
+    Without history the voterHistory key is left out.
+    """
+    columns = ledger.subjects[subject_id]
+    title, emoji = subject_meta(subject_id)
+    counts = {"up": 0, "down": 0}
+    for vote_type, voters in columns.voters.items():
+        counts[ledger.vote_type_names[vote_type]] = len(voters)
+
+    f.write(f'{{"id": {subject_id}, "title": {json.dumps(title)}, "emoji": {json.dumps(emoji)}, '
+            f'"votes": {json.dumps(counts)}, ')
+    if history:
+        f.write('"voterHistory": [')
+        for position in range(len(columns)):
+            if position:
+                f.write(", ")
+            f.write(json.dumps({
+                "userId": ledger.user_ids[columns.users[position]],
+                "timestamp": to_iso(columns.timestamps[position]),
+                "points": VOTE_COST,
+                "voteType": ledger.vote_type_names[columns.vote_types[position]],
+                "position": position + 1
+            }))
+        f.write('], ')
+    last_updated = to_iso(columns.timestamps[-1]) if len(columns) else EPOCH
+    f.write(f'"lastUpdated": {json.dumps(last_updated)}}}')
+
+
+def write_subjects(f, ledger, subjects, history=True):
+    """Stream a subjects.json document"""
+    f.write(f'{{"pointsUnit": {json.dumps(POINTS_UNIT)}, "subjects": [')
+    for subject_id in range(1, subjects + 1):
+        if subject_id > 1:
+            f.write(", ")
+        write_subject(f, ledger, subject_id, history)
+    f.write("]}")
+
+
+def write_users(f, ledger, users):
+    """Stream a users.json document, one profile and balance at a time"""
+    f.write(f'{{"pointsUnit": {json.dumps(POINTS_UNIT)}, "profiles": [')
+    for user_number in range(1, users + 1):
+        if user_number > 1:
+            f.write(", ")
+        f.write(json.dumps(profile(user_number)))
+    f.write('], "points": {')
+    for index, (user_id, record) in enumerate(ledger.iter_points()):
+        if index:
+            f.write(", ")
+        f.write(f"{json.dumps(user_id)}: {json.dumps(record)}")
+    f.write("}}")
+
+
+def write_dataset(backend_path, storage, ledger, subjects, users):
+    """Write ledger state in the layout of the storage backend; returns the paths"""
+    if storage == "sharded":
+        index_path = write_shards(
+            backend_path, range(1, subjects + 1),
+            lambda f, subject_id: write_subject(f, ledger, subject_id),
+            ledger.iter_points(),
+            [profile(user_number) for user_number in range(1, users + 1)])
+        clear_rewards(backend_path)
+        clear_archive(backend_path)
+        publish_reset(backend_path)
+        return [index_path.parent]
+
+    if storage == "sqlite":
+        subject_rows, vote_rows = sqlite_rows(ledger, subjects)
+        user_rows = (
+            (user_id, record["points"], json.dumps(record["upVoteRewards"]),
+             json.dumps(record["downVoteRewards"]), json.dumps(record["stats"]))
+            for user_id, record in ledger.iter_points()
+        )
+        db_path = write_sqlite(backend_path, subject_rows, vote_rows, user_rows,
+                               [profile(user_number) for user_number in range(1, users + 1)])
+        clear_rewards(backend_path)
+        clear_archive(backend_path)
+        publish_reset(backend_path)
+        return [db_path]
+
+    if storage == "log":
+        paths = write_log(
+            backend_path, ledger, range(1, subjects + 1),
+            lambda f: write_subjects(f, ledger, subjects, history=False),
+            lambda f: write_users(f, ledger, users))
+        clear_rewards(backend_path)
+        clear_archive(backend_path)
+        publish_reset(backend_path)
+        return paths
+
+    subjects_path = backend_path / "subjects.json"
+    users_path = backend_path / "users.json"
+    with open(subjects_path, 'w') as f:
+        write_subjects(f, ledger, subjects)
+    with open(users_path, 'w') as f:
+        write_users(f, ledger, users)
+    clear_rewards(backend_path)
+    clear_archive(backend_path)
+    publish_reset(backend_path)
+    return [subjects_path, users_path]
+
+
+def seed_db(backend_path, storage="lowdb", subjects=4, users=4, votes=0,
+            distribution="zipf", zipf_exponent=1.0, up_ratio=0.5, seed=None):
+    """Write a synthetic dataset with balances settled by the reward rules"""
+    ledger = Ledger(range(1, subjects + 1))
+    recorded = generate_votes(ledger, subjects, users, votes, distribution,
+                              zipf_exponent, up_ratio, seed)
+    ledger.settle_rewards()
+    files = ", ".join(path.name for path in write_dataset(backend_path, storage, ledger, subjects, users))
+
+    print(f"✅ Seeded {subjects} subjects, {users} users, {recorded} votes ({distribution}) into {files}")
+    if recorded < votes:
+        print(f"⚠️  Only {recorded} of {votes} votes fit: each user can vote "
+              f"{INITIAL_POINTS // VOTE_COST} times, try more --users")
+    return True
+
+
 if __name__ == "__main__":
-    success = reset_db()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reset the kaul2-app backend data")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default="lowdb",
+                        help="storage backend to reset (default: lowdb)")
+    parser.add_argument("--subjects", type=int, help="seed this many subjects")
+    parser.add_argument("--users", type=int, help="seed this many users")
+    parser.add_argument("--votes", type=int, default=0, help="seed this many votes")
+    parser.add_argument("--distribution", choices=["zipf", "uniform"], default="zipf",
+                        help="subject popularity (default: zipf)")
+    parser.add_argument("--zipf-exponent", type=float, default=1.0)
+    parser.add_argument("--up-ratio", type=float, default=0.5,
+                        help="share of upvotes (default: 0.5)")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible data")
+    args = parser.parse_args()
+
+    success = reset_db(args.storage, args.subjects, args.users, args.votes,
+                       args.distribution, args.zipf_exponent, args.up_ratio, args.seed)
+    sys.exit(0 if success else 1)